@@ -0,0 +1,140 @@
+"""Meal totals computed in the database.
+
+Reports (PDF today, CSV/JSON exports and dashboards later) only need one
+``(name, total)`` row per member, so the summing is done with a single
+``GROUP BY`` query instead of loading every MealRecord into Python. Whole
+calendar months read the member_monthly_totals rollup instead, one row per
+member. Everything here covers the current mess only (see tenancy.py).
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import and_, func, select
+
+from models import db, Member, MemberMonthlyTotal, current_mess_id
+from history import history_table
+
+
+def month_bounds(year, month):
+    """Return the first and last day of a calendar month."""
+    start_date = date(year, month, 1)
+    if month == 12:
+        end_date = date(year + 1, 1, 1) - timedelta(days=1)
+    else:
+        end_date = date(year, month + 1, 1) - timedelta(days=1)
+    return start_date, end_date
+
+
+def member_totals(start_date, end_date):
+    """Total meals per member between two dates, inclusive.
+
+    Returns ``[(name, total), ...]`` ordered by name. Members without any
+    records in the range are included with a total of 0.
+    """
+    records = history_table(start_date, end_date)
+    total = func.coalesce(func.sum(records.c.meal_count), 0)
+    rows = db.session.query(Member.name, total).outerjoin(
+        records,
+        and_(
+            records.c.member_id == Member.id,
+            records.c.meal_date >= start_date,
+            records.c.meal_date <= end_date
+        )
+    ).filter(
+        Member.mess_id == current_mess_id(),
+        Member.removed_at.is_(None)
+    ).group_by(Member.id, Member.name).order_by(Member.name).all()
+    return [(name, int(member_total)) for name, member_total in rows]
+
+
+def rollup_totals(first_month, last_month):
+    """Total meals per member for whole calendar months, from the rollup.
+
+    ``first_month`` and ``last_month`` are first-of-month dates, inclusive.
+    Same result as ``member_totals`` over those months, reading one row per
+    member and month instead of one per record.
+    """
+    total = func.coalesce(func.sum(MemberMonthlyTotal.total), 0)
+    rows = db.session.query(Member.name, total).outerjoin(
+        MemberMonthlyTotal,
+        and_(
+            MemberMonthlyTotal.member_id == Member.id,
+            MemberMonthlyTotal.month >= first_month,
+            MemberMonthlyTotal.month <= last_month
+        )
+    ).filter(
+        Member.mess_id == current_mess_id(),
+        Member.removed_at.is_(None)
+    ).group_by(Member.id, Member.name).order_by(Member.name).all()
+    return [(name, int(member_total)) for name, member_total in rows]
+
+
+def monthly_totals(month_start):
+    """Total meals per member for the calendar month starting ``month_start``."""
+    return rollup_totals(month_start, month_start)
+
+
+def range_totals(start_date, end_date):
+    """Total meals per member for any date range.
+
+    Ranges made of whole calendar months are served from the rollup; any
+    other range is summed from meal_records.
+    """
+    if whole_months(start_date, end_date):
+        return rollup_totals(start_date, end_date.replace(day=1))
+    return member_totals(start_date, end_date)
+
+
+def whole_months(start_date, end_date):
+    """Whether ``start_date``..``end_date`` is made of whole calendar months."""
+    return start_date.day == 1 and (end_date + timedelta(days=1)).day == 1
+
+
+def meal_totals_subquery(start_date, end_date):
+    """``(member_id, total)`` for members with meals in the range, as a subquery.
+
+    For joining onto other per-member aggregates. Reads the rollup for
+    whole months, like ``range_totals``. Only the current mess is read.
+    """
+    mess_id = current_mess_id()
+    if whole_months(start_date, end_date):
+        return select(
+            MemberMonthlyTotal.member_id,
+            func.sum(MemberMonthlyTotal.total).label('total')
+        ).where(
+            MemberMonthlyTotal.mess_id == mess_id,
+            MemberMonthlyTotal.month >= start_date,
+            MemberMonthlyTotal.month <= end_date.replace(day=1)
+        ).group_by(MemberMonthlyTotal.member_id).subquery()
+    records = history_table(start_date, end_date)
+    return select(
+        records.c.member_id,
+        func.sum(records.c.meal_count).label('total')
+    ).where(
+        records.c.mess_id == mess_id,
+        records.c.meal_date >= start_date,
+        records.c.meal_date <= end_date
+    ).group_by(records.c.member_id).subquery()
+
+
+def daily_counts(start_date, end_date, batch_size=1000):
+    """Yield ``(name, meal_date, meal_count)`` ordered by name and date.
+
+    Rows are fetched ``batch_size`` at a time (a server-side cursor on
+    PostgreSQL), so arbitrarily long ranges stream in constant memory.
+    """
+    records = history_table(start_date, end_date)
+    query = db.session.query(Member.name, records.c.meal_date, records.c.meal_count).join(
+        Member, records.c.member_id == Member.id
+    ).filter(
+        records.c.mess_id == current_mess_id(),
+        records.c.meal_date >= start_date,
+        records.c.meal_date <= end_date,
+        Member.removed_at.is_(None)
+    ).order_by(Member.name, records.c.meal_date).yield_per(batch_size)
+    for name, meal_date, meal_count in query:
+        yield name, meal_date, meal_count
+
+
+def grand_total(totals):
+    """Sum of the totals returned by ``member_totals``."""
+    return sum(member_total for _, member_total in totals)
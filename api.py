@@ -0,0 +1,216 @@
+"""JSON API for kiosks and bots.
+
+The HTML forms pay for a full template and a redirect per save. These
+endpoints take and return small JSON documents instead:
+
+    GET  /api/members                      id and name of every member
+    GET  /api/meals/today                  today's counts by member id
+    POST /api/meals/today                  {"counts": {"<member_id>": n, ...}}
+    GET  /api/members/<id>/meals           ?start=YYYY-MM-DD&end=YYYY-MM-DD
+    GET  /api/totals                       ?month=YYYY-MM
+    GET  /api/matrix                       ?month=YYYY-MM, counts per member and day
+    GET  /api/settlement                   ?month=YYYY-MM, meal rate and balances
+
+Under ``/m/<slug>/api/...`` the same endpoints serve that mess (see
+tenancy.py). Every GET carries an ETag, and a request whose If-None-Match
+still matches gets an empty 304. Except for the member list, which comes
+from the per-worker roster cache and hashes its body, the ETag comes from
+the range's data version (``report_cache.report_version``), which is read
+before anything else. A 304 therefore skips the reads as well as the
+transfer. The member history,
+totals, matrix and settlement may be read from a replica (see replica.py).
+A POST validates every count before writing anything. The whole batch is then saved in one
+transaction, the same way as the /meals form (see ``meal_store``).
+"""
+from datetime import date, datetime
+
+from flask import Blueprint, current_app, jsonify, request, abort
+from werkzeug.exceptions import HTTPException
+
+from models import db, Member, current_mess_id
+from history import history_table
+from meal_store import save_day_counts, load_day_counts, ROWS_WRITTEN
+from aggregates import month_bounds, monthly_totals, grand_total
+from importer import MAX_MEAL_COUNT
+from matrix import month_matrix
+from settlement import settlement_for
+from replica import replica_reads
+from report_cache import report_version
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+# Longest range /api/members/<id>/meals returns in one response
+MAX_RANGE_DAYS = 366
+
+
+@api.errorhandler(HTTPException)
+def _json_error(error):
+    return jsonify({'error': error.description}), error.code
+
+
+def _conditional(build, version=None):
+    """JSON response from ``build()`` with an ETag; 304 when the client's copy is current.
+
+    With a data ``version`` the ETag is known before ``build()`` runs, and a
+    304 never calls it. Without one the ETag hashes the built body.
+    """
+    if version is None:
+        response = jsonify(build())
+        response.add_etag()
+        return response.make_conditional(request)
+    # The path and query tell endpoints and members over the same range apart
+    etag = version.with_variant(request.full_path).etag
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    return response
+
+
+def _members():
+    return current_app.extensions['member_directory'].members()
+
+
+@api.route('/members')
+def members():
+    return _conditional(lambda: {'members': [{'id': member.id, 'name': member.name} for member in _members()]})
+
+
+@api.route('/meals/today', methods=['GET'])
+def today_counts():
+    today = date.today()
+
+    def build():
+        counts = load_day_counts(today)
+        # Members being removed still have records until the purge reaches them
+        known_ids = {member.id for member in _members()}
+        return {
+            'date': today.isoformat(),
+            'counts': {str(member_id): count for member_id, count in sorted(counts.items())
+                       if member_id in known_ids},
+        }
+    return _conditional(build, report_version(today, today))
+
+
+@api.route('/meals/today', methods=['POST'])
+def save_today_counts():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('counts'), dict):
+        abort(400, 'Send {"counts": {"<member_id>": <meal_count>, ...}} as JSON.')
+
+    known_ids = {member.id for member in _members()}
+    counts, errors = {}, []
+    for key, meal_count in payload['counts'].items():
+        try:
+            member_id = int(key)
+        except ValueError:
+            errors.append({'member_id': key, 'error': 'member id must be a number'})
+            continue
+        if member_id not in known_ids:
+            errors.append({'member_id': key, 'error': 'unknown member'})
+        elif (not isinstance(meal_count, int) or isinstance(meal_count, bool)
+              or not 0 <= meal_count <= MAX_MEAL_COUNT):
+            errors.append({'member_id': key, 'error': f'meal_count must be an integer from 0 to {MAX_MEAL_COUNT}'})
+        else:
+            counts[member_id] = meal_count
+    if errors:
+        # All or nothing: a kiosk resends the whole batch after fixing it
+        return jsonify({'error': 'No counts were saved.', 'errors': errors}), 400
+
+    today = date.today()
+    written = save_day_counts(today, counts)
+    db.session.commit()
+    ROWS_WRITTEN.observe(written, 'api')
+    return jsonify({'date': today.isoformat(), 'received': len(counts), 'written': written})
+
+
+@api.route('/members/<int:member_id>/meals')
+@replica_reads
+def member_counts(member_id):
+    member = db.session.get(Member, member_id)
+    if member is None or member.removed_at is not None or member.mess_id != current_mess_id():
+        abort(404, 'Member not found.')
+    today = date.today()
+    default_start, default_end = month_bounds(today.year, today.month)
+    try:
+        start_date = _parse_date(request.args.get('start'), default_start)
+        end_date = _parse_date(request.args.get('end'), default_end)
+    except ValueError:
+        abort(400, 'Use start=YYYY-MM-DD and end=YYYY-MM-DD.')
+    if end_date < start_date:
+        abort(400, 'The end date must not be before the start date.')
+    if (end_date - start_date).days >= MAX_RANGE_DAYS:
+        abort(400, f'Ask for at most {MAX_RANGE_DAYS} days at a time.')
+
+    def build():
+        records = history_table(start_date, end_date)
+        rows = db.session.query(records.c.meal_date, records.c.meal_count).filter(
+            records.c.mess_id == member.mess_id,
+            records.c.member_id == member_id,
+            records.c.meal_date >= start_date,
+            records.c.meal_date <= end_date
+        ).order_by(records.c.meal_date).all()
+        return {
+            'member': {'id': member.id, 'name': member.name},
+            'start': start_date.isoformat(),
+            'end': end_date.isoformat(),
+            'counts': [{'date': meal_date.isoformat(), 'meal_count': count} for meal_date, count in rows],
+            'total': sum(count for _, count in rows),
+        }
+    return _conditional(build, report_version(start_date, end_date))
+
+
+@api.route('/totals')
+@replica_reads
+def totals():
+    month_start = _parse_month(request.args.get('month'))
+
+    def build():
+        # Whole months are read from the rollup, one row per member
+        rows = monthly_totals(month_start)
+        return {
+            'month': month_start.strftime('%Y-%m'),
+            'totals': [{'member': name, 'total': total} for name, total in rows],
+            'grand_total': grand_total(rows),
+        }
+    return _conditional(build, report_version(*month_bounds(month_start.year, month_start.month)))
+
+
+@api.route('/matrix')
+@replica_reads
+def matrix():
+    month_start = _parse_month(request.args.get('month'))
+
+    def build():
+        grid = month_matrix(month_start, _members())
+        return {
+            'month': month_start.strftime('%Y-%m'),
+            'days': grid.days,
+            'members': [{'id': member.id, 'name': member.name, 'counts': counts, 'total': total}
+                        for member, counts, total in grid.rows()],
+            'day_totals': grid.column_totals,
+            'total': grid.total,
+        }
+    return _conditional(build, report_version(*month_bounds(month_start.year, month_start.month)))
+
+
+@api.route('/settlement')
+@replica_reads
+def settlement():
+    month_start = _parse_month(request.args.get('month'))
+    start_date, end_date = month_bounds(month_start.year, month_start.month)
+    # Cached per data version, which covers expenses and deposits
+    version = report_version(start_date, end_date)
+    return _conditional(lambda: settlement_for(start_date, end_date, version).to_dict(), version)
+
+
+def _parse_month(value):
+    try:
+        return datetime.strptime(value, '%Y-%m').date() if value else date.today().replace(day=1)
+    except ValueError:
+        abort(400, 'Use month=YYYY-MM.')
+
+
+def _parse_date(value, default):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else default
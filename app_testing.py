@@ -0,0 +1,41 @@
+"""Isolated apps for the test suite.
+
+Every test builds its own app through ``create_app``: an in-memory SQLite
+database, and report jobs and cache stamps in a temporary directory, so
+nothing touches ``instance/`` or leaks between tests.
+"""
+import os
+import shutil
+import tempfile
+
+from flask_testing import TestCase
+
+from app import create_app
+
+
+def isolated_config(directory, **overrides):
+    """Test settings for an app whose files live under ``directory``."""
+    return {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'SECRET_KEY': 'test-secret-key',
+        'REPORT_JOB_DIR': os.path.join(directory, 'report_jobs'),
+        'MEMBER_CACHE_STAMP': os.path.join(directory, 'member_cache.stamp'),
+        'MESS_CACHE_STAMP': os.path.join(directory, 'mess_cache.stamp'),
+        'HISTORY_STAMP': os.path.join(directory, 'history.stamp'),
+        **overrides,
+    }
+
+
+class AppTestCase(TestCase):
+    """flask_testing TestCase on an isolated app.
+
+    Subclasses add or override settings in ``app_config``. The app's files
+    are under ``self.instance_dir``, which is removed after each test.
+    """
+    app_config = {}
+
+    def create_app(self):
+        self.instance_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.instance_dir, True)
+        return create_app(isolated_config(self.instance_dir, **self.app_config))
@@ -0,0 +1,104 @@
+"""Benchmark the admin history page over 365 days, cold vs warm fragment cache.
+
+The page size is raised so a single admin page holds the whole year
+(BENCH_MEMBERS x 366 records). Four scenarios through the Flask test client:
+
+* ``uncached``: FRAGMENT_CACHE_BYTES=0, every date block rendered;
+* ``cold``: the cache is cleared before each request;
+* ``warm``: every past day comes from the cache, only today is rendered;
+* ``warm + edit``: one past record is edited before each request, so
+  that day and today are rendered.
+
+Median and p95 latency are printed, along with the memory the warm cache holds.
+
+    python benchmarks/bench_admin_fragments.py
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import ensure_dataset
+from loadtest import ROOT, percentile
+
+sys.path.insert(0, ROOT)
+
+MEMBERS = int(os.getenv('BENCH_MEMBERS', 30))
+DAYS = 365
+REQUESTS = int(os.getenv('BENCH_REQUESTS', 30))
+
+
+def build_app(database_url, cache_bytes):
+    from app import create_app
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'ADMIN_PAGE_SIZE': MEMBERS * (DAYS + 1),
+        'FRAGMENT_CACHE_BYTES': cache_bytes,
+        'METRICS_ENABLED': False,
+        'TESTING': True,
+    })
+
+
+def measure(bench_app, before_each=None):
+    from models import db, MealRecord
+
+    client = bench_app.test_client()
+    with client.session_transaction() as sess:
+        sess['admin_logged_in'] = True
+    path = f'/admin?days={DAYS}'
+    client.get(path).get_data()  # warm-up
+    latencies = []
+    for i in range(REQUESTS):
+        if before_each is not None:
+            with bench_app.app_context():
+                before_each(i, db, MealRecord)
+        started = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+    latencies.sort()
+    return statistics.median(latencies) * 1000, percentile(latencies, 0.95) * 1000
+
+
+def main():
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    database_url = f'sqlite:///{path}'
+    try:
+        members, records = ensure_dataset(database_url, MEMBERS, DAYS)
+        print(f'dataset: {members} members, {records} records, {DAYS}-day admin view on one page')
+
+        uncached = build_app(database_url, 0)
+        cached = build_app(database_url, 64 * 1024 * 1024)
+        cache = cached.extensions['fragment_cache']
+
+        def clear(i, db, MealRecord):
+            cache.clear()
+
+        def edit_one_day(i, db, MealRecord):
+            meal_date = date.today() - timedelta(days=1 + i % (DAYS - 1))
+            record = MealRecord.query.filter_by(meal_date=meal_date).first()
+            record.meal_count = (record.meal_count + 1) % 4
+            db.session.commit()
+
+        print(f"{'scenario':>12} {'p50 ms':>8} {'p95 ms':>8}")
+        for label, bench_app, before_each in (
+            ('uncached', uncached, None),
+            ('cold', cached, clear),
+            ('warm', cached, None),
+            ('warm + edit', cached, edit_one_day),
+        ):
+            p50, p95 = measure(bench_app, before_each)
+            print(f'{label:>12} {p50:>8.1f} {p95:>8.1f}')
+        print(f'warm cache: {len(cache)} fragments, {cache.size / 1024:.0f} KiB')
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Benchmark the JSON API against the HTML form path for daily meal entry.
+
+Through the Flask test client, on a synthetic dataset (BENCH_MEMBERS
+members, BENCH_DAYS days of history), in this process:
+
+* ``form save``: POST /meals with every member's count, then the redirect
+  to GET /meals, which is what a browser does;
+* ``api save``: POST /api/meals/today with the same counts as JSON;
+* ``form read`` / ``api read``: GET /meals vs GET /api/meals/today;
+* ``api 304``: GET /api/meals/today revalidated with If-None-Match.
+
+Each save changes a tenth of the counts, so every request writes.
+
+    python benchmarks/bench_api.py
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import ensure_dataset
+from loadtest import ROOT, percentile
+
+sys.path.insert(0, ROOT)
+
+MEMBERS = int(os.getenv('BENCH_MEMBERS', 30))
+DAYS = int(os.getenv('BENCH_DAYS', 90))
+REQUESTS = int(os.getenv('BENCH_REQUESTS', 300))
+
+
+def counts_for(member_ids, i):
+    return {member_id: (1 + (n + i) // 10) % 4 if n % 10 == i % 10 else 1
+            for n, member_id in enumerate(member_ids)}
+
+
+def measure(call):
+    call(-1)  # warm-up
+    latencies = []
+    started = time.perf_counter()
+    for i in range(REQUESTS):
+        request_started = time.perf_counter()
+        response = call(i)
+        latencies.append(time.perf_counter() - request_started)
+        assert response.status_code in (200, 304), response.status_code
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return REQUESTS / wall, statistics.median(latencies) * 1000, percentile(latencies, 0.95) * 1000
+
+
+def main():
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    database_url = f'sqlite:///{path}'
+    try:
+        members, records = ensure_dataset(database_url, MEMBERS, DAYS)
+        print(f'dataset: {members} members, {records} records')
+
+        from app import create_app
+        bench_app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'METRICS_ENABLED': False})
+        client = bench_app.test_client()
+        with bench_app.app_context():
+            member_ids = [member.id for member in bench_app.extensions['member_directory'].members()]
+        today_str = date.today().strftime('%Y-%m-%d')
+
+        def form_save(i):
+            form = {f'meal_count_{today_str}_{member_id}': str(count)
+                    for member_id, count in counts_for(member_ids, i).items()}
+            return client.post('/meals', data=form, follow_redirects=True)
+
+        def api_save(i):
+            counts = {str(member_id): count for member_id, count in counts_for(member_ids, i).items()}
+            return client.post('/api/meals/today', json={'counts': counts})
+
+        etag = None
+
+        print(f"{'scenario':>10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for label, call in (
+            ('form save', form_save),
+            ('api save', api_save),
+            ('form read', lambda i: client.get('/meals')),
+            ('api read', lambda i: client.get('/api/meals/today')),
+            ('api 304', lambda i: client.get('/api/meals/today', headers={'If-None-Match': etag})),
+        ):
+            if label == 'api 304':
+                etag = client.get('/api/meals/today').headers['ETag']
+            rps, p50, p95 = measure(call)
+            print(f'{label:>10} {rps:>8.1f} {p50:>8.2f} {p95:>8.2f}')
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
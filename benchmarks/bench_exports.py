@@ -0,0 +1,83 @@
+"""Benchmark streaming CSV / JSON-lines exports in rows per second.
+
+Fills a throwaway SQLite database with BENCH_MEMBERS members x BENCH_DAYS
+days of meal records, then drains each export generator the way the
+response would, reporting throughput and the growth in peak RSS.
+
+    python benchmarks/bench_exports.py
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, Member, MealRecord
+from exports import export_rows, csv_chunks, jsonl_chunks
+from tenancy import ensure_default_mess
+
+MEMBERS = int(os.getenv('BENCH_MEMBERS', 100))
+DAYS = int(os.getenv('BENCH_DAYS', 1000))
+
+
+def make_app(path):
+    bench_app = Flask(__name__)
+    bench_app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(bench_app)
+    return bench_app
+
+
+def generate():
+    db.create_all()
+    ensure_default_mess('Banasree Boys')
+    now = datetime.utcnow()
+    db.session.execute(Member.__table__.insert(), [
+        {'name': f'Member {i:04d}', 'created_at': now} for i in range(MEMBERS)
+    ])
+    member_ids = [member_id for (member_id,) in db.session.query(Member.id)]
+    start = date.today() - timedelta(days=DAYS - 1)
+    for offset in range(DAYS):
+        day = start + timedelta(days=offset)
+        db.session.execute(MealRecord.__table__.insert(), [
+            {'member_id': member_id, 'meal_date': day, 'meal_count': (offset + member_id) % 4,
+             'created_at': now, 'updated_at': now}
+            for member_id in member_ids
+        ])
+    db.session.commit()
+    return MEMBERS * DAYS
+
+
+def drain(serialise):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    size = 0
+    for chunk in serialise(export_rows()):
+        size += len(chunk)
+    elapsed = time.perf_counter() - started
+    growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    return elapsed, size, growth
+
+
+def main():
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    try:
+        with make_app(path).app_context():
+            rows = generate()
+            print(f'{rows} records ({MEMBERS} members x {DAYS} days)')
+            print(f"{'format':>6} {'seconds':>8} {'rows/s':>10} {'MB out':>8} {'RSS +MB':>8}")
+            for label, serialise in (('csv', csv_chunks), ('jsonl', jsonl_chunks)):
+                elapsed, size, growth = drain(serialise)
+                print(f'{label:>6} {elapsed:>8.2f} {rows / elapsed:>10.0f} '
+                      f'{size / 1024 / 1024:>8.1f} {growth / 1024:>8.1f}')
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
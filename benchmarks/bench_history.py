@@ -0,0 +1,125 @@
+"""Benchmark hot-path latency as total history grows, with and without the archive.
+
+For each history length (BENCH_YEARS, default 1,3,6 years of BENCH_MEMBERS
+members), two databases are built. One keeps everything in meal_records.
+The other has been through ``archive_closed_months(ARCHIVE_KEEP_MONTHS)``.
+Requests go through the Flask test client with the report cache off. They
+alternate between the two databases so drift and warm-up hit both alike.
+
+* ``meals``: GET /meals
+* ``save``: POST /api/meals/today (every count changes)
+* ``admin_30``: GET /admin?days=30
+* ``csv_month`` / ``csv_old``: /export.csv for the current month and for a
+  month a year ago (the latter reads the archive)
+* ``pdf_month``: GET /export-pdf?detail=1 for the current month
+
+The median latency in ms is printed for each.
+
+    python benchmarks/bench_history.py
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import ensure_dataset
+from loadtest import ROOT
+
+sys.path.insert(0, ROOT)
+
+MEMBERS = int(os.getenv('BENCH_MEMBERS', 30))
+YEARS = [int(years) for years in os.getenv('BENCH_YEARS', '1,3,6').split(',')]
+KEEP_MONTHS = int(os.getenv('ARCHIVE_KEEP_MONTHS', 3))
+REQUESTS = int(os.getenv('BENCH_REQUESTS', 50))
+
+
+def endpoints():
+    today = date.today()
+    month_start = today.replace(day=1)
+    old_start = date(today.year - 1, today.month, 1)
+    old_end = (old_start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+    return (
+        ('meals', 'get', '/meals'),
+        ('save', 'post', '/api/meals/today'),
+        ('admin_30', 'get', '/admin?days=30'),
+        ('csv_month', 'get', f'/export.csv?start={month_start}&end={today}'),
+        ('csv_old', 'get', f'/export.csv?start={old_start}&end={old_end}'),
+        ('pdf_month', 'get', '/export-pdf?detail=1'),
+    )
+
+
+def measure(bench_apps):
+    """Median ms per endpoint for each app, alternating between the apps."""
+    clients = []
+    for bench_app in bench_apps:
+        client = bench_app.test_client()
+        with client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        with bench_app.app_context():
+            member_ids = [member.id for member in bench_app.extensions['member_directory'].members()]
+        clients.append((client, member_ids))
+
+    results = [{} for _ in bench_apps]
+    for name, method, path in endpoints():
+        latencies = [[] for _ in bench_apps]
+        for i in range(REQUESTS + 1):
+            for (client, member_ids), app_latencies in zip(clients, latencies):
+                kwargs = {}
+                if method == 'post':
+                    kwargs['json'] = {'counts': {str(member_id): (i + n) % 4 for n, member_id in enumerate(member_ids)}}
+                started = time.perf_counter()
+                response = getattr(client, method)(path, **kwargs)
+                response.get_data()
+                if i:  # the first request warms caches
+                    app_latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, (path, response.status_code)
+        for app_results, app_latencies in zip(results, latencies):
+            app_results[name] = statistics.median(app_latencies) * 1000
+    return results
+
+
+def build(years, archive):
+    from app import create_app
+    from history import archive_closed_months
+    from models import db
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    database_url = f'sqlite:///{path}'
+    _, records = ensure_dataset(database_url, MEMBERS, years * 365)
+    stamp_dir = tempfile.mkdtemp()
+    bench_app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'REPORT_CACHE_BYTES': 0,
+        'METRICS_ENABLED': False,
+        'MEMBER_CACHE_STAMP': os.path.join(stamp_dir, 'member_cache.stamp'),
+        'HISTORY_STAMP': os.path.join(stamp_dir, 'history.stamp'),
+    })
+    with bench_app.app_context():
+        db.create_all()
+        if archive:
+            archive_closed_months(KEEP_MONTHS)
+    return bench_app, path, records
+
+
+def main():
+    names = [name for name, _, _ in endpoints()]
+    print(f'{MEMBERS} members, keeping {KEEP_MONTHS} months hot; median ms per request')
+    print(f"{'years':>5} {'records':>8} {'layout':>8} " + ' '.join(f'{name:>10}' for name in names))
+    for years in YEARS:
+        builds = [build(years, archive) for archive in (False, True)]
+        try:
+            results = measure([bench_app for bench_app, _, _ in builds])
+        finally:
+            for _, path, _ in builds:
+                os.remove(path)
+        for layout, (_, _, records), row in zip(('single', 'archived'), builds, results):
+            print(f'{years:>5} {records:>8} {layout:>8} ' + ' '.join(f'{row[name]:>10.2f}' for name in names))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark bulk imports of BENCH_ROWS records from CSV and JSON lines.
+
+Generates an upload for BENCH_MEMBERS members over as many days as needed,
+imports it into a throwaway SQLite database, then imports it again so the
+second pass measures the all-unchanged path.
+
+    python benchmarks/bench_import.py
+"""
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, Member
+from importer import parse_csv, parse_jsonl, import_records
+
+ROWS = int(os.getenv('BENCH_ROWS', 100000))
+MEMBERS = int(os.getenv('BENCH_MEMBERS', 100))
+
+
+def make_app(path):
+    bench_app = Flask(__name__)
+    bench_app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(bench_app)
+    return bench_app
+
+
+def upload_rows():
+    start = date.today() - timedelta(days=ROWS // MEMBERS)
+    for i in range(ROWS):
+        yield f'Member {i % MEMBERS:04d}', (start + timedelta(days=i // MEMBERS)).isoformat(), i % 5
+
+
+def csv_upload():
+    lines = ['member_name,meal_date,meal_count']
+    lines.extend(f'{name},{meal_date},{count}' for name, meal_date, count in upload_rows())
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def jsonl_upload():
+    return ''.join(
+        json.dumps({'member_name': name, 'meal_date': meal_date, 'meal_count': count}) + '\n'
+        for name, meal_date, count in upload_rows()
+    ).encode('utf-8')
+
+
+def run(label, parser, body):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(Member.__table__.insert(), [
+        {'name': f'Member {i:04d}', 'created_at': datetime.utcnow()} for i in range(MEMBERS)
+    ])
+    db.session.commit()
+    for attempt in ('fresh', 'repeat'):
+        started = time.perf_counter()
+        summary = import_records(parser(io.BytesIO(body)))
+        elapsed = time.perf_counter() - started
+        print(f'{label:>6} {attempt:>7} {elapsed:>8.2f} {ROWS / elapsed:>10.0f} '
+              f'{summary.inserted:>9} {summary.unchanged:>10}')
+
+
+def main():
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    try:
+        with make_app(path).app_context():
+            print(f'{ROWS} rows ({MEMBERS} members)')
+            print(f"{'format':>6} {'pass':>7} {'seconds':>8} {'rows/s':>10} {'inserted':>9} {'unchanged':>10}")
+            run('csv', parse_csv, csv_upload())
+            run('jsonl', parse_jsonl, jsonl_upload())
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Benchmark building the monthly members x days grid.
+
+On a synthetic dataset (BENCH_MEMBERS members, default 200, times
+BENCH_MONTHS months, default 24), every month of the history is built both
+ways. The median per month is printed:
+
+* ``orm``: MealRecord objects for the month grouped into a dict of per-member
+  lists, with the totals summed in Python. This is how the admin page
+  groups records;
+* ``matrix``: ``matrix.month_matrix``, plain rows into an array with the
+  totals summed over slices.
+
+Both produce the same grid, which is checked. The full ``GET /api/matrix``
+and ``GET /admin/matrix`` requests for the latest closed month are timed
+too.
+
+    python benchmarks/bench_matrix.py
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import ensure_dataset
+from loadtest import ROOT
+
+sys.path.insert(0, ROOT)
+
+MEMBERS = int(os.getenv('BENCH_MEMBERS', 200))
+MONTHS = int(os.getenv('BENCH_MONTHS', 24))
+REPEAT = int(os.getenv('BENCH_REPEAT', 5))
+REQUESTS = int(os.getenv('BENCH_REQUESTS', 20))
+
+
+def orm_grid(month_start, members):
+    from aggregates import month_bounds
+    from models import MealRecord
+
+    start_date, end_date = month_bounds(month_start.year, month_start.month)
+    days = end_date.day
+    grid = {member.id: [0] * days for member in members}
+    records = MealRecord.query.filter(MealRecord.meal_date >= start_date,
+                                      MealRecord.meal_date <= end_date).all()
+    for record in records:
+        row = grid.get(record.member_id)
+        if row is not None:
+            row[record.meal_date.day - 1] = record.meal_count
+    rows = [grid[member.id] for member in members]
+    row_totals = [sum(row) for row in rows]
+    column_totals = [sum(column) for column in zip(*rows)]
+    return rows, row_totals, column_totals, sum(row_totals)
+
+
+def matrix_grid(month_start, members):
+    from matrix import month_matrix
+
+    matrix = month_matrix(month_start, members)
+    rows = [counts for _, counts, _ in matrix.rows()]
+    return rows, matrix.row_totals, matrix.column_totals, matrix.total
+
+
+def months_back(count):
+    month_start = date.today().replace(day=1)
+    months = []
+    for _ in range(count):
+        month_start = (month_start - timedelta(days=1)).replace(day=1)
+        months.append(month_start)
+    return months
+
+
+def time_request(client, path):
+    latencies = []
+    for i in range(REQUESTS + 1):
+        started = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        if i:  # the first request warms caches
+            latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, (path, response.status_code)
+    return statistics.median(latencies) * 1000
+
+
+def main():
+    from app import create_app
+    from models import db
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    database_url = f'sqlite:///{path}'
+    stamp_dir = tempfile.mkdtemp()
+    try:
+        members, records = ensure_dataset(database_url, MEMBERS, (MONTHS + 1) * 31)
+        print(f'dataset: {members} members, {records} records')
+        bench_app = create_app({
+            'SQLALCHEMY_DATABASE_URI': database_url,
+            'METRICS_ENABLED': False,
+            'MEMBER_CACHE_STAMP': os.path.join(stamp_dir, 'member_cache.stamp'),
+            'HISTORY_STAMP': os.path.join(stamp_dir, 'history.stamp'),
+        })
+        with bench_app.app_context():
+            db.create_all()
+            entries = bench_app.extensions['member_directory'].members()
+            months = months_back(MONTHS)
+            timings = {'orm': [], 'matrix': []}
+            for month_start in months:
+                for name, build in (('orm', orm_grid), ('matrix', matrix_grid)):
+                    latencies = []
+                    for _ in range(REPEAT):
+                        started = time.perf_counter()
+                        grid = build(month_start, entries)
+                        latencies.append(time.perf_counter() - started)
+                        db.session.remove()
+                    timings[name].append(min(latencies))
+                    if name == 'orm':
+                        expected = grid
+                    else:
+                        assert grid == expected, month_start
+            print(f'{MONTHS} months; median over months of the best of {REPEAT} builds')
+            for name, latencies in timings.items():
+                print(f'  {name:<8} {statistics.median(latencies) * 1000:8.2f} ms')
+
+        client = bench_app.test_client()
+        with client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        month = months[0].strftime('%Y-%m')
+        for url in (f'/api/matrix?month={month}', f'/admin/matrix?month={month}'):
+            print(f'  GET {url:<28} {time_request(client, url):8.2f} ms')
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark the daily /meals save at 10, 100 and 1,000 members.
+
+Compares the original one-SELECT-per-member loop with the bulk upsert path
+in meal_store.py, without (``bulk``, as the JSON API saves) and with
+(``form``) the per-member versions the /meals form was rendered with. Runs against a throwaway SQLite file by default; set
+BENCH_DATABASE_URL to point it at a local PostgreSQL instead.
+
+    python benchmarks/bench_meals_save.py
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+from flask import Flask
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, Member, MealRecord
+from meal_store import save_day_counts, save_day_edits, load_day_records
+
+SIZES = (10, 100, 1000)
+
+
+def make_app():
+    bench_app = Flask(__name__)
+    database_url = os.getenv('BENCH_DATABASE_URL')
+    if not database_url:
+        handle, path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        database_url = f'sqlite:///{path}'
+    bench_app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(bench_app)
+    return bench_app
+
+
+def legacy_save(meal_date, counts):
+    """The pre-bulk /meals loop: one SELECT per member, ORM flush at commit."""
+    for member_id, meal_count in counts.items():
+        record = MealRecord.query.filter_by(member_id=member_id, meal_date=meal_date).first()
+        if record:
+            record.meal_count = meal_count
+            record.updated_at = datetime.utcnow()
+        else:
+            db.session.add(MealRecord(member_id=member_id, meal_date=meal_date, meal_count=meal_count))
+
+
+def form_save(meal_date, counts, bases):
+    """The /meals form: counts posted with the versions the page was rendered at."""
+    save_day_edits(meal_date, counts, bases)
+
+
+def measure(save, meal_date, counts):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        started = time.perf_counter()
+        save(meal_date, counts)
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements), elapsed * 1000
+
+
+def run_size(size):
+    results = []
+    for label, save in (('legacy', legacy_save), ('bulk', save_day_counts), ('form', form_save)):
+        db.drop_all()
+        db.create_all()
+        members = [Member(name=f'Member {i:05d}') for i in range(size)]
+        db.session.add_all(members)
+        db.session.commit()
+        member_ids = [m.id for m in members]
+        today = date.today()
+
+        first = {member_id: 2 for member_id in member_ids}
+        # A typical re-save: a tenth of the members change their count
+        resave = {member_id: (3 if i % 10 == 0 else 2) for i, member_id in enumerate(member_ids)}
+
+        for phase, counts in (('first save', first), ('resave', resave), ('no change', resave)):
+            if save is form_save:
+                # The page load, outside the timed save
+                records = load_day_records(today)
+                bases = {member_id: (records[member_id][1], records[member_id][0]) if member_id in records else None
+                         for member_id in member_ids}
+                queries, ms = measure(lambda day, day_counts: form_save(day, day_counts, bases), today, counts)
+            else:
+                queries, ms = measure(save, today, counts)
+            results.append((size, label, phase, queries, ms))
+    return results
+
+
+def main():
+    bench_app = make_app()
+    print(f"{'members':>8} {'path':>7} {'phase':>11} {'queries':>8} {'ms':>10}")
+    with bench_app.app_context():
+        for size in SIZES:
+            for size_, label, phase, queries, ms in run_size(size):
+                print(f'{size_:>8} {label:>7} {phase:>11} {queries:>8} {ms:>10.2f}')
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
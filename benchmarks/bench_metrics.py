@@ -0,0 +1,66 @@
+"""Benchmark the per-request cost of the /metrics instrumentation.
+
+BENCH_REQUESTS requests (default 200) to the home page through the test
+client, with METRICS_ENABLED on and then off, best of BENCH_RUNS rounds
+(default 3). The difference is the time the request hooks add. It should
+stay well under a millisecond.
+
+    python benchmarks/bench_metrics.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadtest import ROOT
+
+sys.path.insert(0, ROOT)
+
+REQUESTS = int(os.getenv('BENCH_REQUESTS', 200))
+RUNS = int(os.getenv('BENCH_RUNS', 3))
+
+
+def per_request(bench_app, enabled, requests=REQUESTS):
+    bench_app.config['METRICS_ENABLED'] = enabled
+    client = bench_app.test_client()
+    best = None
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get('/')
+        elapsed = (time.perf_counter() - started) / requests
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    from app import create_app
+    from models import db
+
+    directory = tempfile.mkdtemp()
+    try:
+        bench_app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'REPORT_JOB_DIR': os.path.join(directory, 'report_jobs'),
+            'MEMBER_CACHE_STAMP': os.path.join(directory, 'member_cache.stamp'),
+            'MESS_CACHE_STAMP': os.path.join(directory, 'mess_cache.stamp'),
+            'HISTORY_STAMP': os.path.join(directory, 'history.stamp'),
+        })
+        with bench_app.app_context():
+            db.create_all()
+        per_request(bench_app, True, 20)
+        enabled = per_request(bench_app, True)
+        disabled = per_request(bench_app, False)
+        print(f'{REQUESTS} requests, best of {RUNS}')
+        print(f'  metrics on  {enabled * 1e6:8.0f} us per request')
+        print(f'  metrics off {disabled * 1e6:8.0f} us per request')
+        print(f'  overhead    {(enabled - disabled) * 1e6:8.0f} us per request')
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Benchmark meal saves while reports scan history, with and without a replica.
+
+On a synthetic dataset (BENCH_MEMBERS members, default 100, over
+BENCH_DAYS days, default 730) in a SQLite file, BENCH_READERS threads
+(default 4) keep downloading the full CSV export and a year of one
+member's history. Meanwhile one client saves today's counts through
+POST /api/meals/today BENCH_REQUESTS times (default 50). This runs twice:
+
+* ``primary``: one database, as without DATABASE_REPLICA_URL;
+* ``replica``: a copy of the file is the replica, so the reads leave the
+  file the saves write to.
+
+The save latency, the reads completed (and failed) and the SQL statements
+per bind (from ``query_stats``) are printed for each run. With SQLite a long read
+holds the file's shared lock, so on the primary a save waits for the
+read in front of it. A PostgreSQL primary does not lock like this. There
+the gain is the I/O and CPU the scans no longer take from the primary.
+
+    python benchmarks/bench_replica.py
+"""
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import ensure_dataset
+from loadtest import ROOT, percentile
+
+sys.path.insert(0, ROOT)
+
+MEMBERS = int(os.getenv('BENCH_MEMBERS', 100))
+DAYS = int(os.getenv('BENCH_DAYS', 730))
+READERS = int(os.getenv('BENCH_READERS', 4))
+REQUESTS = int(os.getenv('BENCH_REQUESTS', 50))
+
+
+def run(bench_app, member_ids):
+    from query_stats import STATEMENTS_BY_BIND
+
+    today = date.today()
+    year_ago = today - timedelta(days=364)
+    read_paths = ('/export.csv', f'/api/members/{member_ids[0]}/meals?start={year_ago}&end={today}')
+    statements = {bind: STATEMENTS_BY_BIND.value(bind) for bind in ('default', 'replica')}
+    stop = threading.Event()
+    reads, errors = [], []
+
+    def read():
+        client = bench_app.test_client()
+        done = failed = 0
+        while not stop.is_set():
+            for path in read_paths:
+                try:
+                    response = client.get(path)
+                    response.get_data()
+                    ok = response.status_code == 200
+                except Exception:
+                    # SQLite's busy timeout ran out while a save held the file
+                    ok = False
+                done += ok
+                failed += not ok
+        reads.append(done)
+        errors.append(failed)
+
+    threads = [threading.Thread(target=read) for _ in range(READERS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+
+    client = bench_app.test_client()
+    latencies = []
+    for i in range(REQUESTS):
+        counts = {str(member_id): (i + position) % 4 for position, member_id in enumerate(member_ids)}
+        started = time.perf_counter()
+        response = client.post('/api/meals/today', json={'counts': counts})
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return {
+        'save_p50': statistics.median(latencies) * 1000,
+        'save_p95': percentile(latencies, 0.95) * 1000,
+        'reads': sum(reads),
+        'read_errors': sum(errors),
+        'statements': {bind: STATEMENTS_BY_BIND.value(bind) - count for bind, count in statements.items()},
+    }
+
+
+def main():
+    from app import create_app
+    from models import db, Member
+    from replica import REPLICA_BIND
+
+    directory = tempfile.mkdtemp()
+    primary = os.path.join(directory, 'primary.db')
+    try:
+        members, records = ensure_dataset(f'sqlite:///{primary}', MEMBERS, DAYS)
+        print(f'dataset: {members} members, {records} records; {READERS} readers, {REQUESTS} saves')
+        shutil.copy(primary, os.path.join(directory, 'replica.db'))
+        for name in ('primary', 'replica'):
+            config = {
+                'SQLALCHEMY_DATABASE_URI': f'sqlite:///{primary}',
+                'METRICS_ENABLED': False,
+                'MEMBER_CACHE_STAMP': os.path.join(directory, f'{name}-member_cache.stamp'),
+                'MESS_CACHE_STAMP': os.path.join(directory, f'{name}-mess_cache.stamp'),
+                'HISTORY_STAMP': os.path.join(directory, f'{name}-history.stamp'),
+            }
+            if name == 'replica':
+                config['SQLALCHEMY_REPLICA_URI'] = f"sqlite:///{os.path.join(directory, 'replica.db')}"
+            bench_app = create_app(config)
+            with bench_app.app_context():
+                member_ids = [member_id for (member_id,) in db.session.query(Member.id).limit(20)]
+            result = run(bench_app, member_ids)
+            print(f"  {name:<8} save p50 {result['save_p50']:8.2f} ms  p95 {result['save_p95']:8.2f} ms  "
+                  f"reads {result['reads']:5d} ({result['read_errors']} failed)  statements {result['statements']}")
+            with bench_app.app_context():
+                for engine in db.engines.values():
+                    engine.dispose()
+            db.metadatas.pop(REPLICA_BIND, None)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
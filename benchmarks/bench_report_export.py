@@ -0,0 +1,120 @@
+"""Benchmark 1-, 12- and 60-month PDF exports: peak RSS and wall time.
+
+Builds a synthetic SQLite dataset (BENCH_MEMBERS members with a record for
+every day of the last 60 months), then renders each export in a fresh
+child process so its peak RSS is measured in isolation. Both the summary
+and the per-day breakdown are measured.
+
+    python benchmarks/bench_report_export.py
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, Member, MealRecord
+from aggregates import month_bounds, range_totals, daily_counts
+from rollups import rebuild_rollups
+from tenancy import ensure_default_mess
+
+MONTHS = (1, 12, 60)
+MEMBERS = int(os.getenv('BENCH_MEMBERS', 30))
+
+
+def make_app(path):
+    bench_app = Flask(__name__)
+    bench_app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(bench_app)
+    return bench_app
+
+
+def month_range(months):
+    """The last ``months`` whole calendar months, ending with the current one."""
+    today = date.today()
+    end_date = month_bounds(today.year, today.month)[1]
+    year, month = today.year, today.month - (months - 1)
+    while month < 1:
+        month += 12
+        year -= 1
+    return date(year, month, 1), end_date
+
+
+def generate(path):
+    bench_app = make_app(path)
+    with bench_app.app_context():
+        db.create_all()
+        ensure_default_mess('Banasree Boys')
+        db.session.execute(Member.__table__.insert(), [
+            {'name': f'Member {i:03d}', 'created_at': datetime.utcnow()} for i in range(MEMBERS)
+        ])
+        member_ids = [member_id for (member_id,) in db.session.query(Member.id)]
+        start_date, end_date = month_range(max(MONTHS))
+        now = datetime.utcnow()
+        day = start_date
+        while day <= end_date:
+            db.session.execute(MealRecord.__table__.insert(), [
+                {'member_id': member_id, 'meal_date': day, 'meal_count': (day.toordinal() + member_id) % 4,
+                 'created_at': now, 'updated_at': now}
+                for member_id in member_ids
+            ])
+            day += timedelta(days=1)
+        rebuild_rollups()
+        db.session.commit()
+        return db.session.query(MealRecord).count()
+
+
+def child(path, months, detail):
+    """Render one export and print its measurements as JSON."""
+    from reports import write_report
+
+    bench_app = make_app(path)
+    with bench_app.app_context():
+        start_date, end_date = month_range(months)
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        totals = range_totals(start_date, end_date)
+        rows = daily_counts(start_date, end_date) if detail else None
+        with tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024) as output:
+            write_report(output, start_date, end_date, totals, rows)
+            size = output.tell()
+        elapsed = time.perf_counter() - started
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'seconds': elapsed, 'peak_kb': peak, 'render_kb': peak - baseline, 'bytes': size}))
+
+
+def main():
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    try:
+        started = time.perf_counter()
+        records = generate(path)
+        print(f'dataset: {MEMBERS} members, {records} records '
+              f'({time.perf_counter() - started:.1f}s to generate)')
+        print(f"{'months':>6} {'report':>8} {'seconds':>8} {'peak MB':>8} {'render MB':>10} {'PDF KB':>8}")
+        for detail in (False, True):
+            for months in MONTHS:
+                output = subprocess.run(
+                    [sys.executable, __file__, '--child', path, str(months), '1' if detail else '0'],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{months:>6} {'detail' if detail else 'summary':>8} {result['seconds']:>8.2f} "
+                      f"{result['peak_kb'] / 1024:>8.1f} {result['render_kb'] / 1024:>10.1f} "
+                      f"{result['bytes'] / 1024:>8.0f}")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '--child':
+        child(sys.argv[2], int(sys.argv[3]), sys.argv[4] == '1')
+    else:
+        main()
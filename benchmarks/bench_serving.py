@@ -0,0 +1,120 @@
+"""Benchmark sync vs gevent gunicorn workers under concurrent load.
+
+Both profiles from gunicorn.conf.py run with the same number of workers
+on the same synthetic SQLite dataset. Two scenarios:
+
+* ``meals``: BENCH_CLIENTS concurrent clients hammering GET /meals;
+* ``meals + pdf``: the same, while BENCH_PDF_CLIENTS clients keep
+  requesting a 12-month daily-breakdown PDF, which is the lunch-time
+  situation of slow exports tying up workers.
+
+For each, /meals throughput and p50/p95/p99 latency are printed, plus the
+number of PDFs finished and their rate over the run. The runs differ in
+length, so compare PDF rates rather than counts.
+
+    python benchmarks/bench_serving.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import ensure_dataset
+from loadtest import ROOT, _free_port, _wait_for, percentile
+
+WORKERS = int(os.getenv('BENCH_WORKERS', 2))
+CLIENTS = int(os.getenv('BENCH_CLIENTS', 50))
+PDF_CLIENTS = int(os.getenv('BENCH_PDF_CLIENTS', 4))
+REQUESTS = int(os.getenv('BENCH_REQUESTS', 1000))
+MEMBERS = int(os.getenv('BENCH_MEMBERS', 30))
+DAYS = int(os.getenv('BENCH_DAYS', 400))
+
+
+def fetch(url):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=300) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def run_scenario(base_url, with_pdfs):
+    today = date.today()
+    pdf_url = (f'{base_url}/export-pdf?detail=1&start={(today - timedelta(days=365)).isoformat()}'
+               f'&end={today.isoformat()}')
+    stop = threading.Event()
+    pdfs = []
+
+    def pdf_client():
+        while not stop.is_set():
+            pdfs.append(fetch(pdf_url))
+
+    pdf_threads = [threading.Thread(target=pdf_client) for _ in range(PDF_CLIENTS if with_pdfs else 0)]
+    for thread in pdf_threads:
+        thread.start()
+    try:
+        if with_pdfs:
+            time.sleep(0.5)  # let the exports occupy the workers first
+        with ThreadPoolExecutor(max_workers=CLIENTS) as pool:
+            started = time.perf_counter()
+            latencies = sorted(pool.map(fetch, [base_url + '/meals'] * REQUESTS))
+            wall = time.perf_counter() - started
+    finally:
+        stop.set()
+        for thread in pdf_threads:
+            thread.join()
+    return {
+        'rps': REQUESTS / wall,
+        'p50': percentile(latencies, 0.50) * 1000,
+        'p95': percentile(latencies, 0.95) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+        'pdfs': len(pdfs),
+        'pdf_rate': len(pdfs) / wall,
+    }
+
+
+def run_profile(profile, database_url):
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, REPORT_CACHE_BYTES='0', WEB_PROFILE=profile,
+               WEB_CONCURRENCY=str(WORKERS), WEB_TIMEOUT='300', METRICS_ENABLED='False')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'],
+        cwd=ROOT, env=env
+    )
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        _wait_for(base_url + '/meals', process)
+        fetch(base_url + '/export-pdf')  # warm the lazy imports in at least one worker
+        return [(label, run_scenario(base_url, with_pdfs))
+                for label, with_pdfs in (('meals', False), ('meals + pdf', True))]
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    database_url = f'sqlite:///{path}'
+    try:
+        members, records = ensure_dataset(database_url, MEMBERS, DAYS)
+        print(f'dataset: {members} members, {records} records; {WORKERS} workers, '
+              f'{CLIENTS} /meals clients, {PDF_CLIENTS} PDF clients')
+        print(f"{'profile':>8} {'scenario':>12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'PDFs':>5} {'PDF/s':>6}")
+        for profile in ('sync', 'gevent'):
+            for label, row in run_profile(profile, database_url):
+                print(f"{profile:>8} {label:>12} {row['rps']:>8.1f} {row['p50']:>8.1f} "
+                      f"{row['p95']:>8.1f} {row['p99']:>8.1f} {row['pdfs'] if label != 'meals' else '':>5} "
+                      f"{format(row['pdf_rate'], '.2f') if label != 'meals' else '':>6}")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
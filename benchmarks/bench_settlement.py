@@ -0,0 +1,152 @@
+"""Benchmark settling a month against a large expense and deposit ledger.
+
+On a synthetic dataset (BENCH_MEMBERS members, default 200, over
+BENCH_MONTHS months, default 24), the ledger holds BENCH_EXPENSES_PER_DAY
+expenses a day and BENCH_DEPOSITS_PER_MONTH deposits per member and month.
+Every closed month is settled three ways. The median per month is
+printed:
+
+* ``per_member``: the expense total, then the meal total and the deposit
+  sum of each member, one query each;
+* ``settle``: ``settlement.settle``, one set-based query;
+* ``cached``: ``settlement.settlement_for`` once warm, which is the data
+  version query and a cache hit.
+
+The first two are checked to agree.
+
+    python benchmarks/bench_settlement.py
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import ensure_dataset
+from loadtest import ROOT
+
+sys.path.insert(0, ROOT)
+
+MEMBERS = int(os.getenv('BENCH_MEMBERS', 200))
+MONTHS = int(os.getenv('BENCH_MONTHS', 24))
+EXPENSES_PER_DAY = int(os.getenv('BENCH_EXPENSES_PER_DAY', 20))
+DEPOSITS_PER_MONTH = int(os.getenv('BENCH_DEPOSITS_PER_MONTH', 4))
+REPEAT = int(os.getenv('BENCH_REPEAT', 5))
+
+
+def fill_ledger(days, seed=0):
+    """Add expenses and deposits for the ``days`` days ending today."""
+    from models import db, Member, Expense, Deposit
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    start_date = date.today() - timedelta(days=days - 1)
+    member_ids = [member_id for (member_id,) in db.session.query(Member.id)]
+    expenses, deposits = [], []
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        for _ in range(EXPENSES_PER_DAY):
+            expenses.append({'expense_date': day, 'amount': Decimal(rng.randint(100, 500000)) / 100,
+                             'description': 'Bazaar', 'created_at': now, 'updated_at': now})
+        for member_id in member_ids:
+            # DEPOSITS_PER_MONTH deposits per member, spread over the days
+            if rng.random() < DEPOSITS_PER_MONTH / 30:
+                deposits.append({'member_id': member_id, 'deposit_date': day,
+                                 'amount': Decimal(rng.randint(1000, 300000)) / 100,
+                                 'note': '', 'created_at': now, 'updated_at': now})
+    db.session.execute(Expense.__table__.insert(), expenses)
+    db.session.execute(Deposit.__table__.insert(), deposits)
+    db.session.commit()
+    return len(expenses), len(deposits)
+
+
+def per_member(start_date, end_date):
+    """One query per member for meals and deposits, as a naive engine would."""
+    from sqlalchemy import func
+    from models import db, Member, MemberMonthlyTotal, Expense, Deposit
+    from settlement import Settlement
+
+    total_expense = db.session.query(func.coalesce(func.sum(Expense.amount), 0)).filter(
+        Expense.expense_date >= start_date, Expense.expense_date <= end_date).scalar()
+    member_rows = []
+    for member in Member.query.filter(Member.removed_at.is_(None)).order_by(Member.name):
+        meals = db.session.query(func.coalesce(func.sum(MemberMonthlyTotal.total), 0)).filter(
+            MemberMonthlyTotal.member_id == member.id, MemberMonthlyTotal.month == start_date).scalar()
+        deposited = db.session.query(func.coalesce(func.sum(Deposit.amount), 0)).filter(
+            Deposit.member_id == member.id, Deposit.deposit_date >= start_date,
+            Deposit.deposit_date <= end_date).scalar()
+        member_rows.append((member.id, member.name, int(meals), deposited))
+    return Settlement.compute(start_date, end_date, total_expense, member_rows)
+
+
+def months_back(count):
+    month_start = date.today().replace(day=1)
+    months = []
+    for _ in range(count):
+        month_start = (month_start - timedelta(days=1)).replace(day=1)
+        months.append(month_start)
+    return months
+
+
+def best_of(call):
+    from models import db
+
+    latencies = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        result = call()
+        latencies.append(time.perf_counter() - started)
+        db.session.remove()
+    return min(latencies), result
+
+
+def main():
+    from app import create_app
+    from aggregates import month_bounds
+    from models import db
+    from settlement import settle, settlement_for
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    database_url = f'sqlite:///{path}'
+    stamp_dir = tempfile.mkdtemp()
+    days = (MONTHS + 1) * 31
+    try:
+        members, records = ensure_dataset(database_url, MEMBERS, days)
+        bench_app = create_app({
+            'SQLALCHEMY_DATABASE_URI': database_url,
+            'METRICS_ENABLED': False,
+            'MEMBER_CACHE_STAMP': os.path.join(stamp_dir, 'member_cache.stamp'),
+            'HISTORY_STAMP': os.path.join(stamp_dir, 'history.stamp'),
+        })
+        with bench_app.app_context():
+            db.create_all()
+            expenses, deposits = fill_ledger(days)
+            print(f'dataset: {members} members, {records} records, {expenses} expenses, {deposits} deposits')
+
+            timings = {'per_member': [], 'settle': [], 'cached': []}
+            for month_start in months_back(MONTHS):
+                bounds = month_bounds(month_start.year, month_start.month)
+                naive_time, naive = best_of(lambda: per_member(*bounds))
+                settle_time, result = best_of(lambda: settle(*bounds))
+                assert naive.to_dict() == result.to_dict(), month_start
+                settlement_for(*bounds)
+                cached_time, _ = best_of(lambda: settlement_for(*bounds))
+                timings['per_member'].append(naive_time)
+                timings['settle'].append(settle_time)
+                timings['cached'].append(cached_time)
+
+        print(f'{MONTHS} months; median over months of the best of {REPEAT}')
+        for name, latencies in timings.items():
+            print(f'  {name:<12} {statistics.median(latencies) * 1000:8.2f} ms')
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark cold start: import time, worker boot time and memory per worker.
+
+Three measurements, each in fresh processes:
+
+* ``import app`` in a new interpreter (median of BENCH_RUNS), with its
+  peak RSS and whether ReportLab was loaded;
+* ``gunicorn app:app`` with BENCH_WORKERS workers: time until the first
+  response, and the resident memory of each worker (Linux /proc);
+* the first /export-pdf in a booted worker, which now pays the ReportLab
+  import that used to happen at boot.
+
+    python benchmarks/bench_startup.py
+"""
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dataset import ensure_dataset
+
+RUNS = int(os.getenv('BENCH_RUNS', 5))
+WORKERS = int(os.getenv('BENCH_WORKERS', 2))
+
+IMPORT_PROBE = '''
+import json, resource, sys, time
+started = time.perf_counter()
+import app
+print(json.dumps({
+    'seconds': time.perf_counter() - started,
+    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'reportlab': 'reportlab' in sys.modules,
+}))
+'''
+
+
+def measure_import(env):
+    runs = []
+    for _ in range(RUNS):
+        output = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=ROOT, env=env,
+                                check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return runs
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def _timed_get(url):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=60) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def measure_gunicorn(env):
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(WORKERS), '--log-level', 'warning'],
+        cwd=ROOT, env=env
+    )
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError('gunicorn exited during startup')
+            try:
+                urllib.request.urlopen(base_url + '/metrics', timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.01)
+        boot = time.perf_counter() - started
+        time.sleep(1)  # let every worker finish booting
+        workers = _children(process.pid)
+        idle = [_rss_kb(pid) for pid in workers]
+        first_pdf = _timed_get(base_url + '/export-pdf')
+        second_pdf = _timed_get(base_url + '/export-pdf')
+        return {
+            'boot_seconds': boot,
+            'worker_rss_kb': idle,
+            'master_rss_kb': _rss_kb(process.pid),
+            'first_pdf_seconds': first_pdf,
+            'second_pdf_seconds': second_pdf,
+        }
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    database_url = f'sqlite:///{path}'
+    env = dict(os.environ, DATABASE_URL=database_url, REPORT_CACHE_BYTES='0')
+    try:
+        ensure_dataset(database_url, members=20, days=31)
+
+        runs = measure_import(env)
+        seconds = statistics.median(run['seconds'] for run in runs)
+        rss = statistics.median(run['rss_kb'] for run in runs)
+        print(f'import app: {seconds * 1000:.0f} ms median of {RUNS}, peak RSS {rss / 1024:.1f} MB, '
+              f"ReportLab loaded: {runs[0]['reportlab']}")
+
+        result = measure_gunicorn(env)
+        workers = ', '.join(f'{kb / 1024:.1f}' for kb in result['worker_rss_kb'] if kb)
+        print(f"gunicorn ({WORKERS} workers): first response after {result['boot_seconds'] * 1000:.0f} ms")
+        print(f'  idle worker RSS (MB): {workers or "n/a"}')
+        print(f"  first /export-pdf {result['first_pdf_seconds'] * 1000:.0f} ms, "
+              f"second {result['second_pdf_seconds'] * 1000:.0f} ms")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
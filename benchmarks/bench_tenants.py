@@ -0,0 +1,110 @@
+"""Benchmark per-mess request latency as the number of messes grows.
+
+One database is filled a mess at a time: each mess gets BENCH_MEMBERS
+members (default 30) with BENCH_DAYS days of records (default 400). Each
+time the count reaches a level in BENCH_TENANTS (default 1,10,40), the
+same requests are timed for the first mess, under /m/<slug>/, and the
+median is printed:
+
+* ``meals``: GET /meals (roster and today's records);
+* ``admin``: GET /admin?days=30 (one page of history);
+* ``matrix``: GET /api/matrix for the latest closed month;
+* ``pdf``: GET /export-pdf for that month with the report and settlement
+  caches cleared, so the totals and the settlement are read every time;
+* ``export``: GET /export.csv for that month.
+
+Every table and index the requests read leads on the mess id, so the
+timings should stay flat while the database grows forty-fold.
+
+    python benchmarks/bench_tenants.py
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import generate
+from loadtest import ROOT
+
+sys.path.insert(0, ROOT)
+
+MEMBERS = int(os.getenv('BENCH_MEMBERS', 30))
+DAYS = int(os.getenv('BENCH_DAYS', 400))
+TENANTS = [int(count) for count in os.getenv('BENCH_TENANTS', '1,10,40').split(',')]
+REQUESTS = int(os.getenv('BENCH_REQUESTS', 20))
+
+
+def time_request(bench_app, client, path, cold=False):
+    latencies = []
+    for i in range(REQUESTS + 1):
+        if cold:
+            bench_app.extensions['report_cache'].clear()
+            bench_app.extensions['settlement_cache'].clear()
+        started = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        if i:  # the first request warms the member and mess caches
+            latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, (path, response.status_code)
+        assert b'Admin Login' not in response.data, path
+    return statistics.median(latencies) * 1000
+
+
+def main():
+    from app import create_app
+    from models import db, MealRecord
+    from tenancy import create_mess, ensure_default_mess
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    stamp_dir = tempfile.mkdtemp()
+    month_start = (date.today().replace(day=1) - timedelta(days=1)).replace(day=1)
+    month = month_start.strftime('%Y-%m')
+    month_end = (month_start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+    paths = {
+        'meals': '/meals',
+        'admin': '/admin?days=30',
+        'matrix': f'/api/matrix?month={month}',
+        'pdf': f'/export-pdf?month={month}',
+        'export': f'/export.csv?start={month_start.isoformat()}&end={month_end.isoformat()}',
+    }
+    try:
+        bench_app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+            'METRICS_ENABLED': False,
+            'MEMBER_CACHE_STAMP': os.path.join(stamp_dir, 'member_cache.stamp'),
+            'MESS_CACHE_STAMP': os.path.join(stamp_dir, 'mess_cache.stamp'),
+            'HISTORY_STAMP': os.path.join(stamp_dir, 'history.stamp'),
+        })
+        with bench_app.app_context():
+            db.create_all()
+            ensure_default_mess(bench_app.config['MESS_NAME'])
+            db.session.commit()
+
+        client = bench_app.test_client()
+        messes = 0
+        print(f'{MEMBERS} members x {DAYS} days per mess; median of {REQUESTS} requests for the first mess')
+        print(f"  {'messes':>6} {'records':>9}" + ''.join(f' {name:>9}' for name in paths))
+        for level in TENANTS:
+            with bench_app.app_context():
+                while messes < level:
+                    messes += 1
+                    mess = create_mess(f'mess-{messes:04d}', f'Mess {messes:04d}')
+                    generate(MEMBERS, DAYS, seed=messes, mess_id=mess.id)
+                records = db.session.query(MealRecord).count()
+                db.session.remove()
+            # Each mess has its own session cookie
+            client.post('/m/mess-0001/admin', data={'password': bench_app.config['ADMIN_PASSWORD']})
+            timings = [time_request(bench_app, client, f'/m/mess-0001{url}', cold=name == 'pdf')
+                       for name, url in paths.items()]
+            print(f'  {messes:>6} {records:>9}' + ''.join(f' {ms:6.2f} ms' for ms in timings))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
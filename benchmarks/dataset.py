@@ -0,0 +1,106 @@
+"""Synthetic dataset generator: N members x D days of meal records.
+
+Counts are drawn from a seeded RNG, so the same arguments always produce
+the same data. The monthly rollup is rebuilt afterwards so month-aligned
+reports read it as they would in production.
+
+    python benchmarks/dataset.py --members 200 --days 730 --database-url sqlite:////tmp/meals.db
+
+An existing dataset is left alone unless --reset is given; with --reset
+every table in the target database is dropped first, so never point it at
+a database you care about.
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, Member, MealRecord, DEFAULT_MESS_ID
+from rollups import rebuild_rollups
+from tenancy import ensure_default_mess
+
+INSERT_BATCH_SIZE = 5000
+
+
+def make_app(database_url):
+    bench_app = Flask(__name__)
+    bench_app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(bench_app)
+    return bench_app
+
+
+def generate(members, days, end_date=None, seed=0, mess_id=DEFAULT_MESS_ID):
+    """Fill the bound database; returns the number of meal records written.
+
+    Members are named ``Member 0000`` onwards and get a record for each of
+    the ``days`` days ending at ``end_date`` (default today). Everything
+    goes to ``mess_id``, whose ``messes`` row must exist. Call inside an
+    app context on a mess without members.
+    """
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    start_date = end_date - timedelta(days=days - 1)
+    now = datetime.utcnow()
+
+    db.create_all()
+    db.session.execute(Member.__table__.insert(), [
+        {'mess_id': mess_id, 'name': f'Member {i:04d}', 'created_at': now} for i in range(members)
+    ])
+    member_ids = [member_id for (member_id,) in
+                  db.session.query(Member.id).filter(Member.mess_id == mess_id).order_by(Member.id)]
+
+    batch = []
+    written = 0
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        for member_id in member_ids:
+            batch.append({'mess_id': mess_id, 'member_id': member_id, 'meal_date': day,
+                          'meal_count': rng.randint(0, 4), 'created_at': now, 'updated_at': now})
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db.session.execute(MealRecord.__table__.insert(), batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(MealRecord.__table__.insert(), batch)
+        written += len(batch)
+    rebuild_rollups(mess_id)
+    db.session.commit()
+    return written
+
+
+def ensure_dataset(database_url, members, days, reset=False, seed=0):
+    """Generate into ``database_url`` unless it already holds data.
+
+    Returns ``(members, records)`` actually present afterwards.
+    """
+    with make_app(database_url).app_context():
+        if reset:
+            db.drop_all()
+        db.create_all()
+        # Members reference their mess, and PostgreSQL enforces it
+        ensure_default_mess(os.getenv('MESS_NAME', 'Banasree Boys'))
+        db.session.commit()
+        if db.session.query(Member.id).first() is None:
+            generate(members, days, seed=seed)
+        return db.session.query(Member).count(), db.session.query(MealRecord).count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--members', type=int, default=100)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--reset', action='store_true', help='drop all tables first')
+    args = parser.parse_args()
+    members, records = ensure_dataset(args.database_url, args.members, args.days, args.reset, args.seed)
+    print(f'{members} members, {records} meal records in {args.database_url}')
+
+
+if __name__ == '__main__':
+    main()
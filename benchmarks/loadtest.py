@@ -0,0 +1,280 @@
+"""Load test /meals, /admin?days=N and /export-pdf on a synthetic dataset.
+
+Generates BENCH members x days of history (see dataset.py), then drives the
+app either in-process through the Flask test client or over HTTP against a
+local gunicorn, and reports p50/p95/p99 latency, throughput and SQL
+statements per request for each endpoint. Results are written as JSON,
+tagged with the current commit, so two runs can be compared:
+
+    python benchmarks/loadtest.py --members 200 --days 730 --output before.json
+    python benchmarks/loadtest.py --members 200 --days 730 --output after.json --compare before.json
+
+Runs offline on a temporary SQLite file by default. Pass --database-url to
+use a local PostgreSQL instead (with --reset to regenerate its data).
+The rendered-report cache is disabled so /export-pdf measures rendering;
+pass --report-cache to measure cache hits instead.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.cookiejar import CookieJar
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dataset import ensure_dataset
+
+ADMIN_PASSWORD = 'bench-admin'
+
+# (name, path, needs admin login)
+ENDPOINTS = (
+    ('meals', '/meals', False),
+    ('admin_30', '/admin?days=30', True),
+    ('admin_365', '/admin?days=365', True),
+    ('export_pdf', '/export-pdf', False),
+    ('export_pdf_12m', '/export-pdf?start={year_ago}&end={today}', False),
+)
+
+
+def percentile(ordered, fraction):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarise(latencies, query_counts, errors, wall_seconds):
+    ordered = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2),
+        'throughput_rps': round(len(latencies) / wall_seconds, 1),
+        'queries_mean': round(sum(query_counts) / len(query_counts), 1) if query_counts else None,
+        'queries_max': max(query_counts) if query_counts else None,
+    }
+
+
+def endpoint_paths():
+    today = datetime.now().date()
+    values = {'today': today.isoformat(), 'year_ago': (today - timedelta(days=365)).isoformat()}
+    return [(name, path.format(**values), admin) for name, path, admin in ENDPOINTS]
+
+
+def app_environment(database_url, report_cache):
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': database_url,
+        'ADMIN_PASSWORD': ADMIN_PASSWORD,
+        'QUERY_COUNT_HEADER': 'True',
+        'SLOW_REQUEST_MS': str(10 ** 9),
+    })
+    if not report_cache:
+        env['REPORT_CACHE_BYTES'] = '0'
+    return env
+
+
+def run_client(database_url, requests, report_cache):
+    """Sequential requests through the Flask test client, in this process."""
+    os.environ.update(app_environment(database_url, report_cache))
+    from app import app
+
+    client = app.test_client()
+    client.post('/admin', data={'password': ADMIN_PASSWORD})
+    results = {}
+    for name, path, _ in endpoint_paths():
+        client.get(path)  # warm-up
+        latencies, query_counts, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            request_started = time.perf_counter()
+            response = client.get(path)
+            response.get_data()
+            latencies.append(time.perf_counter() - request_started)
+            query_counts.append(int(response.headers.get('X-Query-Count', 0)))
+            errors += response.status_code != 200
+        results[name] = summarise(latencies, query_counts, errors, time.perf_counter() - started)
+        print_row(name, results[name])
+    return results
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'gunicorn did not answer {url} within {timeout}s')
+
+
+def run_gunicorn(database_url, requests, report_cache, workers, concurrency, extra_args=()):
+    """Concurrent HTTP requests against ``gunicorn app:app`` on a free local port."""
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--log-level', 'warning', *extra_args],
+        cwd=ROOT, env=app_environment(database_url, report_cache)
+    )
+    try:
+        _wait_for(base_url + '/metrics', process)
+        # Each thread logs in once with its own cookie jar
+        local = threading.local()
+
+        def opener():
+            if not hasattr(local, 'opener'):
+                local.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+                body = urllib.parse.urlencode({'password': ADMIN_PASSWORD}).encode()
+                local.opener.open(base_url + '/admin', data=body).read()
+            return local.opener
+
+        def fetch(path):
+            started = time.perf_counter()
+            try:
+                with opener().open(base_url + path, timeout=300) as response:
+                    response.read()
+                    status, queries = response.status, int(response.headers.get('X-Query-Count', 0))
+            except urllib.error.HTTPError as e:
+                status, queries = e.code, 0
+            return time.perf_counter() - started, queries, status
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for name, path, _ in endpoint_paths():
+                list(pool.map(fetch, [path] * concurrency))  # warm-up, one per thread
+                started = time.perf_counter()
+                outcomes = list(pool.map(fetch, [path] * requests))
+                wall = time.perf_counter() - started
+                results[name] = summarise([o[0] for o in outcomes], [o[1] for o in outcomes],
+                                          sum(o[2] != 200 for o in outcomes), wall)
+                print_row(name, results[name])
+        return results
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def print_header(title):
+    print(f'\n{title}')
+    print(f"{'endpoint':>16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'SQL':>5} {'errors':>6}")
+
+
+def print_row(name, row):
+    print(f"{name:>16} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+          f"{row['throughput_rps']:>8.1f} {row['queries_mean']:>5.1f} {row['errors']:>6}")
+
+
+def compare(results, baseline_path):
+    """Print the p95 change per endpoint against an earlier results file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline['meta'].get('commit', '?')} ({baseline_path})")
+    print(f"{'runner':>10} {'endpoint':>16} {'p95 before':>11} {'p95 after':>10} {'change':>8}")
+    for runner, endpoints in results.items():
+        for name, row in endpoints.items():
+            before = baseline['results'].get(runner, {}).get(name)
+            if before is None:
+                continue
+            change = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+            print(f"{runner:>10} {name:>16} {before['p95_ms']:>11.1f} {row['p95_ms']:>10.1f} {change:>+7.1f}%")
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--members', type=int, default=50)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--requests', type=int, default=30, help='measured requests per endpoint')
+    parser.add_argument('--runner', choices=('client', 'gunicorn', 'both'), default='client')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--concurrency', type=int, default=4, help='concurrent HTTP clients for gunicorn')
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    parser.add_argument('--reset', action='store_true', help='regenerate data in --database-url')
+    parser.add_argument('--report-cache', action='store_true', help='leave the rendered-report cache on')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--compare', help='earlier JSON results to compare p95 against')
+    args = parser.parse_args()
+
+    temp_path = None
+    database_url = args.database_url
+    if not database_url:
+        handle, temp_path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        database_url = f'sqlite:///{temp_path}'
+    try:
+        started = time.perf_counter()
+        members, records = ensure_dataset(database_url, args.members, args.days, reset=args.reset)
+        print(f'dataset: {members} members, {records} records ({time.perf_counter() - started:.1f}s)')
+
+        results = {}
+        # gunicorn first: the client runner imports app into this process
+        if args.runner in ('gunicorn', 'both'):
+            print_header(f'gunicorn: {args.workers} workers, {args.concurrency} concurrent clients')
+            results['gunicorn'] = run_gunicorn(database_url, args.requests, args.report_cache,
+                                               args.workers, args.concurrency)
+        if args.runner in ('client', 'both'):
+            print_header('test client: sequential, in-process')
+            results['client'] = run_client(database_url, args.requests, args.report_cache)
+
+        output = {
+            'meta': {
+                'commit': current_commit(),
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'database': database_url.split(':', 1)[0],
+                'members': members,
+                'records': records,
+                'requests': args.requests,
+                'workers': args.workers,
+                'concurrency': args.concurrency,
+                'report_cache': args.report_cache,
+            },
+            'results': results,
+        }
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(output, f, indent=2)
+            print(f'\nresults written to {args.output}')
+        if args.compare:
+            compare(results, args.compare)
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+
+
+if __name__ == '__main__':
+    main()
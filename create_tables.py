@@ -1,5 +1,96 @@
-from app import app, db
+"""Create or upgrade the schema. Run once per deploy, before the web workers:
 
-with app.app_context():
+    python create_tables.py      (or: flask --app app init-db)
+"""
+from flask import current_app
+from sqlalchemy import inspect, text
+
+from models import db
+from rollups import rebuild_rollups
+from tenancy import ensure_default_mess
+
+def add_missing_columns():
+    """ALTER existing tables to add columns the models gained since.
+
+    Only nullable columns or columns with a server default can be added
+    to a table that already holds rows. Returns ``[(table, column), ...]``.
+    """
+    inspector = inspect(db.engine)
+    added = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                raise RuntimeError(f'Cannot add NOT NULL column {table.name}.{column.name} without a server default')
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=db.engine.dialect)}'
+            if column.server_default is not None:
+                ddl += f' DEFAULT {column.server_default.arg}'
+            if not column.nullable:
+                ddl += ' NOT NULL'
+            with db.engine.begin() as connection:
+                connection.execute(text(ddl))
+            added.append((table.name, column.name))
+    return added
+
+# Indexes superseded by the mess-leading ones in models.py
+REPLACED_INDEXES = {
+    'meal_records': ('ix_meal_records_date_member',),
+    'expenses': ('ix_expenses_expense_date',),
+    'deposits': ('ix_deposits_date_member',),
+}
+
+def drop_replaced_indexes():
+    """Drop indexes that newer ones replaced. Returns ``[(table, index), ...]``."""
+    inspector = inspect(db.engine)
+    dropped = []
+    for table_name, index_names in REPLACED_INDEXES.items():
+        if not inspector.has_table(table_name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table_name)}
+        for index_name in index_names:
+            if index_name in existing:
+                with db.engine.begin() as connection:
+                    connection.execute(text(f'DROP INDEX {index_name}'))
+                dropped.append((table_name, index_name))
+    return dropped
+
+def drop_global_member_name_constraint():
+    """Drop the old UNIQUE (name) on members: names are unique per mess now.
+
+    Only PostgreSQL can drop it in place. On SQLite the constraint stays
+    until the table is rebuilt, so a name stays taken across messes there.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    for constraint in inspect(db.engine).get_unique_constraints('members'):
+        if constraint['column_names'] == ['name']:
+            with db.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE members DROP CONSTRAINT {constraint["name"]}'))
+            return True
+    return False
+
+def init_db():
+    # create_all skips tables that already exist, so add newer columns and indexes explicitly
+    add_missing_columns()
     db.create_all()
-    print("Tables created successfully!")
+    # Rows from before messes existed belong to the default mess
+    ensure_default_mess(current_app.config.get('MESS_NAME', 'Banasree Boys'))
+    db.session.commit()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    drop_replaced_indexes()
+    drop_global_member_name_constraint()
+    # Fill member_monthly_totals from existing meal records
+    rebuild_rollups()
+    db.session.commit()
+
+if __name__ == '__main__':
+    from app import app
+    with app.app_context():
+        init_db()
+        print("Tables created successfully!")
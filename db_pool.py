@@ -0,0 +1,193 @@
+"""Engine and connection-pool options from the environment, and pool stats.
+
+``engine_options`` builds ``SQLALCHEMY_ENGINE_OPTIONS`` for a database URI.
+Every setting is optional and falls back to the default shown:
+
+    DB_POOL_SIZE            connections kept open per worker process (5)
+    DB_MAX_OVERFLOW         extra connections allowed under load (10)
+    DB_POOL_TIMEOUT         seconds to wait for a free connection (30)
+    DB_POOL_RECYCLE         replace connections older than this, in seconds (1800)
+    DB_POOL_PRE_PING        test connections on checkout (true)
+    DB_STATEMENT_TIMEOUT_MS PostgreSQL statement_timeout (server default)
+    DB_CONNECT_TIMEOUT      PostgreSQL connect timeout in seconds (driver default)
+
+Each gunicorn worker has its own pool, so the server sees up to
+workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections. Keep that below
+max_connections. Recycling connections before the server's idle timeout,
+together with pre-ping, avoids errors from connections it has dropped.
+
+``PoolMonitor`` reports pool occupancy, checkouts, timeouts and the time
+spent waiting for a connection at /metrics. It also discards connections
+inherited across a fork.
+"""
+import os
+import threading
+import time
+import weakref
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from metrics import Counter, Gauge, Histogram
+
+# Live monitors, for the fork hook registered once below
+_MONITORS = weakref.WeakSet()
+
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+def _flag(value):
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# (environment variable, engine option, conversion)
+POOL_SETTINGS = (
+    ('DB_POOL_SIZE', 'pool_size', int),
+    ('DB_MAX_OVERFLOW', 'max_overflow', int),
+    ('DB_POOL_TIMEOUT', 'pool_timeout', float),
+    ('DB_POOL_RECYCLE', 'pool_recycle', int),
+    ('DB_POOL_PRE_PING', 'pool_pre_ping', _flag),
+)
+
+
+def engine_options(database_uri, environ=os.environ):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for ``database_uri`` from ``environ``."""
+    url = make_url(database_uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # One shared in-memory connection; there is no pool to tune
+        return {}
+
+    options = {'poolclass': InstrumentedQueuePool, 'pool_pre_ping': True, 'pool_recycle': 1800}
+    for variable, option, convert in POOL_SETTINGS:
+        if environ.get(variable):
+            options[option] = convert(environ[variable])
+
+    if url.get_backend_name() == 'postgresql':
+        connect_args = {'application_name': environ.get('DB_APPLICATION_NAME', 'meal-management')}
+        if environ.get('DB_STATEMENT_TIMEOUT_MS'):
+            connect_args['options'] = f"-c statement_timeout={int(environ['DB_STATEMENT_TIMEOUT_MS'])}"
+        if environ.get('DB_CONNECT_TIMEOUT'):
+            connect_args['connect_timeout'] = int(environ['DB_CONNECT_TIMEOUT'])
+        options['connect_args'] = connect_args
+    return options
+
+
+CHECKOUT_WAIT = Histogram(
+    'meal_db_pool_checkout_wait_seconds',
+    'Time to obtain a pooled connection, including opening a new one.',
+    ('bind',), WAIT_BUCKETS)
+CHECKOUT_TIMEOUTS = Counter(
+    'meal_db_pool_timeouts_total', 'Checkouts that gave up after DB_POOL_TIMEOUT.', ('bind',))
+
+
+class PoolStats:
+    def __init__(self):
+        self.bind = 'default'
+        self.peak_checked_out = 0
+        self._lock = threading.Lock()
+
+    def record(self, waited, checked_out):
+        CHECKOUT_WAIT.observe(waited, self.bind)
+        with self._lock:
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited."""
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            CHECKOUT_TIMEOUTS.inc(self.stats.bind)
+            raise
+        self.stats.record(time.perf_counter() - started, self.checkedout())
+        return connection
+
+    def recreate(self):
+        # dispose() swaps in a new pool; keep counting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+# (metric, help, value from the pool)
+POOL_GAUGES = (
+    ('meal_db_pool_size', 'Connections the pool keeps open.', lambda pool: pool.size()),
+    ('meal_db_pool_checked_out', 'Connections currently in use.', lambda pool: pool.checkedout()),
+    ('meal_db_pool_checked_in', 'Idle connections in the pool.', lambda pool: pool.checkedin()),
+    ('meal_db_pool_overflow', 'Connections open beyond the pool size.', lambda pool: max(pool.overflow(), 0)),
+    ('meal_db_pool_checked_out_peak', 'Most connections in use at once.', lambda pool: pool.stats.peak_checked_out),
+)
+
+
+class PoolMonitor:
+    def __init__(self, db, app=None):
+        self.db = db
+        self.app = None
+        self.gauges = [
+            Gauge(name, documentation, ('bind',), self._collector(value))
+            for name, documentation, value in POOL_GAUGES
+        ]
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        for bind, pool in self.pools().items():
+            pool.stats.bind = bind
+        metrics = app.extensions.get('request_metrics')
+        if metrics is not None:
+            for gauge in self.gauges:
+                metrics.register(gauge)
+            metrics.register(CHECKOUT_WAIT)
+            metrics.register(CHECKOUT_TIMEOUTS)
+        _MONITORS.add(self)
+        app.extensions['pool_monitor'] = self
+
+    def engines(self):
+        """``{bind name: engine}`` for the app's engines with instrumented pools."""
+        with self.app.app_context():
+            engines = self.db.engines
+        return {
+            bind or 'default': engine
+            for bind, engine in engines.items()
+            if isinstance(engine.pool, InstrumentedQueuePool)
+        }
+
+    def pools(self):
+        return {bind: engine.pool for bind, engine in self.engines().items()}
+
+    def stats(self):
+        """``{bind: {metric: value}}`` snapshot of every pool."""
+        return {
+            bind: {name: value(pool) for name, _, value in POOL_GAUGES}
+            for bind, pool in self.pools().items()
+        }
+
+    def _collector(self, value):
+        return lambda: {(bind,): value(pool) for bind, pool in self.pools().items()}
+
+    def _after_fork(self):
+        # Connections opened before a fork (e.g. gunicorn --preload) belong to
+        # the parent: drop them in the child without closing the sockets
+        if self.app is None:
+            return
+        for engine in self.engines().values():
+            engine.dispose(close=False)
+
+
+def _after_fork_in_child():
+    for monitor in list(_MONITORS):
+        monitor._after_fork()
+
+
+# Once per process: a hook per monitor would pile up with every create_app()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,85 @@
+"""Streaming raw-record exports (CSV and JSON lines).
+
+Rows come from a ``yield_per`` query (a server-side cursor on PostgreSQL)
+and are serialised a batch at a time, so an export of any length is sent
+in constant memory.
+"""
+import csv
+import io
+import json
+
+from models import db, Member, current_mess_id
+from history import history_table
+
+EXPORT_FIELDS = ('id', 'member_id', 'member_name', 'meal_date', 'meal_count', 'created_at', 'updated_at')
+
+# Rows fetched from the database and written per response chunk
+EXPORT_BATCH_SIZE = 1000
+
+
+def export_rows(start_date=None, end_date=None, member_id=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield meal records as tuples in ``EXPORT_FIELDS`` order.
+
+    Ordered by (meal_date, member_id), which follows
+    ``ix_meal_records_mess_date_member``. All filters are optional; only
+    the current mess is exported.
+    """
+    records = history_table(start_date, end_date)
+    query = db.session.query(
+        records.c.id, records.c.member_id, Member.name, records.c.meal_date,
+        records.c.meal_count, records.c.created_at, records.c.updated_at
+    ).join(Member, records.c.member_id == Member.id).filter(
+        records.c.mess_id == current_mess_id(),
+        Member.removed_at.is_(None)
+    )
+    if start_date is not None:
+        query = query.filter(records.c.meal_date >= start_date)
+    if end_date is not None:
+        query = query.filter(records.c.meal_date <= end_date)
+    if member_id is not None:
+        query = query.filter(records.c.member_id == member_id)
+    query = query.order_by(records.c.meal_date, records.c.member_id).yield_per(batch_size)
+    for row in query:
+        yield tuple(row)
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def csv_chunks(rows, batch_size=EXPORT_BATCH_SIZE):
+    """Serialise rows as CSV with a header, one string per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    pending = 0
+    for record_id, member_id, name, meal_date, meal_count, created_at, updated_at in rows:
+        writer.writerow((record_id, member_id, name, meal_date.isoformat(), meal_count,
+                         _isoformat(created_at), _isoformat(updated_at)))
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def jsonl_chunks(rows, batch_size=EXPORT_BATCH_SIZE):
+    """Serialise rows as JSON lines, one string per batch."""
+    lines = []
+    for record_id, member_id, name, meal_date, meal_count, created_at, updated_at in rows:
+        lines.append(json.dumps({
+            'id': record_id,
+            'member_id': member_id,
+            'member_name': name,
+            'meal_date': meal_date.isoformat(),
+            'meal_count': meal_count,
+            'created_at': _isoformat(created_at),
+            'updated_at': _isoformat(updated_at),
+        }, ensure_ascii=False))
+        if len(lines) >= batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
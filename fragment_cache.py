@@ -0,0 +1,77 @@
+"""Cache of rendered HTML fragments for the admin history.
+
+The "Past Records" list is rendered one date block at a time. A block is
+identified by its mess and date and a data version taken from the rows it
+shows: their ids, member names, counts and ``updated_at``. Editing a
+record, or a page boundary that cuts a day differently, gives the block a
+new key and it is rendered again. Unchanged days come straight from memory. Today's
+block changes all day long, so it is always rendered and never stored.
+
+Fragments are kept as UTF-8 bytes in the same size-bounded LRU as the PDF
+reports (``ReportCache``), one per worker process.
+"""
+from datetime import date
+
+from markupsafe import Markup
+
+from models import current_mess_id
+from report_cache import ReportCache
+from metrics import Gauge
+
+
+class FragmentCache:
+    """Per-process LRU of rendered fragments with a total byte limit."""
+
+    def __init__(self, max_bytes):
+        self._entries = ReportCache(max_bytes)
+
+    @property
+    def hits(self):
+        return self._entries.hits
+
+    @property
+    def misses(self):
+        return self._entries.misses
+
+    @property
+    def size(self):
+        return self._entries.size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    def render(self, key, render):
+        """Return the fragment for ``key``, calling ``render()`` on a miss.
+
+        A ``key`` of ``None`` renders without touching the cache.
+        """
+        if key is None:
+            return Markup(render())
+        data = self._entries.get(key)
+        if data is not None:
+            return Markup(data.decode('utf-8'))
+        html = render()
+        self._entries.put(key, html.encode('utf-8'))
+        return Markup(html)
+
+    def gauges(self):
+        """Hit, miss and size gauges for the /metrics page."""
+        return (
+            Gauge('meal_fragment_cache_lookups', 'Admin fragment cache lookups by result.',
+                  ('result',), lambda: {('hit',): self.hits, ('miss',): self.misses}),
+            Gauge('meal_fragment_cache_bytes', 'Bytes held by the admin fragment cache.',
+                  (), lambda: {(): self.size}),
+        )
+
+
+def record_block_key(meal_date, records, today=None):
+    """Cache key for one date block of admin history, or ``None`` for today."""
+    if meal_date >= (today or date.today()):
+        return None
+    version = hash(tuple(
+        (record.id, record.member_name, record.meal_count, record.updated_at) for record in records
+    ))
+    return ('admin-records', current_mess_id(), meal_date.isoformat(), len(records), version)
@@ -0,0 +1,37 @@
+"""gunicorn settings, read automatically by ``gunicorn app:app``.
+
+WEB_PROFILE picks the serving mode:
+
+    sync    (default) one request at a time per worker. A slow PDF export
+            occupies its worker until it finishes.
+    gevent  cooperative greenlets, up to WORKER_CONNECTIONS requests per
+            worker. Requires gevent (and psycogreen on PostgreSQL).
+            ReportLab rendering is moved to native threads (serving.py)
+            so it does not stall the other requests.
+
+WEB_CONCURRENCY sets the worker count, as it does for plain gunicorn.
+"""
+import os
+
+profile = os.getenv('WEB_PROFILE', 'sync')
+
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+
+if profile == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.getenv('WORKER_CONNECTIONS', 100))
+    # Many greenlets share one pool per worker; let more of them hold a
+    # connection before they queue (see db_pool.py)
+    os.environ.setdefault('DB_POOL_SIZE', '10')
+    os.environ.setdefault('DB_MAX_OVERFLOW', '10')
+
+    def post_fork(server, worker):
+        # psycopg2 blocks inside C; make it wait on the gevent hub instead
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            return
+        patch_psycopg()
+elif profile != 'sync':
+    raise ValueError(f'Unknown WEB_PROFILE {profile!r}; use sync or gevent')
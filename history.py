@@ -0,0 +1,219 @@
+"""Hot and archived meal history.
+
+meal_records keeps the recent months that pages, saves and current reports
+touch. ``flask archive-history`` moves closed months older than
+ARCHIVE_KEEP_MONTHS into meal_records_archive. That table has the same
+columns and is keyed on (member, date). The monthly rollup is left alone,
+since it already counts both tables.
+
+The archive cutoff is the latest archived date, and it decides where each
+read and write goes:
+
+* a range that starts after the cutoff reads meal_records alone;
+* older ranges read both tables, each restricted to the range, through one
+  UNION ALL (``history_table``);
+* writes for a date on or before the cutoff go to the archive
+  (``archived``).
+
+Dates in the current month are never archived, so those paths skip the
+cutoff altogether. Each worker keeps the cutoff in memory. The rollover
+rewrites a stamp file, as the member cache does, so workers on the host
+re-read it. HISTORY_CUTOFF_TTL bounds how stale it gets on other hosts.
+"""
+import os
+import threading
+import time
+from datetime import date
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, select, union_all
+
+from models import db, dialect_insert, MealRecord, MealRecordArchive
+from member_cache import FileStamp
+from replica import use_primary
+from tenancy import mess_ids
+
+# Sentinel for "cutoff not read yet"
+_UNKNOWN = object()
+
+
+class HistoryTiers:
+    """Per-process cache of the archive cutoff."""
+
+    def __init__(self, app=None):
+        self.stamp = None
+        self._cutoff = _UNKNOWN
+        self._cutoff_stamp = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('HISTORY_STAMP', os.path.join(app.instance_path, 'history.stamp'))
+        app.config.setdefault('HISTORY_CUTOFF_TTL', 300)
+        app.config.setdefault('ARCHIVE_KEEP_MONTHS', 3)
+        self.stamp = FileStamp(app.config['HISTORY_STAMP'])
+        archive = MealRecordArchive.__table__
+        if not event.contains(archive, 'after_create', _archive_emptied):
+            event.listen(archive, 'after_create', _archive_emptied)
+            event.listen(archive, 'after_drop', _archive_emptied)
+        app.extensions['history_tiers'] = self
+
+    def cutoff(self):
+        stamp = self.stamp.read()
+        ttl = current_app.config['HISTORY_CUTOFF_TTL']
+        with self._lock:
+            if (self._cutoff is not _UNKNOWN and stamp == self._cutoff_stamp
+                    and time.monotonic() - self._loaded_at < ttl):
+                return self._cutoff
+        # Cached per worker, so read from the primary like the member roster
+        with use_primary():
+            cutoff = read_cutoff()
+        self.remember(cutoff, stamp)
+        return cutoff
+
+    def remember(self, cutoff, stamp):
+        with self._lock:
+            self._cutoff = cutoff
+            self._cutoff_stamp = stamp
+            self._loaded_at = time.monotonic()
+
+    def changed(self):
+        """Make every worker (this one included) re-read the cutoff."""
+        self.stamp.bump()
+        with self._lock:
+            self._cutoff = _UNKNOWN
+
+
+def _current_tiers():
+    if has_app_context():
+        return current_app.extensions.get('history_tiers')
+    return None
+
+
+def _archive_emptied(target, connection, **kw):
+    # A new (or dropped) archive holds nothing, so the cutoff is known
+    tiers = _current_tiers()
+    if tiers is not None:
+        tiers.remember(None, tiers.stamp.read())
+
+
+def read_cutoff():
+    """Latest archived meal date, or None, straight from the database."""
+    return db.session.query(func.max(MealRecordArchive.meal_date)).scalar()
+
+
+def _hot_from():
+    return date.today().replace(day=1)
+
+
+def archive_cutoff():
+    """Latest archived meal date (cached per worker), or None."""
+    tiers = _current_tiers()
+    if tiers is None:
+        return read_cutoff()
+    return tiers.cutoff()
+
+
+def archived(meal_date):
+    """Whether records for ``meal_date`` live in the archive."""
+    if meal_date >= _hot_from():
+        return False
+    cutoff = archive_cutoff()
+    return cutoff is not None and meal_date <= cutoff
+
+
+def history_table(start_date=None, end_date=None):
+    """meal_records, or its union with the archive when the range needs it.
+
+    Returns a selectable with MealRecord's columns under ``.c`` covering
+    ``start_date``..``end_date`` (either may be None for open-ended).
+    Callers still apply their own range filter.
+    """
+    hot = MealRecord.__table__
+    if start_date is not None and start_date >= _hot_from():
+        return hot
+    cutoff = archive_cutoff()
+    if cutoff is None or (start_date is not None and start_date > cutoff):
+        return hot
+
+    archive = MealRecordArchive.__table__
+    branches = []
+    for table in (hot, archive):
+        branch = select(*(table.c[column.name] for column in hot.columns))
+        if start_date is not None:
+            branch = branch.where(table.c.meal_date >= start_date)
+        if end_date is not None:
+            branch = branch.where(table.c.meal_date <= end_date)
+        branches.append(branch)
+    return union_all(*branches).subquery('meal_history')
+
+
+def _add_months(month_start, months):
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def archive_closed_months(keep_months, today=None, on_month=None):
+    """Move records of months before the newest ``keep_months`` to the archive.
+
+    The current month counts as one of the kept months. Each month of each
+    mess moves in its own transaction. ``on_month(month_start, moved)`` is called after
+    each one. Moving is an upsert, so re-running after an interruption (or
+    after a late write landed in meal_records) folds the rows in again.
+    Returns ``[(month_start, moved), ...]``.
+    """
+    if keep_months < 1:
+        raise ValueError('keep_months must be at least 1: the current month is never archived')
+    hot_from = _add_months((today or date.today()).replace(day=1), 1 - keep_months)
+    # One index seek per mess on (mess_id, meal_date)
+    oldest_by_mess = {
+        mess_id: db.session.query(func.min(MealRecord.meal_date)).filter(
+            MealRecord.mess_id == mess_id,
+            MealRecord.meal_date < hot_from
+        ).scalar()
+        for mess_id in mess_ids()
+    }
+    oldest_by_mess = {mess_id: oldest for mess_id, oldest in oldest_by_mess.items() if oldest is not None}
+    if not oldest_by_mess:
+        return []
+
+    tiers = _current_tiers()
+    moved_months = []
+    month_start = min(oldest_by_mess.values()).replace(day=1)
+    while month_start < hot_from:
+        next_month = _add_months(month_start, 1)
+        moved = 0
+        for mess_id, oldest in oldest_by_mess.items():
+            if oldest < next_month:
+                moved += _move_range(mess_id, month_start, next_month)
+                db.session.commit()
+        if moved:
+            moved_months.append((month_start, moved))
+            if tiers is not None:
+                tiers.changed()
+            if on_month is not None:
+                on_month(month_start, moved)
+        month_start = next_month
+    return moved_months
+
+
+def _move_range(mess_id, start_date, before_date):
+    hot = MealRecord.__table__
+    archive = MealRecordArchive.__table__
+    columns = [column.name for column in hot.columns]
+    in_range = (hot.c.mess_id == mess_id) & (hot.c.meal_date >= start_date) & (hot.c.meal_date < before_date)
+    rows = select(*(hot.c[name] for name in columns)).where(in_range)
+
+    stmt = dialect_insert(archive)
+    if stmt is None:
+        stmt = archive.insert().from_select(columns, rows)
+    else:
+        stmt = stmt.from_select(columns, rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[archive.c.member_id, archive.c.meal_date],
+            set_={name: stmt.excluded[name] for name in ('id', 'meal_count', 'created_at', 'updated_at', 'version')}
+        )
+    db.session.execute(stmt)
+    return db.session.execute(hot.delete().where(in_range)).rowcount
@@ -0,0 +1,157 @@
+"""Bulk import of historical meal records from CSV or JSON lines.
+
+Uploads are parsed as a stream. Each row names a member, a date and a meal
+count; the CSV header and the JSON keys match the /export.csv and
+/export.jsonl output, so exports can be re-imported. Member names are
+resolved against the current mess with a single lookup up front. Valid rows are written in
+chunks: each chunk reads the existing records for its keys with one query,
+then upserts the changed rows and adjusts the monthly rollup in one
+transaction (see ``meal_store.save_meal_changes``). Rows that give the
+same member and date as an earlier row of the chunk replace it and are
+reported as duplicates.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from models import db, Member, current_mess_id
+from meal_store import save_meal_changes
+
+# Rows written per transaction
+IMPORT_CHUNK_SIZE = 5000
+
+# Same range as the meal count dropdowns
+MAX_MEAL_COUNT = 4
+
+# Rejected rows reported back individually; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportSummary:
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.errors = []
+        self.collisions = []
+
+    def reject(self, line, reason):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': reason})
+
+    def duplicate(self, line, replaced_line):
+        self.duplicates += 1
+        if len(self.collisions) < MAX_REPORTED_ERRORS:
+            self.collisions.append({'line': line, 'replaces_line': replaced_line})
+
+    def as_dict(self):
+        return {
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'rejected': self.rejected,
+            'duplicates': self.duplicates,
+            'errors': self.errors,
+            'collisions': self.collisions,
+        }
+
+
+def parse_csv(stream):
+    """Yield ``(line, row)`` from a binary CSV stream with a header row."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def parse_jsonl(stream):
+    """Yield ``(line, row)`` from a binary JSON-lines stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'jsonl': parse_jsonl,
+}
+
+
+def _validate(row, member_ids):
+    """Return ``(member_id, meal_date, meal_count)`` or raise ValueError."""
+    if row is None:
+        raise ValueError('not a JSON object')
+    name = str(row.get('member_name') or row.get('member') or '').strip()
+    if not name:
+        raise ValueError('missing member_name')
+    if name not in member_ids:
+        raise ValueError(f'unknown member "{name}"')
+    try:
+        meal_date = datetime.strptime(str(row.get('meal_date') or '').strip(), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('meal_date must be YYYY-MM-DD')
+    try:
+        meal_count = int(str(row.get('meal_count')).strip())
+    except ValueError:
+        raise ValueError('meal_count must be a whole number')
+    if not 0 <= meal_count <= MAX_MEAL_COUNT:
+        raise ValueError(f'meal_count must be between 0 and {MAX_MEAL_COUNT}')
+    return member_ids[name], meal_date, meal_count
+
+
+def _write_chunk(chunk, summary):
+    # The counts each row replaced come from the upsert itself, not from an
+    # earlier read that a concurrent save could have made stale
+    changes = save_meal_changes(chunk)
+    for old_count in changes.values():
+        if old_count is None:
+            summary.inserted += 1
+        else:
+            summary.updated += 1
+    summary.unchanged += len(chunk) - len(changes)
+    db.session.commit()
+
+
+def import_records(parsed_rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import ``(line, row)`` pairs from a parser and return an ImportSummary.
+
+    Later rows for the same member and date replace earlier ones and are
+    counted as duplicates. Each
+    chunk commits on its own, so a failure part-way keeps earlier chunks.
+    """
+    summary = ImportSummary()
+    member_ids = {name: member_id for member_id, name in db.session.query(Member.id, Member.name).filter(
+        Member.mess_id == current_mess_id(),
+        Member.removed_at.is_(None)
+    )}
+
+    chunk = {}
+    chunk_lines = {}
+    for line, row in parsed_rows:
+        try:
+            member_id, meal_date, meal_count = _validate(row, member_ids)
+        except ValueError as e:
+            summary.reject(line, str(e))
+            continue
+        key = (member_id, meal_date)
+        if key in chunk:
+            summary.duplicate(line, chunk_lines[key])
+        chunk[key] = meal_count
+        chunk_lines[key] = line
+        if len(chunk) >= chunk_size:
+            _write_chunk(chunk, summary)
+            chunk = {}
+            chunk_lines = {}
+    if chunk:
+        _write_chunk(chunk, summary)
+    return summary
@@ -0,0 +1,77 @@
+"""Members x days grid of one calendar month, for reconciling bills.
+
+The grid has a row per member and a column per day of the month, plus row
+and column totals. It is read as plain ``(member_id, meal_date,
+meal_count)`` rows, with no ORM objects. The rows are written straight
+into one flat ``array`` (row-major, zeros where nothing was recorded), and
+the totals are sums over slices of it. Both run in C, not per cell in
+Python.
+"""
+from array import array
+
+from models import db, current_mess_id
+from aggregates import month_bounds
+from history import history_table
+
+
+class MonthMatrix:
+    """Meal counts of ``members`` for each day of the month.
+
+    ``members`` is a sequence with ``id`` and ``name`` (``MemberEntry``);
+    ``counts[row * days + day - 1]`` is that member's count on ``day``.
+    """
+
+    def __init__(self, month_start, members, counts):
+        self.month_start = month_start
+        self.members = members
+        self.days = month_bounds(month_start.year, month_start.month)[1].day
+        self.counts = counts
+
+    def row(self, index):
+        offset = index * self.days
+        return self.counts[offset:offset + self.days]
+
+    @property
+    def row_totals(self):
+        return [sum(self.row(index)) for index in range(len(self.members))]
+
+    @property
+    def column_totals(self):
+        # Every days-th cell, starting at the column, is that day's column
+        return [sum(self.counts[day::self.days]) for day in range(self.days)]
+
+    @property
+    def total(self):
+        return sum(self.counts)
+
+    def rows(self):
+        """Yield ``(member, counts, total)`` for each member in order."""
+        for index, member in enumerate(self.members):
+            counts = self.row(index)
+            yield member, counts.tolist(), sum(counts)
+
+
+def month_matrix(month_start, members):
+    """Build the ``MonthMatrix`` of ``members`` for the month of ``month_start``.
+
+    One query. Records of members not in ``members`` (removed ones still
+    being purged) are skipped.
+    """
+    start_date, end_date = month_bounds(month_start.year, month_start.month)
+    days = end_date.day
+    offsets = {member.id: index * days - 1 for index, member in enumerate(members)}
+    counts = array('l', bytes(array('l').itemsize * days * len(members)))
+
+    records = history_table(start_date, end_date)
+    rows = db.session.execute(
+        db.select(records.c.member_id, records.c.meal_date, records.c.meal_count).where(
+            records.c.mess_id == current_mess_id(),
+            records.c.meal_date >= start_date,
+            records.c.meal_date <= end_date
+        )
+    )
+    for member_id, meal_date, meal_count in rows:
+        offset = offsets.get(member_id)
+        if offset is not None:
+            counts[offset + meal_date.day] = meal_count
+    return MonthMatrix(start_date, members, counts)
@@ -0,0 +1,331 @@
+"""Batched reads and writes for meal records.
+
+The /meals form saves one count per member for a single day. Instead of a
+SELECT per member, the day's existing counts are loaded with one query and
+only the rows that changed are written with a single INSERT ... ON CONFLICT
+statement against the ``unique_member_date`` constraint.
+
+Every write bumps the record's ``version``. The form carries, per member,
+the version and count it was rendered with (its "base"). Counts the user
+left alone are dropped before anything is read. A changed count is only
+written if the record is still at its base version, and that condition is
+checked by the upsert itself, so two people saving at once cannot silently
+overwrite each other: the later save reports a conflict instead.
+
+The admin history is read a page at a time with keyset pagination, so a
+request never holds more than one page of records in memory.
+
+Reads and writes go to meal_records or its archive by date; see history.py.
+Reads cover the current mess, and new rows get its id (see tenancy.py).
+"""
+import base64
+import binascii
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from models import db, dialect_insert, current_mess_id, Member, MealRecord, MealRecordArchive
+from rollups import apply_meal_deltas
+from history import archived, history_table
+from metrics import Counter, Histogram
+
+# Rows per INSERT statement; keeps bind parameters well under the
+# SQLite (32766) and PostgreSQL (65535) limits.
+UPSERT_CHUNK_SIZE = 500
+
+# Rounds of re-reading for unversioned saves that lost a race to another writer
+SAVE_ATTEMPTS = 3
+
+ROW_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+ROWS_WRITTEN = Histogram(
+    'meal_save_rows_written', 'Meal records actually written per save.', ('source',), ROW_BUCKETS)
+SAVE_CONFLICTS = Counter(
+    'meal_save_conflicts_total', 'Counts not saved because someone else changed them first.', ('source',))
+
+DaySave = namedtuple('DaySave', ['written', 'conflicts'])
+
+
+def load_day_counts(meal_date):
+    """Return ``{member_id: meal_count}`` for the current mess's records on ``meal_date``."""
+    records = history_table(meal_date, meal_date)
+    rows = db.session.query(records.c.member_id, records.c.meal_count).filter(
+        records.c.mess_id == current_mess_id(),
+        records.c.meal_date == meal_date
+    ).all()
+    return {member_id: meal_count for member_id, meal_count in rows}
+
+
+def load_day_records(meal_date):
+    """Return ``{member_id: (meal_count, version)}`` for the current mess's records on ``meal_date``."""
+    records = history_table(meal_date, meal_date)
+    rows = db.session.query(records.c.member_id, records.c.meal_count, records.c.version).filter(
+        records.c.mess_id == current_mess_id(),
+        records.c.meal_date == meal_date
+    ).all()
+    return {member_id: (meal_count, version) for member_id, meal_count, version in rows}
+
+
+def load_records(keys):
+    """Return ``{(member_id, meal_date): (meal_count, version)}`` for existing ``keys``.
+
+    One range query over the keys' dates, filtered to their members.
+    """
+    if not keys:
+        return {}
+    member_ids = {member_id for member_id, _ in keys}
+    dates = [meal_date for _, meal_date in keys]
+    records = history_table(min(dates), max(dates))
+    rows = db.session.query(
+        records.c.member_id, records.c.meal_date, records.c.meal_count, records.c.version
+    ).filter(
+        records.c.mess_id == current_mess_id(),
+        records.c.meal_date >= min(dates),
+        records.c.meal_date <= max(dates),
+        records.c.member_id.in_(member_ids)
+    )
+    return {(member_id, meal_date): (meal_count, version) for member_id, meal_date, meal_count, version in rows}
+
+
+def _upsert_versioned(model, rows):
+    """Write rows whose ``version`` is one more than the stored version.
+
+    A row expecting no record carries version 1. Rows whose record has
+    moved on are left alone. Returns the ``(member_id, meal_date)`` keys
+    actually written.
+    """
+    if not rows:
+        return set()
+
+    now = datetime.utcnow()
+    table = model.__table__
+    if dialect_insert(table) is None:
+        written = set()
+        for row in rows:
+            record = model.query.filter_by(member_id=row['member_id'], meal_date=row['meal_date']).first()
+            if record is None and row['version'] == 1:
+                db.session.add(model(**row))
+            elif record is not None and record.version == row['version'] - 1:
+                # version_id_col bumps the version and re-checks it in the UPDATE
+                record.meal_count = row['meal_count']
+                record.updated_at = now
+            else:
+                continue
+            written.add((row['member_id'], row['meal_date']))
+        return written
+
+    # The expected version travels in the row itself: with executemany
+    # batched into one multi-row INSERT, a bound parameter in the WHERE
+    # clause would be shared by every row of the batch
+    stmt = dialect_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.member_id, table.c.meal_date],
+        set_={
+            'meal_count': stmt.excluded.meal_count,
+            'updated_at': stmt.excluded.updated_at,
+            'version': stmt.excluded.version,
+        },
+        where=table.c.version == stmt.excluded.version - 1
+    ).returning(table.c.member_id, table.c.meal_date)
+    written = set()
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = [
+            dict(row, created_at=now, updated_at=now)
+            for row in rows[start:start + UPSERT_CHUNK_SIZE]
+        ]
+        written.update(tuple(row) for row in db.session.execute(stmt, chunk))
+    return written
+
+
+def save_day_edits(meal_date, counts, bases=None):
+    """Save ``{member_id: meal_count}`` for one day against the versions it was edited from.
+
+    ``bases`` maps a member id to the ``(version, meal_count)`` the editor
+    saw, or to None if the member had no record then (see
+    ``decode_meal_base``). A count equal to its base was not touched and
+    is skipped. A changed count is written only while the record is still
+    at the base version. Otherwise it is reported as a conflict, unless
+    the stored count already matches. Members without a base are last
+    write wins, as the JSON API needs.
+
+    The monthly rollup gets the deltas of exactly the rows written, in the
+    same transaction. Returns ``DaySave(written, conflicts)``, where
+    ``conflicts`` lists member ids.
+    """
+    bases = bases or {}
+    pending = {
+        member_id: meal_count for member_id, meal_count in counts.items()
+        if member_id not in bases or (bases[member_id] or (None, 0))[1] != meal_count
+    }
+    model = MealRecordArchive if archived(meal_date) else MealRecord
+    written_count = 0
+    conflicts = []
+    for _ in range(SAVE_ATTEMPTS):
+        if not pending:
+            break
+        existing = load_day_records(meal_date)
+        rows = []
+        deltas = []
+        for member_id, meal_count in pending.items():
+            current_count, current_version = existing.get(member_id, (None, None))
+            if current_count == meal_count:
+                continue
+            if member_id in bases and current_version != (bases[member_id] or (None,))[0]:
+                conflicts.append(member_id)
+                continue
+            rows.append({'member_id': member_id, 'meal_date': meal_date,
+                         'meal_count': meal_count, 'version': (current_version or 0) + 1})
+            deltas.append((member_id, meal_date, meal_count - (current_count or 0)))
+
+        written = {member_id for member_id, _ in _upsert_versioned(model, rows)}
+        apply_meal_deltas([delta for delta in deltas if delta[0] in written])
+        written_count += len(written)
+        # Rows skipped by the upsert lost a race after the read above
+        lost = [row['member_id'] for row in rows if row['member_id'] not in written]
+        conflicts.extend(member_id for member_id in lost if member_id in bases)
+        pending = {member_id: pending[member_id] for member_id in lost if member_id not in bases}
+    return DaySave(written_count, conflicts)
+
+
+def save_day_counts(meal_date, counts):
+    """Save ``{member_id: meal_count}`` for one day, writing only changes.
+
+    Last write wins for every member; see ``save_day_edits``. Returns the
+    number of rows written.
+    """
+    return save_day_edits(meal_date, counts).written
+
+
+def save_meal_changes(counts):
+    """Save ``{(member_id, meal_date): meal_count}`` on any days, last write wins.
+
+    Only changed counts are written, each against the version it was read
+    at, so the rollup gets the deltas of exactly the rows written even when
+    another worker saves the same records at once. Counts that lost such a
+    race are read again and retried, like unversioned saves in
+    ``save_day_edits``. Returns ``{(member_id, meal_date): old_count}`` for
+    the rows written, with None for new records.
+    """
+    pending = dict(counts)
+    changes = {}
+    for _ in range(SAVE_ATTEMPTS):
+        if not pending:
+            break
+        existing = load_records(pending)
+        rows = {MealRecord: [], MealRecordArchive: []}
+        old_counts = {}
+        deltas = {}
+        for (member_id, meal_date), meal_count in pending.items():
+            current_count, current_version = existing.get((member_id, meal_date), (None, None))
+            if current_count == meal_count:
+                continue
+            model = MealRecordArchive if archived(meal_date) else MealRecord
+            rows[model].append({'member_id': member_id, 'meal_date': meal_date,
+                                'meal_count': meal_count, 'version': (current_version or 0) + 1})
+            old_counts[(member_id, meal_date)] = current_count
+            deltas[(member_id, meal_date)] = meal_count - (current_count or 0)
+
+        written = set()
+        for model, model_rows in rows.items():
+            written |= _upsert_versioned(model, model_rows)
+        apply_meal_deltas([key + (deltas[key],) for key in written])
+        changes.update((key, old_counts[key]) for key in written)
+        pending = {key: pending[key] for key in old_counts if key not in written}
+    return changes
+
+
+def save_meal_counts(counts):
+    """Save ``{(member_id, meal_date): meal_count}`` on any days.
+
+    See ``save_meal_changes``. Returns the number of rows written.
+    """
+    return len(save_meal_changes(counts))
+
+
+def find_record(record_id):
+    """``(member_id, meal_date)`` of the current mess's record with ``record_id``, or None."""
+    for model in (MealRecord, MealRecordArchive):
+        row = db.session.query(model.member_id, model.meal_date).filter(
+            model.id == record_id,
+            model.mess_id == current_mess_id()
+        ).first()
+        if row is not None:
+            return tuple(row)
+    return None
+
+
+def encode_meal_base(record):
+    """Form token for a ``(meal_count, version)`` record, or '' for none."""
+    if record is None:
+        return ''
+    meal_count, version = record
+    return f'{version}:{meal_count}'
+
+
+def decode_meal_base(token):
+    """``(version, meal_count)``, None for '' (no record), or raise ValueError."""
+    if not token:
+        return None
+    version, meal_count = token.split(':')
+    return int(version), int(meal_count)
+
+
+def encode_history_cursor(meal_date, member_name):
+    """Opaque URL token for the position after (meal_date, member_name)."""
+    raw = f"{meal_date.strftime('%Y-%m-%d')}|{member_name}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_history_cursor(cursor):
+    """Return ``(meal_date, member_name)`` or ``None`` for a bad cursor."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        date_str, member_name = raw.split('|', 1)
+        return datetime.strptime(date_str, '%Y-%m-%d').date(), member_name
+    except (ValueError, binascii.Error, UnicodeError):
+        return None
+
+
+def fetch_history_rows(start_date, end_date, page_size, cursor=None):
+    """One page of records ordered by (meal_date DESC, member name).
+
+    Keyset pagination: the page continues strictly after the cursor
+    position, so every page is an index range scan on
+    ``ix_meal_records_mess_date_member`` no matter how deep it is. Returns
+    ``(rows, next_cursor)``; ``next_cursor`` is ``None`` on the last page.
+
+    Rows are plain tuples with ``id``, ``member_id``, ``member_name``,
+    ``meal_date``, ``meal_count`` and ``updated_at``. Building a few thousand
+    of them costs a fraction of loading as many ``MealRecord`` instances,
+    which dominates a long admin page once its HTML comes from the
+    fragment cache.
+    """
+    records = history_table(start_date, end_date)
+    query = db.session.query(
+        records.c.id, records.c.member_id, Member.name.label('member_name'),
+        records.c.meal_date, records.c.meal_count, records.c.updated_at
+    ).join(Member, records.c.member_id == Member.id).filter(
+        records.c.mess_id == current_mess_id(),
+        records.c.meal_date >= start_date,
+        records.c.meal_date <= end_date,
+        Member.removed_at.is_(None)
+    )
+
+    position = decode_history_cursor(cursor)
+    if position:
+        after_date, after_name = position
+        query = query.filter(or_(
+            records.c.meal_date < after_date,
+            and_(records.c.meal_date == after_date, Member.name > after_name)
+        ))
+
+    # One extra row tells us whether another page exists
+    rows = query.order_by(records.c.meal_date.desc(), Member.name).limit(page_size + 1).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_history_cursor(last.meal_date, last.member_name)
+    return rows, next_cursor
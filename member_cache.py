@@ -0,0 +1,149 @@
+"""Process-local cache of the member roster, invalidated across workers.
+
+Every page lists the members, but the roster changes a few times a month.
+Each worker keeps the list (as plain ``MemberEntry`` tuples) together with
+the stamp it was read under. The stamp is a small file under the instance
+directory, shared by every worker on the host like the report job files.
+Any commit that inserts, updates or deletes a ``Member`` writes a new
+stamp, and so does creating or dropping the table. Each worker then reloads
+on its next lookup.
+
+Rosters are kept per mess under the one stamp: any member change reloads
+every mess's roster, which is cheap at a few writes a month. Checking the
+stamp costs a file read, not a query. Writes made outside the app (a SQL
+console, another host) are not seen until ``MEMBER_CACHE_TTL`` seconds
+have passed.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Member, current_mess_id
+from metrics import Counter
+from replica import use_primary
+
+MemberEntry = namedtuple('MemberEntry', ['id', 'name', 'created_at'])
+
+
+class FileStamp:
+    """A random token in a file; rewriting it tells other processes to reload."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        try:
+            with open(self.path, 'r', encoding='ascii') as handle:
+                return handle.read()
+        except FileNotFoundError:
+            return None
+
+    def bump(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='ascii') as handle:
+            handle.write(uuid.uuid4().hex)
+        os.replace(tmp_path, self.path)
+
+
+class MemberDirectory:
+    def __init__(self, app=None):
+        self.lookups = Counter('meal_member_cache_lookups_total',
+                               'Member list lookups by result (hit or miss).', ('result',))
+        self.stamp = None
+        # mess_id -> (entries, stamp, loaded_at)
+        self._rosters = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MEMBER_CACHE_STAMP', os.path.join(app.instance_path, 'member_cache.stamp'))
+        app.config.setdefault('MEMBER_CACHE_TTL', 300)
+        self.stamp = FileStamp(app.config['MEMBER_CACHE_STAMP'])
+        if not event.contains(Session, 'after_flush', _note_member_changes):
+            event.listen(Session, 'after_flush', _note_member_changes)
+            event.listen(Session, 'after_commit', _invalidate_after_commit)
+            event.listen(Session, 'after_rollback', _forget_member_changes)
+            event.listen(Member.__table__, 'after_create', _invalidate_after_ddl)
+            event.listen(Member.__table__, 'after_drop', _invalidate_after_ddl)
+        metrics = app.extensions.get('request_metrics')
+        if metrics is not None:
+            metrics.register(self.lookups)
+        app.extensions['member_directory'] = self
+
+    @property
+    def hits(self):
+        return self.lookups.value('hit')
+
+    @property
+    def misses(self):
+        return self.lookups.value('miss')
+
+    def members(self):
+        """Members of the current mess ordered by name, as ``MemberEntry`` tuples."""
+        mess_id = current_mess_id()
+        # Read the stamp before the rows: a write landing in between leaves
+        # new rows under the old stamp, which the next lookup replaces
+        stamp = self.stamp.read()
+        ttl = current_app.config['MEMBER_CACHE_TTL']
+        with self._lock:
+            cached = self._rosters.get(mess_id)
+            if cached is not None and cached[1] == stamp and time.monotonic() - cached[2] < ttl:
+                self.lookups.inc('hit')
+                return cached[0]
+
+        # From the primary even in a replica-routed request: a lagging
+        # replica would cache an old roster under the new stamp
+        with use_primary():
+            rows = db.session.query(Member.id, Member.name, Member.created_at).filter(
+                Member.mess_id == mess_id,
+                Member.removed_at.is_(None)
+            ).order_by(Member.name).all()
+        entries = tuple(MemberEntry(*row) for row in rows)
+        with self._lock:
+            self._rosters[mess_id] = (entries, stamp, time.monotonic())
+        self.lookups.inc('miss')
+        return entries
+
+    def invalidate(self):
+        """Make every worker (this one included) reload on its next lookup."""
+        self.stamp.bump()
+        with self._lock:
+            self._rosters.clear()
+
+
+def _current_directory():
+    if has_app_context():
+        return current_app.extensions.get('member_directory')
+    return None
+
+
+def _note_member_changes(session, flush_context):
+    if any(isinstance(obj, Member) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['members_changed'] = True
+
+
+def _invalidate_after_commit(session):
+    # Only after commit: bumping earlier could let another worker cache the
+    # old roster under the new stamp
+    if session.info.pop('members_changed', False):
+        directory = _current_directory()
+        if directory is not None:
+            directory.invalidate()
+
+
+def _forget_member_changes(session):
+    session.info.pop('members_changed', None)
+
+
+def _invalidate_after_ddl(target, connection, **kw):
+    directory = _current_directory()
+    if directory is not None:
+        directory.invalidate()
@@ -0,0 +1,67 @@
+"""Member removal without long-held locks.
+
+Deleting all of a long-standing member's records in one transaction holds
+locks on meal_records until it commits. On SQLite that is the whole
+database. Every /meals save waits behind it. Removal is split in two:
+
+1. ``mark_removed`` sets ``Member.removed_at``. From the commit on, the
+   member is gone from every read. The member list, reports, exports, the
+   JSON API and the admin history all filter on ``removed_at IS NULL``.
+2. ``purge_member`` deletes the records (hot and archived) ``batch_size``
+   rows per transaction. It then removes the rollup rows, the member's
+   deposits and the member itself.
+   Saves slip in between batches.
+
+If the process dies between the two steps, the member stays hidden.
+``flask purge-removed-members`` finishes the job.
+"""
+from datetime import datetime
+
+from sqlalchemy import delete, select
+
+from models import db, Member, MealRecord, MealRecordArchive, Deposit
+from rollups import delete_member_rollups
+
+
+def mark_removed(member):
+    """Hide ``member`` from reads once the caller commits."""
+    member.removed_at = datetime.utcnow()
+
+
+def purge_member(member_id, batch_size, on_batch=None):
+    """Delete a removed member's records in batches, then the member.
+
+    Each batch is committed on its own; ``on_batch(deleted)`` is called
+    after every commit with the running total. Returns the number of
+    records deleted.
+    """
+    deleted = 0
+    # Archived rows are keyed on (member, date), so batch them by date
+    for model, key in ((MealRecord, MealRecord.id), (MealRecordArchive, MealRecordArchive.meal_date)):
+        while True:
+            batch = select(key).where(model.member_id == member_id).limit(batch_size)
+            result = db.session.execute(delete(model).where(model.member_id == member_id, key.in_(batch)))
+            db.session.commit()
+            if not result.rowcount:
+                break
+            deleted += result.rowcount
+            if on_batch is not None:
+                on_batch(deleted)
+
+    delete_member_rollups(member_id)
+    Deposit.query.filter_by(member_id=member_id).delete()
+    member = db.session.get(Member, member_id)
+    if member is not None:
+        db.session.delete(member)
+    db.session.commit()
+    return deleted
+
+
+def purge_removed_members(batch_size, on_batch=None):
+    """Finish every removal that was marked but not purged.
+
+    Returns ``[(member_id, records_deleted), ...]``.
+    """
+    member_ids = [member_id for (member_id,) in
+                  db.session.query(Member.id).filter(Member.removed_at.isnot(None)).order_by(Member.id)]
+    return [(member_id, purge_member(member_id, batch_size, on_batch)) for member_id in member_ids]
@@ -0,0 +1,216 @@
+"""Per-request instrumentation exposed in Prometheus text format.
+
+For every request the route latency, the number of SQL statements, the
+time spent in the database (both from ``query_stats``) and the time spent
+rendering Jinja templates are recorded in histograms labelled by route
+pattern, and served at ``/metrics``. Templates rendered directly rather
+than through ``render_template`` (the admin history's cached blocks) go
+through ``render_fragment`` to be counted::
+
+    metrics = RequestMetrics(app)
+
+Requests slower than ``SLOW_REQUEST_MS`` are logged with the same
+breakdown. Set ``METRICS_ENABLED = False`` to turn the hooks off.
+
+Metrics live in process memory: with several gunicorn workers each one
+reports its own series, and a scrape sees whichever worker answers.
+Streamed responses (the CSV / JSON-lines exports) are measured up to the
+point the response starts, not until the last chunk is sent.
+"""
+import threading
+import time
+
+from flask import Response, current_app, g, request, before_render_template, template_rendered
+
+# Prometheus' default latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}')
+        return lines
+
+
+class Gauge:
+    """A value read at scrape time: ``collect()`` returns ``{labels: value}``."""
+
+    def __init__(self, name, documentation, labelnames, collect):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        # labels -> [per-bucket counts, sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    label_text = _labels(self.labelnames, labels, [('le', _number(bound))])
+                    lines.append(f'{self.name}_bucket{label_text} {cumulative}')
+                label_text = _labels(self.labelnames, labels)
+                lines.append(f'{self.name}_sum{label_text} {_number(total)}')
+                lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+
+class RequestMetrics:
+    def __init__(self, app=None):
+        self.request_seconds = Histogram(
+            'meal_http_request_duration_seconds', 'Request latency by route.',
+            ('route', 'method', 'status'))
+        self.sql_statements = Histogram(
+            'meal_http_request_sql_statements', 'SQL statements issued per request.',
+            ('route',), STATEMENT_BUCKETS)
+        self.db_seconds = Histogram(
+            'meal_http_request_db_seconds', 'Time spent executing SQL per request.', ('route',))
+        self.template_seconds = Histogram(
+            'meal_http_request_template_seconds', 'Time spent rendering templates per request.', ('route',))
+        self.slow_requests = Counter(
+            'meal_http_slow_requests_total', 'Requests slower than SLOW_REQUEST_MS.', ('route',))
+        self.metrics = [self.request_seconds, self.sql_statements, self.db_seconds,
+                        self.template_seconds, self.slow_requests]
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('SLOW_REQUEST_MS', 1000)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.add_url_rule('/metrics', 'metrics', self.expose)
+        app.extensions['request_metrics'] = self
+
+    def register(self, collector):
+        """Add anything with an ``expose()`` returning exposition lines."""
+        self.metrics.append(collector)
+
+    def expose(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.expose())
+        return Response('\n'.join(lines) + '\n', content_type=CONTENT_TYPE)
+
+    def _before_request(self):
+        if current_app.config['METRICS_ENABLED']:
+            g.request_started = time.perf_counter()
+            g.template_time = 0.0
+
+    def _before_render(self, sender, template, context, **extra):
+        if 'request_started' in g:
+            g.template_started = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        started = g.pop('template_started', None)
+        if started is not None:
+            g.template_time += time.perf_counter() - started
+
+    def _after_request(self, response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        # The route pattern, not the path, keeps label cardinality bounded
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        query_count = g.get('query_count', 0)
+        query_time = g.get('query_time', 0.0)
+
+        self.request_seconds.observe(elapsed, route, request.method, str(response.status_code))
+        self.sql_statements.observe(query_count, route)
+        self.db_seconds.observe(query_time, route)
+        self.template_seconds.observe(g.template_time, route)
+
+        if elapsed * 1000 >= current_app.config['SLOW_REQUEST_MS']:
+            self.slow_requests.inc(route)
+            current_app.logger.warning(
+                'Slow request: %s %s -> %s in %.0f ms (%d SQL statements, %.0f ms DB, %.0f ms templates)',
+                request.method, request.full_path.rstrip('?'), response.status_code, elapsed * 1000,
+                query_count, query_time * 1000, g.template_time * 1000)
+        return response
+
+
+def render_fragment(template, **context):
+    """Render a Jinja ``template`` directly, counting its time as template time.
+
+    Skips ``render_template``'s context processors and signals, which cost
+    more than a small fragment's own rendering.
+    """
+    started = time.perf_counter()
+    try:
+        return template.render(**context)
+    finally:
+        if 'template_time' in g:
+            g.template_time += time.perf_counter() - started
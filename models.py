@@ -0,0 +1,175 @@
+from flask import g, has_app_context
+from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime
+
+class RoutingSession(Session):
+    """Session that reads from the bind named by ``g.db_bind``, if any (see replica.py).
+
+    Flushes always go to the usual bind, so a routed request that does
+    write still writes to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context():
+            key = g.get('db_bind')
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# The mess served without a /m/<slug> URL prefix; rows written before
+# messes existed belong to it (see tenancy.py)
+DEFAULT_MESS_ID = 1
+
+def current_mess_id():
+    """Id of the mess being served: set per request by tenancy.py, else the default mess."""
+    if has_app_context():
+        return g.get('mess_id', DEFAULT_MESS_ID)
+    return DEFAULT_MESS_ID
+
+def mess_column():
+    """``mess_id`` column for per-mess tables; new rows go to the current mess."""
+    return db.Column(db.Integer, db.ForeignKey('messes.id'), nullable=False,
+                     default=current_mess_id, server_default=str(DEFAULT_MESS_ID))
+
+_DIALECT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+def dialect_insert(table):
+    """INSERT construct supporting ON CONFLICT for the current bind, or None."""
+    insert = _DIALECT_INSERTS.get(db.session.get_bind().dialect.name)
+    return insert(table) if insert else None
+
+# Database Models
+class Mess(db.Model):
+    """One mess (tenant). Every per-mess table carries its ``mess_id``."""
+    __tablename__ = 'messes'
+    id = db.Column(db.Integer, primary_key=True)
+    # URL prefix: /m/<slug>/...
+    slug = db.Column(db.String(50), nullable=False, unique=True)
+    name = db.Column(db.String(100), nullable=False)
+    # Falls back to ADMIN_PASSWORD when empty
+    admin_password_hash = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Member(db.Model):
+    __tablename__ = 'members'
+    id = db.Column(db.Integer, primary_key=True)
+    mess_id = mess_column()
+    name = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set when an admin removes the member: every read skips them from then
+    # on, while member_removal.py deletes their records in batches
+    removed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # Names are unique within a mess; also serves the roster, ordered by name.
+        # An index rather than a constraint, so init-db can add it to an existing table
+        db.Index('unique_mess_member_name', 'mess_id', 'name', unique=True),
+    )
+
+class MealRecord(db.Model):
+    __tablename__ = 'meal_records'
+    id = db.Column(db.Integer, primary_key=True)
+    # Always the member's mess; kept on the row so range scans stay within one mess
+    mess_id = mess_column()
+    member_id = db.Column(db.Integer, db.ForeignKey('members.id'), nullable=False)
+    meal_date = db.Column(db.Date, nullable=False)
+    meal_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped by every write; the /meals form saves against the version it
+    # loaded, so concurrent edits are detected instead of overwritten
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    member = db.relationship('Member', backref=db.backref('meal_records', lazy=True))
+
+    __table_args__ = (
+        db.UniqueConstraint('member_id', 'meal_date', name='unique_member_date'),
+        # Admin history pages and reports are range scans on meal_date within a mess
+        db.Index('ix_meal_records_mess_date_member', 'mess_id', 'meal_date', 'member_id'),
+    )
+    __mapper_args__ = {'version_id_col': version}
+
+class MealRecordArchive(db.Model):
+    """Meal records of closed months, moved out of meal_records by history.py.
+
+    Same columns as MealRecord, but keyed on (member, date): ``id`` keeps
+    the original record id and is empty for rows first written here.
+    Read it through ``history.history_table``.
+    """
+    __tablename__ = 'meal_records_archive'
+    member_id = db.Column(db.Integer, db.ForeignKey('members.id'), primary_key=True)
+    meal_date = db.Column(db.Date, primary_key=True)
+    id = db.Column(db.Integer, nullable=True, index=True)
+    mess_id = mess_column()
+    meal_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __table_args__ = (
+        db.Index('ix_meal_records_archive_mess_date_member', 'mess_id', 'meal_date', 'member_id'),
+        # The archive cutoff is the latest archived date of any mess
+        db.Index('ix_meal_records_archive_date_member', 'meal_date', 'member_id'),
+    )
+    __mapper_args__ = {'version_id_col': version}
+
+class MemberMonthlyTotal(db.Model):
+    """Rollup of meal_records per member and calendar month.
+
+    Kept in step with meal_records by rollups.py in the same transaction as
+    every write, so monthly reports read one row per member.
+    """
+    __tablename__ = 'member_monthly_totals'
+    id = db.Column(db.Integer, primary_key=True)
+    member_id = db.Column(db.Integer, db.ForeignKey('members.id'), nullable=False)
+    mess_id = mess_column()
+    # First day of the month
+    month = db.Column(db.Date, nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('member_id', 'month', name='unique_member_month'),
+        db.Index('ix_member_monthly_totals_mess_month', 'mess_id', 'month'),
+    )
+
+class Expense(db.Model):
+    """Money spent for the mess (bazaar, gas, rent...) on a given day.
+
+    Shared by everyone in proportion to the meals they ate; see
+    settlement.py.
+    """
+    __tablename__ = 'expenses'
+    id = db.Column(db.Integer, primary_key=True)
+    mess_id = mess_column()
+    expense_date = db.Column(db.Date, nullable=False)
+    amount = db.Column(db.Numeric(12, 2), nullable=False)
+    description = db.Column(db.String(200), nullable=False, default='')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_expenses_mess_date', 'mess_id', 'expense_date'),)
+
+class Deposit(db.Model):
+    """Money a member paid into the mess, credited against their meal cost."""
+    __tablename__ = 'deposits'
+    id = db.Column(db.Integer, primary_key=True)
+    member_id = db.Column(db.Integer, db.ForeignKey('members.id'), nullable=False)
+    mess_id = mess_column()
+    deposit_date = db.Column(db.Date, nullable=False)
+    amount = db.Column(db.Numeric(12, 2), nullable=False)
+    note = db.Column(db.String(200), nullable=False, default='')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Settlements sum a date range per member of one mess
+        db.Index('ix_deposits_mess_date_member', 'mess_id', 'deposit_date', 'member_id'),
+    )
@@ -0,0 +1,125 @@
+"""SQL statement counting for requests and tests.
+
+Every statement sent through any SQLAlchemy engine is counted against the
+current request (``g.query_count``) and against any ``QueryStats.count()``
+blocks open on the current thread, so tests can put an upper bound on the
+queries a route issues::
+
+    with app.extensions['query_stats'].count() as counter:
+        client.get('/admin')
+    assert counter.count <= 2
+
+Set ``QUERY_COUNT_HEADER = True`` to also report the per-request count in an
+``X-Query-Count`` response header. Time spent executing statements is
+summed into ``g.query_time`` (seconds) for the request metrics.
+
+Statements and their execution time are also counted per database bind
+(``default``, or ``replica`` when one is configured) in
+``STATEMENTS_BY_BIND`` and ``STATEMENT_SECONDS``. Engines are named with
+``name_bind``; any other engine counts as ``default``.
+"""
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from metrics import Counter, Histogram
+
+STATEMENT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+STATEMENTS_BY_BIND = Counter(
+    'meal_db_statements_total', 'SQL statements executed, by database bind.', ('bind',))
+STATEMENT_SECONDS = Histogram(
+    'meal_db_statement_seconds', 'Time to execute one SQL statement, by database bind.',
+    ('bind',), STATEMENT_BUCKETS)
+
+_local = threading.local()
+
+# engine -> bind name
+_bind_names = weakref.WeakKeyDictionary()
+
+
+def name_bind(engine, name):
+    """Report statements sent through ``engine`` under the bind label ``name``."""
+    _bind_names[engine] = name
+
+
+def bind_name(engine):
+    return _bind_names.get(engine, 'default')
+
+
+class QueryCounter:
+    """Statements seen while a ``QueryStats.count()`` block was open."""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+def _active_counters():
+    if not hasattr(_local, 'counters'):
+        _local.counters = []
+    return _local.counters
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active_counters():
+        counter.statements.append(statement)
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+    if context is not None:
+        context._query_stats_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_stats_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    bind = bind_name(conn.engine)
+    STATEMENTS_BY_BIND.inc(bind)
+    STATEMENT_SECONDS.observe(elapsed, bind)
+    if has_request_context():
+        g.query_time = g.get('query_time', 0.0) + elapsed
+
+
+class QueryStats:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('QUERY_COUNT_HEADER', False)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        if not event.contains(Engine, 'after_cursor_execute', _after_cursor_execute):
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions['query_stats'] = self
+
+    @contextmanager
+    def count(self):
+        counter = QueryCounter()
+        counters = _active_counters()
+        counters.append(counter)
+        try:
+            yield counter
+        finally:
+            counters.remove(counter)
+
+    def _before_request(self):
+        g.query_count = 0
+        g.query_time = 0.0
+
+    def _after_request(self, response):
+        if current_app.config['QUERY_COUNT_HEADER']:
+            response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+        return response
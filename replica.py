@@ -0,0 +1,193 @@
+"""Read-replica routing for reports and history.
+
+The admin history, the PDF report, the CSV / JSON-lines exports and the
+read-only API scan months of records. With ``DATABASE_REPLICA_URL`` set,
+GET requests to those views (marked ``@replica_reads``) read from a
+replica, which keeps these scans off the primary that /meals writes to.
+Everything else, and every write, stays on the primary. Without a replica
+URL nothing changes.
+
+The replica is an extra Flask-SQLAlchemy bind named ``replica``.
+``models.RoutingSession`` sends a request's reads to the bind named in
+``g.db_bind``, which ``@replica_reads`` sets for the request.
+
+A replica lags the primary, so someone who has just saved should not be
+shown the old counts. Any request whose commit wrote something stamps its
+session cookie, and for ``REPLICA_STICKY_SECONDS`` after that the user's
+reads stay on the primary. Other users may see the replica's lag. Clients
+that do not keep cookies (kiosks calling the API) are not covered.
+
+A replica that cannot be reached, or that errors, is skipped for
+``REPLICA_RETRY_SECONDS``. The request that found the fault is run again
+on the primary. A streamed export that fails part-way is the exception:
+the response has started, so it cannot be restarted. The process-wide
+caches of the member roster, the messes and the archive cutoff always
+load from the primary (``use_primary``), so a lagging replica cannot get
+stale data cached under a fresh stamp.
+
+Routing decisions and fallbacks are counted at /metrics in
+``meal_db_read_routes_total``. SQL statements are counted per bind by
+``query_stats``.
+"""
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from sqlalchemy import event, exc
+from sqlalchemy.orm import Session
+
+from models import db
+from metrics import Counter, Gauge
+from query_stats import STATEMENTS_BY_BIND, STATEMENT_SECONDS, name_bind
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND = 'replica'
+
+# Session key: until when (epoch seconds) this user's reads stay on the primary
+STICKY_KEY = 'db_primary_until'
+
+# Errors after which the replica is skipped and the request retried on the primary
+REPLICA_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.TimeoutError)
+
+READ_ROUTES = Counter(
+    'meal_db_read_routes_total',
+    'Replica-eligible requests by the bind that served them and why.', ('bind', 'reason'))
+
+
+def replica_binds(replica_uri, options):
+    """``SQLALCHEMY_BINDS`` entry for the replica."""
+    return {REPLICA_BIND: {'url': replica_uri, **options}}
+
+
+class ReplicaRouter:
+    def __init__(self, app=None):
+        self.available = Gauge('meal_db_replica_available',
+                               'Whether reads are being sent to the replica (1) or not (0).',
+                               (), self._collect_available)
+        self.enabled = False
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 10)
+        app.config.setdefault('REPLICA_RETRY_SECONDS', 30)
+        with app.app_context():
+            engines = db.engines
+        for key, engine in engines.items():
+            name_bind(engine, key or 'default')
+        self.enabled = REPLICA_BIND in engines
+        if self.enabled:
+            event.listen(engines[REPLICA_BIND], 'handle_error', self._replica_failed)
+        if not event.contains(Session, 'after_flush', _note_write):
+            event.listen(Session, 'after_flush', _note_write)
+            event.listen(Session, 'do_orm_execute', _note_bulk_write)
+            event.listen(Session, 'after_commit', _remember_write)
+            event.listen(Session, 'after_rollback', _forget_write)
+        app.before_request(_reset_request)
+        app.after_request(self._after_request)
+        metrics = app.extensions.get('request_metrics')
+        if metrics is not None:
+            for metric in (STATEMENTS_BY_BIND, STATEMENT_SECONDS, READ_ROUTES, self.available):
+                metrics.register(metric)
+        app.extensions['replica_router'] = self
+
+    def is_down(self):
+        return time.monotonic() < self._down_until
+
+    def mark_down(self):
+        """Send reads to the primary for the next REPLICA_RETRY_SECONDS."""
+        with self._lock:
+            self._down_until = time.monotonic() + current_app.config['REPLICA_RETRY_SECONDS']
+
+    def route(self):
+        """``(bind, reason)`` for a replica-eligible read in this request."""
+        if session.get(STICKY_KEY, 0) > time.time():
+            return None, 'sticky'
+        if self.is_down():
+            return None, 'replica_down'
+        return REPLICA_BIND, 'replica'
+
+    def _replica_failed(self, context):
+        if isinstance(context.sqlalchemy_exception, REPLICA_ERRORS) and has_app_context():
+            self.mark_down()
+
+    def _after_request(self, response):
+        if self.enabled and g.get('db_wrote'):
+            session[STICKY_KEY] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+        return response
+
+    def _collect_available(self):
+        if not self.enabled:
+            return {}
+        return {(): 0 if self.is_down() else 1}
+
+
+def replica_reads(view):
+    """Serve GET requests to ``view`` from the replica when one is usable."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        router = current_app.extensions['replica_router']
+        if not router.enabled or request.method not in ('GET', 'HEAD'):
+            return view(*args, **kwargs)
+        bind, reason = router.route()
+        if bind is None:
+            READ_ROUTES.inc('default', reason)
+            return view(*args, **kwargs)
+
+        g.db_bind = bind
+        try:
+            # Connect before the view runs, so an unreachable replica is
+            # caught here even when the view streams its rows later
+            db.session.connection()
+            response = view(*args, **kwargs)
+        except REPLICA_ERRORS as error:
+            logger.warning('Replica read failed, using the primary: %s', error)
+            router.mark_down()
+            db.session.rollback()
+            g.pop('db_bind', None)
+            READ_ROUTES.inc('default', 'replica_error')
+            return view(*args, **kwargs)
+        READ_ROUTES.inc(bind, reason)
+        return response
+    return wrapper
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside a replica-routed request."""
+    saved = g.pop('db_bind', None) if has_app_context() else None
+    try:
+        yield
+    finally:
+        if saved is not None:
+            g.db_bind = saved
+
+
+def _reset_request():
+    # g outlives the request when an app context was already pushed (tests, CLI)
+    g.pop('db_bind', None)
+    g.pop('db_wrote', None)
+
+
+def _note_write(session, flush_context):
+    session.info['db_wrote'] = True
+
+
+def _note_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['db_wrote'] = True
+
+
+def _remember_write(session):
+    if session.info.pop('db_wrote', False) and has_request_context():
+        g.db_wrote = True
+
+
+def _forget_write(session):
+    session.info.pop('db_wrote', None)
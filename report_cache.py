@@ -0,0 +1,163 @@
+"""Cache of rendered PDF reports.
+
+A report is identified by its month and a data version stamp: the latest
+``updated_at``/``created_at`` and the row counts of the month's meal
+records, expenses and deposits, and of the members table, plus when the
+month's rollup rows last changed. The counts catch deletes, which do not
+move the timestamps, and the rollup stamp moves when a rebuild corrects
+drift, so every worker drops reports built from the drifted totals. Rendered bytes are kept in a per-process LRU bounded
+by total size, and the stamp doubles as the response ETag so repeat
+downloads are answered with 304 before ReportLab is touched.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import timezone
+
+from sqlalchemy import func, true
+
+from models import db, Member, MemberMonthlyTotal, Expense, Deposit, current_mess_id
+from history import history_table
+
+
+class ReportVersion:
+    """Data version stamp for one report."""
+
+    def __init__(self, key, last_modified):
+        self.key = key
+        # Naive UTC datetime of the newest change, or None without any data
+        self.last_modified = last_modified
+
+    def with_variant(self, variant):
+        """The same data version, for a different rendering of the range."""
+        return ReportVersion((variant,) + self.key[1:], self.last_modified)
+
+    @property
+    def etag(self):
+        return hashlib.sha1(repr(self.key).encode('utf-8')).hexdigest()
+
+    @property
+    def last_modified_http(self):
+        """``last_modified`` as an aware datetime at HTTP (whole second) precision."""
+        if self.last_modified is None:
+            return None
+        return self.last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+
+
+def report_version(start_date, end_date, variant='summary'):
+    """Read the data version stamp for a report over ``start_date``..``end_date``.
+
+    ``variant`` separates differently rendered reports over the same data,
+    such as the summary and the per-day breakdown. The stamp covers the
+    current mess only, and its key names the mess, so every cache keyed on
+    it is per mess.
+    """
+    mess_id = current_mess_id()
+    history = history_table(start_date, end_date)
+    records = db.session.query(
+        func.max(history.c.updated_at),
+        func.max(history.c.created_at),
+        func.count()
+    ).select_from(history).filter(
+        history.c.mess_id == mess_id,
+        history.c.meal_date >= start_date,
+        history.c.meal_date <= end_date
+    ).subquery()
+    # Removing a member hides them before their records are purged
+    members = db.session.query(
+        func.max(Member.created_at),
+        func.count(Member.id)
+    ).filter(Member.mess_id == mess_id, Member.removed_at.is_(None)).subquery()
+    # Settlements in the report depend on the ledger too
+    expenses = db.session.query(
+        func.max(Expense.updated_at),
+        func.max(Expense.created_at),
+        func.count(Expense.id)
+    ).filter(
+        Expense.mess_id == mess_id,
+        Expense.expense_date >= start_date,
+        Expense.expense_date <= end_date
+    ).subquery()
+    deposits = db.session.query(
+        func.max(Deposit.updated_at),
+        func.max(Deposit.created_at),
+        func.count(Deposit.id)
+    ).filter(
+        Deposit.mess_id == mess_id,
+        Deposit.deposit_date >= start_date,
+        Deposit.deposit_date <= end_date
+    ).subquery()
+    # Month-aligned totals are read from the rollup, which a rebuild rewrites
+    rollups = db.session.query(
+        func.max(MemberMonthlyTotal.updated_at)
+    ).filter(
+        MemberMonthlyTotal.mess_id == mess_id,
+        MemberMonthlyTotal.month >= start_date.replace(day=1),
+        MemberMonthlyTotal.month <= end_date
+    ).subquery()
+    # All are single-row aggregates; join them side by side
+    row = db.session.query(records, members, expenses, deposits, rollups).select_from(records).join(
+        members, true()
+    ).join(expenses, true()).join(deposits, true()).join(rollups, true()).one()
+
+    (records_updated, records_created, record_count, members_created, member_count,
+     expenses_updated, expenses_created, expense_count,
+     deposits_updated, deposits_created, deposit_count, rollups_updated) = row
+    timestamps = [ts for ts in (records_updated, records_created, members_created,
+                                expenses_updated, expenses_created, deposits_updated, deposits_created,
+                                rollups_updated)
+                  if ts is not None]
+    last_modified = max(timestamps) if timestamps else None
+    key = (
+        variant, mess_id, start_date.isoformat(), end_date.isoformat(),
+        str(last_modified), record_count, member_count, expense_count, deposit_count, str(rollups_updated)
+    )
+    return ReportVersion(key, last_modified)
+
+
+class ReportCache:
+    """Thread-safe LRU of rendered reports with a total byte limit."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        # Reports larger than the whole cache are simply not kept
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
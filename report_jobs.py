@@ -0,0 +1,164 @@
+"""Off-request report rendering on a local worker pool.
+
+A job's id is the data version ETag of the report it renders, so identical
+requests for unchanged data map to the same job and are merged. Job state
+lives in files under ``job_dir`` rather than in memory, so any gunicorn
+worker on the host can answer a status poll or a download, and no external
+broker is needed:
+
+    <id>.json   metadata written at submit time (download name)
+    <id>.lock   present while the job is queued or running
+    <id>.pdf    the finished report
+    <id>.error  the failure message if rendering raised
+
+Rendering runs on a thread pool (OS threads, also under gevent), or a
+ProcessPoolExecutor when ``use_processes`` is set, capped at
+``max_workers`` per process. Render
+functions receive plain data only and must return bytes.
+"""
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from serving import thread_pool_executor
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+_JOB_ID = re.compile(r'^[0-9a-f]{40}$')
+
+
+def _write_atomic(path, data):
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as handle:
+        handle.write(data)
+    os.replace(tmp_path, path)
+
+
+def _run_job(job_dir, job_id, render, args):
+    """Executor entry point: render, store the result and release the lock."""
+    base = os.path.join(job_dir, job_id)
+    try:
+        _write_atomic(f'{base}.pdf', render(*args))
+    except Exception as e:
+        _write_atomic(f'{base}.error', str(e).encode('utf-8'))
+    finally:
+        try:
+            os.remove(f'{base}.lock')
+        except FileNotFoundError:
+            pass
+
+
+class ReportJobs:
+    def __init__(self, job_dir, max_workers=2, use_processes=False,
+                 stale_after=600, keep_for=3600):
+        self.job_dir = job_dir
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        # A lock older than this belongs to a worker that died mid-render
+        self.stale_after = stale_after
+        # Finished jobs are pruned after this many seconds
+        self.keep_for = keep_for
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created on first use so each forked gunicorn worker gets its own pool
+        with self._lock:
+            if self._executor is None:
+                if self.use_processes:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    # Native threads even under gevent, so rendering never blocks the hub
+                    self._executor = thread_pool_executor(self.max_workers)
+            return self._executor
+
+    def _path(self, job_id, suffix):
+        return os.path.join(self.job_dir, f'{job_id}.{suffix}')
+
+    @staticmethod
+    def valid_id(job_id):
+        return bool(_JOB_ID.match(job_id or ''))
+
+    def status(self, job_id):
+        """``'done'``, ``'pending'``, ``'failed'`` or ``None`` for an unknown job."""
+        if not self.valid_id(job_id):
+            return None
+        if os.path.exists(self._path(job_id, 'pdf')):
+            return DONE
+        # A job holds its lock until after it has written its result
+        try:
+            age = time.time() - os.path.getmtime(self._path(job_id, 'lock'))
+        except FileNotFoundError:
+            age = None
+        if age is not None and age <= self.stale_after:
+            return PENDING
+        if age is not None or os.path.exists(self._path(job_id, 'error')):
+            return FAILED
+        return None
+
+    def error(self, job_id):
+        try:
+            with open(self._path(job_id, 'error'), 'rb') as handle:
+                return handle.read().decode('utf-8')
+        except FileNotFoundError:
+            return 'Report job stopped before finishing.'
+
+    def metadata(self, job_id):
+        try:
+            with open(self._path(job_id, 'json'), 'r', encoding='utf-8') as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return {}
+
+    def result_path(self, job_id):
+        return self._path(job_id, 'pdf')
+
+    def submit(self, job_id, metadata, render, *args):
+        """Queue ``render(*args)`` as ``job_id`` unless it is already running or done.
+
+        Returns the job's status after submitting.
+        """
+        os.makedirs(self.job_dir, exist_ok=True)
+        self.prune()
+
+        state = self.status(job_id)
+        if state in (DONE, PENDING):
+            return state
+        for suffix in ('error', 'lock'):
+            try:
+                os.remove(self._path(job_id, suffix))
+            except FileNotFoundError:
+                pass
+
+        # O_EXCL makes exactly one submitter, in any process, own the job
+        try:
+            fd = os.open(self._path(job_id, 'lock'), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return PENDING
+        os.close(fd)
+
+        _write_atomic(self._path(job_id, 'json'), json.dumps(metadata).encode('utf-8'))
+        self._get_executor().submit(_run_job, self.job_dir, job_id, render, args)
+        return PENDING
+
+    def prune(self):
+        """Delete finished jobs older than ``keep_for``."""
+        cutoff = time.time() - self.keep_for
+        try:
+            names = os.listdir(self.job_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.endswith('.lock'):
+                continue
+            path = os.path.join(self.job_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,238 @@
+"""PDF rendering for meal reports.
+
+Builders only receive plain data from aggregates.py: ``(name, total)``
+tuples for the summary and, for the optional per-day breakdown, an
+iterator of ``(name, meal_date, meal_count)`` rows ordered by name and
+date. When expenses or deposits were recorded, the summary shows the
+``settlement.Settlement`` instead: meal rate, cost, deposits and balance
+per member. They never touch the ORM.
+
+Large reports are laid out a batch of flowables at a time: ReportLab pulls
+the next batch from the row iterator only when it has placed the previous
+one, so neither the rows nor the flowables for the whole range are held in
+memory at once.
+"""
+from io import BytesIO
+from itertools import chain, groupby
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+
+from aggregates import grand_total, month_bounds
+
+# Member-month tables laid out per batch of the daily breakdown
+DETAIL_BATCH_SIZE = 24
+
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498db')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 14),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+])
+
+SETTLEMENT_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498db')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+])
+
+DETAIL_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498db')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.HexColor('#f8f9fa')]),
+])
+
+
+class _FlowableStream(list):
+    """Flowable list for ``doc.build`` that refills itself from batches.
+
+    ``build`` only ever looks at the front of its list, so keeping a couple
+    of flowables buffered is enough for it to lay out an unbounded story.
+    """
+
+    def __init__(self, batches):
+        super().__init__()
+        self._batches = iter(batches)
+
+    def _refill(self):
+        while list.__len__(self) < 2:
+            batch = next(self._batches, None)
+            if batch is None:
+                return
+            self.extend(batch)
+
+    def __len__(self):
+        self._refill()
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        self._refill()
+        return list.__getitem__(self, index)
+
+
+def _styles():
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#2c3e50'),
+        spaceAfter=30,
+        alignment=TA_CENTER
+    )
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=16,
+        textColor=colors.HexColor('#34495e'),
+        spaceAfter=20,
+        alignment=TA_LEFT
+    )
+    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=9, textColor=colors.grey)
+    return styles, title_style, heading_style, footer_style
+
+
+def report_heading(start_date, end_date):
+    """'Monthly Meal Report - March 2024' or the explicit date range."""
+    if (start_date, end_date) == month_bounds(start_date.year, start_date.month):
+        return f"Monthly Meal Report - {start_date.strftime('%B %Y')}"
+    return (f"Meal Report - {start_date.strftime('%Y-%m-%d')} "
+            f"to {end_date.strftime('%Y-%m-%d')}")
+
+
+def _summary_flowables(start_date, end_date, totals, data_as_of, styles, settlement=None, mess_name=None):
+    styles, title_style, heading_style, footer_style = styles
+    story = []
+
+    # Title
+    if mess_name:
+        story.append(Paragraph(escape(mess_name), title_style))
+        story.append(Spacer(1, 0.2*inch))
+    story.append(Paragraph(report_heading(start_date, end_date), heading_style))
+    story.append(Spacer(1, 0.3*inch))
+
+    if settlement is not None and settlement.has_ledger:
+        story.extend(_settlement_flowables(settlement, styles))
+    else:
+        # Table data
+        table_data = [['Member Name', 'Total Meals']]
+        for name, total in totals:
+            table_data.append([name, str(total)])
+
+        table = Table(table_data, colWidths=[4*inch, 2*inch], repeatRows=1)
+        table.setStyle(SUMMARY_TABLE_STYLE)
+        story.append(table)
+        story.append(Spacer(1, 0.3*inch))
+
+        # Total summary
+        story.append(Paragraph(f"<b>Grand Total: {grand_total(totals)} meals</b>", styles['Normal']))
+    if data_as_of is not None:
+        story.append(Spacer(1, 0.2*inch))
+        story.append(Paragraph(f"Data as of: {data_as_of.strftime('%Y-%m-%d %H:%M:%S')} UTC", footer_style))
+    return story
+
+
+def _settlement_flowables(settlement, styles):
+    """Per-member meals, cost, deposits and balance, then the month's figures."""
+    table_data = [['Member Name', 'Meals', 'Cost', 'Deposited', 'Balance']]
+    for balance in settlement.balances:
+        table_data.append([balance.name, str(balance.meals), str(balance.cost),
+                           str(balance.deposited), str(balance.balance)])
+    table = Table(table_data, colWidths=[2.2*inch, 0.9*inch, 1.2*inch, 1.2*inch, 1.2*inch], repeatRows=1)
+    table.setStyle(SETTLEMENT_TABLE_STYLE)
+
+    meal_rate = settlement.meal_rate
+    return [
+        table,
+        Spacer(1, 0.3*inch),
+        Paragraph(f"<b>Grand Total: {settlement.total_meals} meals</b>", styles['Normal']),
+        Paragraph(f"Total Expense: {settlement.total_expense}", styles['Normal']),
+        Paragraph(f"Meal Rate: {'-' if meal_rate is None else meal_rate} per meal", styles['Normal']),
+        Paragraph(f"Total Deposited: {settlement.total_deposited}", styles['Normal']),
+        Paragraph("A negative balance is owed to the mess; a positive one is owed back to the member.",
+                  styles['Normal']),
+    ]
+
+
+def _detail_batches(daily_rows, styles):
+    """Per-member daily breakdown, one table per member and month."""
+    _, _, heading_style, _ = styles
+    batch = []
+    tables = 0
+    for name, member_rows in groupby(daily_rows, key=lambda row: row[0]):
+        first_month = True
+        for month, month_rows in groupby(member_rows, key=lambda row: (row[1].year, row[1].month)):
+            table_data = [['Date', 'Meals']]
+            month_total = 0
+            for _, meal_date, meal_count in month_rows:
+                table_data.append([meal_date.strftime('%Y-%m-%d (%a)'), str(meal_count)])
+                month_total += meal_count
+            table_data.append(['Total', str(month_total)])
+
+            if first_month:
+                batch.append(PageBreak())
+                first_month = False
+            batch.append(Paragraph(f"{escape(name)} - {month[0]}-{month[1]:02d}", heading_style))
+            table = Table(table_data, colWidths=[3*inch, 1.5*inch], repeatRows=1)
+            table.setStyle(DETAIL_TABLE_STYLE)
+            batch.append(table)
+            batch.append(Spacer(1, 0.2*inch))
+
+            tables += 1
+            if tables % DETAIL_BATCH_SIZE == 0:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def write_report(output, start_date, end_date, totals, daily_rows=None, data_as_of=None, settlement=None,
+                 mess_name=None):
+    """Render a report for ``start_date``..``end_date`` into a file-like ``output``.
+
+    ``mess_name`` is the title; the report has none without it.
+
+    The output depends only on the arguments: the footer shows when the
+    data last changed (``data_as_of``) rather than the build time, and
+    ReportLab's invariant mode drops its own timestamps, so identical data
+    renders identical bytes.
+    """
+    doc = SimpleDocTemplate(output, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch,
+                            invariant=True)
+    styles = _styles()
+    batches = [_summary_flowables(start_date, end_date, totals, data_as_of, styles, settlement, mess_name)]
+    if daily_rows is not None:
+        batches = chain(batches, _detail_batches(daily_rows, styles))
+    doc.build(_FlowableStream(batches))
+
+
+def render_report_pdf(start_date, end_date, totals, data_as_of=None, settlement=None, mess_name=None):
+    """Summary report as bytes, for report_jobs workers."""
+    buffer = BytesIO()
+    write_report(buffer, start_date, end_date, totals, data_as_of=data_as_of, settlement=settlement,
+                 mess_name=mess_name)
+    return buffer.getvalue()
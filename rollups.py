@@ -0,0 +1,135 @@
+"""Maintenance of the member_monthly_totals rollup.
+
+Every write to meal_records passes the change in meal count to
+``apply_meal_deltas`` inside the same transaction; the rollup rows are then
+incremented in the database with INSERT ... ON CONFLICT DO UPDATE, which
+is safe when several workers save at once. ``rebuild_rollups`` recomputes
+the table from meal_records and reports any drift it corrected.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import func
+
+from models import db, dialect_insert, Member, MemberMonthlyTotal
+from history import history_table
+
+
+def month_key(meal_date):
+    """Rollup key for the month containing ``meal_date``."""
+    return meal_date.replace(day=1)
+
+
+def apply_meal_deltas(changes):
+    """Adjust rollup totals for ``(member_id, meal_date, delta)`` changes.
+
+    The caller owns the transaction and must commit.
+    """
+    deltas = defaultdict(int)
+    for member_id, meal_date, delta in changes:
+        if delta:
+            deltas[(int(member_id), month_key(meal_date))] += delta
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+
+    now = datetime.utcnow()
+    table = MemberMonthlyTotal.__table__
+    stmt = dialect_insert(table)
+    if stmt is None:
+        for (member_id, month), delta in deltas.items():
+            rollup = MemberMonthlyTotal.query.filter_by(member_id=member_id, month=month).first()
+            if rollup:
+                rollup.total += delta
+            else:
+                db.session.add(MemberMonthlyTotal(member_id=member_id, month=month, total=delta))
+        return len(deltas)
+
+    stmt = stmt.values([
+        {'member_id': member_id, 'month': month, 'total': delta, 'updated_at': now}
+        for (member_id, month), delta in deltas.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.member_id, table.c.month],
+        set_={
+            'total': table.c.total + stmt.excluded.total,
+            'updated_at': stmt.excluded.updated_at,
+        }
+    )
+    db.session.execute(stmt)
+    return len(deltas)
+
+
+def delete_member_rollups(member_id):
+    """Drop a removed member's rollup rows."""
+    MemberMonthlyTotal.query.filter_by(member_id=member_id).delete()
+
+
+def _month_column(meal_date):
+    """SQL expression truncating a meal_date column to the first of its month."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.date(func.date_trunc('month', meal_date))
+    return func.date(meal_date, 'start of month')
+
+
+def compute_rollups(mess_id=None):
+    """``{(member_id, month): total}`` computed from meal_records and its archive.
+
+    Covers every mess, or only ``mess_id``.
+    """
+    records = history_table()
+    month = _month_column(records.c.meal_date)
+    query = db.session.query(
+        records.c.member_id, month, func.sum(records.c.meal_count)
+    )
+    if mess_id is not None:
+        query = query.filter(records.c.mess_id == mess_id)
+    rows = query.group_by(records.c.member_id, month).all()
+
+    totals = {}
+    for member_id, month_value, total in rows:
+        if isinstance(month_value, str):
+            month_value = date.fromisoformat(month_value)
+        totals[(member_id, month_value)] = int(total)
+    return totals
+
+
+def rebuild_rollups(mess_id=None):
+    """Recompute member_monthly_totals from meal_records.
+
+    Rebuilds every mess, or only ``mess_id``. Returns a list of
+    ``(member_id, month, stored, actual)`` for every row that had drifted
+    (missing rows are stored as ``None``). The caller owns the transaction
+    and must commit.
+    """
+    actual = compute_rollups(mess_id)
+    stored_rows = MemberMonthlyTotal.query
+    if mess_id is not None:
+        stored_rows = stored_rows.filter(MemberMonthlyTotal.mess_id == mess_id)
+    stored = {
+        (member_id, month): total
+        for member_id, month, total in stored_rows.with_entities(
+            MemberMonthlyTotal.member_id, MemberMonthlyTotal.month, MemberMonthlyTotal.total
+        )
+    }
+
+    # A missing row and a zero total read the same in reports, so only a
+    # difference in value counts as drift
+    drift = [
+        (key[0], key[1], stored.get(key), actual.get(key, 0))
+        for key in sorted(set(actual) | set(stored))
+        if stored.get(key, 0) != actual.get(key, 0)
+    ]
+
+    if drift:
+        stored_rows.delete()
+    if drift and actual:
+        now = datetime.utcnow()
+        # Each row belongs to its member's mess
+        mess_of = dict(db.session.query(Member.id, Member.mess_id))
+        db.session.execute(MemberMonthlyTotal.__table__.insert(), [
+            {'member_id': member_id, 'mess_id': mess_of[member_id], 'month': month,
+             'total': total, 'updated_at': now}
+            for (member_id, month), total in actual.items()
+        ])
+    return drift
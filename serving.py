@@ -0,0 +1,43 @@
+"""Keeping blocking work off the event loop under gunicorn's gevent worker.
+
+The gevent worker monkey-patches the standard library, so ``threading``
+threads become greenlets that take turns on one OS thread. CPU-bound work
+such as ReportLab layout never yields, and while it runs every other
+request in that worker waits. ``run_blocking`` and
+``thread_pool_executor`` move such work onto real OS threads from gevent's
+native thread pool. Without gevent they are a plain call and a plain
+``concurrent.futures.ThreadPoolExecutor``.
+"""
+import contextvars
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+
+def gevent_active():
+    """Whether this process has been monkey-patched by gevent."""
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('threading')
+
+
+def run_blocking(fn, *args, **kwargs):
+    """Call ``fn`` on a native thread under gevent, inline otherwise.
+
+    The caller's context (Flask app and request context, and with it the
+    request's database session) goes with the call. The calling greenlet
+    waits for the result while other greenlets keep running.
+    """
+    if not gevent_active():
+        return fn(*args, **kwargs)
+    import gevent
+    context = contextvars.copy_context()
+    return gevent.get_hub().threadpool.apply(context.run, (fn,) + args, kwargs)
+
+
+def thread_pool_executor(max_workers):
+    """A ThreadPoolExecutor whose workers are OS threads even under gevent."""
+    if gevent_active():
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers)
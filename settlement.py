@@ -0,0 +1,170 @@
+"""Settlement of a month's shared costs.
+
+The mess splits its expenses by meals eaten:
+
+    meal rate = total expenses / total meals
+    cost      = a member's meals x meal rate
+    balance   = the member's deposits - cost   (negative: the member owes)
+
+``settle`` computes every balance for a date range in one query. The meal
+totals (from the rollup for whole months), the deposit sums and the
+expense total are each aggregated in the database and joined onto the
+members. Nothing is queried per member.
+
+Settlements are cached per worker and keyed on the report data version.
+That version covers expenses and deposits as well as meal records (see
+``report_cache.report_version``), so any ledger edit yields a new key.
+Entries are stored as JSON in a ``ReportCache``.
+"""
+import json
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from models import db, Member, Expense, Deposit, current_mess_id
+from aggregates import meal_totals_subquery
+from report_cache import report_version
+
+CENT = Decimal('0.01')
+
+MemberBalance = namedtuple('MemberBalance', ['member_id', 'name', 'meals', 'cost', 'deposited', 'balance'])
+
+
+def _money(value):
+    return Decimal(value or 0).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class Settlement:
+    """Meal rate and per-member balances for ``start_date``..``end_date``."""
+
+    def __init__(self, start_date, end_date, total_expense, balances):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.total_expense = total_expense
+        # MemberBalance tuples ordered by name
+        self.balances = balances
+
+    @classmethod
+    def compute(cls, start_date, end_date, total_expense, member_rows):
+        """Settle ``(member_id, name, meals, deposited)`` rows against the expenses."""
+        total_expense = _money(total_expense)
+        total_meals = sum(meals for _, _, meals, _ in member_rows)
+        balances = []
+        for member_id, name, meals, deposited in member_rows:
+            # Each cost is rounded on its own from the exact rate
+            cost = _money(total_expense * meals / total_meals) if total_meals else _money(0)
+            deposited = _money(deposited)
+            balances.append(MemberBalance(member_id, name, meals, cost, deposited, deposited - cost))
+        return cls(start_date, end_date, total_expense, balances)
+
+    @property
+    def total_meals(self):
+        return sum(balance.meals for balance in self.balances)
+
+    @property
+    def total_deposited(self):
+        return sum((balance.deposited for balance in self.balances), Decimal('0.00'))
+
+    @property
+    def meal_rate(self):
+        """Cost of one meal, rounded to the cent; None without any meals."""
+        if not self.total_meals:
+            return None
+        return _money(self.total_expense / self.total_meals)
+
+    @property
+    def has_ledger(self):
+        """Whether any expense or deposit was recorded in the range."""
+        return bool(self.total_expense or self.total_deposited)
+
+    def meal_totals(self):
+        """``[(name, total), ...]`` as returned by ``aggregates.range_totals``."""
+        return [(balance.name, balance.meals) for balance in self.balances]
+
+    def to_dict(self):
+        """Plain JSON-ready form; amounts are strings so no cent is lost."""
+        meal_rate = self.meal_rate
+        return {
+            'start': self.start_date.isoformat(),
+            'end': self.end_date.isoformat(),
+            'total_expense': str(self.total_expense),
+            'total_meals': self.total_meals,
+            'meal_rate': None if meal_rate is None else str(meal_rate),
+            'total_deposited': str(self.total_deposited),
+            'balances': [{
+                'member_id': balance.member_id,
+                'name': balance.name,
+                'meals': balance.meals,
+                'cost': str(balance.cost),
+                'deposited': str(balance.deposited),
+                'balance': str(balance.balance),
+            } for balance in self.balances],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        balances = [
+            MemberBalance(row['member_id'], row['name'], row['meals'], Decimal(row['cost']),
+                          Decimal(row['deposited']), Decimal(row['balance']))
+            for row in data['balances']
+        ]
+        return cls(date.fromisoformat(data['start']), date.fromisoformat(data['end']),
+                   Decimal(data['total_expense']), balances)
+
+
+def settle(start_date, end_date):
+    """Compute the current mess's ``Settlement`` for ``start_date``..``end_date`` in one query."""
+    mess_id = current_mess_id()
+    meals = meal_totals_subquery(start_date, end_date)
+    deposits = select(
+        Deposit.member_id,
+        func.sum(Deposit.amount).label('total')
+    ).where(
+        Deposit.mess_id == mess_id,
+        Deposit.deposit_date >= start_date,
+        Deposit.deposit_date <= end_date
+    ).group_by(Deposit.member_id).subquery()
+    expenses = select(func.coalesce(func.sum(Expense.amount), 0)).where(
+        Expense.mess_id == mess_id,
+        Expense.expense_date >= start_date,
+        Expense.expense_date <= end_date
+    ).scalar_subquery()
+
+    rows = db.session.query(
+        Member.id,
+        Member.name,
+        func.coalesce(meals.c.total, 0),
+        func.coalesce(deposits.c.total, 0),
+        expenses
+    ).outerjoin(meals, meals.c.member_id == Member.id).outerjoin(
+        deposits, deposits.c.member_id == Member.id
+    ).filter(Member.mess_id == mess_id, Member.removed_at.is_(None)).order_by(Member.name).all()
+
+    if rows:
+        total_expense = rows[0][4]
+    else:
+        # No members to carry the expense total along
+        total_expense = db.session.query(expenses).scalar()
+    member_rows = [(member_id, name, int(meals), deposited) for member_id, name, meals, deposited, _ in rows]
+    return Settlement.compute(start_date, end_date, total_expense, member_rows)
+
+
+def settlement_for(start_date, end_date, version=None):
+    """The cached ``Settlement`` for the range, computed on a miss.
+
+    ``version`` is the range's ``ReportVersion`` when the caller already
+    read it (any variant); otherwise it is read here.
+    """
+    if version is None:
+        version = report_version(start_date, end_date)
+    key = version.with_variant('settlement').key
+    cache = current_app.extensions['settlement_cache']
+    data = cache.get(key)
+    if data is not None:
+        return Settlement.from_dict(json.loads(data))
+    settlement = settle(start_date, end_date)
+    cache.put(key, json.dumps(settlement.to_dict()).encode('utf-8'))
+    return settlement
@@ -0,0 +1,239 @@
+"""Several messes served by one deployment.
+
+Each mess (tenant) is a row in ``messes``. Members, meal records and their
+archive, the monthly rollup, expenses and deposits all carry a
+``mess_id``, and the indexes behind their range scans lead on it. A
+mess's pages and reports therefore read only that mess's rows, however
+many messes share the database.
+
+A request picks its mess from the URL. ``/m/<slug>/meals`` is served as
+``/meals`` for the mess with that slug. ``MessPrefixMiddleware`` moves the
+prefix into SCRIPT_NAME, so ``url_for`` keeps every link, redirect and
+static URL inside the mess without any route knowing about it. Requests
+without a prefix belong to the default mess (``DEFAULT_MESS_ID``), named by
+MESS_NAME, so a single-mess deployment keeps its URLs. Resolving that mess
+costs no query.
+
+The mess id is kept in ``g`` and read through ``models.current_mess_id``:
+queries filter on it, and it is the column default for new rows. Outside
+a request it is the default mess unless ``use_mess`` says otherwise.
+
+Each mess gets its own session cookie, signed with a salt of its own, so
+logging in to one mess's admin does not log in to another, and one mess's
+cookie is rejected by every other. The messes themselves are cached per worker
+and invalidated like the member roster (see member_cache.py).
+"""
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from flask import abort, current_app, g, has_app_context, request
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import URLSafeTimedSerializer
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from models import db, Mess, DEFAULT_MESS_ID
+from member_cache import FileStamp
+
+MessEntry = namedtuple('MessEntry', ['id', 'slug', 'name', 'admin_password_hash'])
+
+MESS_PREFIX = '/m/'
+
+# WSGI environ key for the slug taken off the path
+MESS_SLUG_KEY = 'meal.mess_slug'
+
+SLUG_PATTERN = re.compile(r'^[a-z0-9][a-z0-9-]{0,49}$')
+
+
+class MessPrefixMiddleware:
+    """Serve ``/m/<slug>/...`` as ``/...`` with the prefix moved to SCRIPT_NAME."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path.startswith(MESS_PREFIX):
+            slug, _, rest = path[len(MESS_PREFIX):].partition('/')
+            if slug:
+                environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + MESS_PREFIX + slug
+                environ['PATH_INFO'] = '/' + rest
+                environ[MESS_SLUG_KEY] = slug
+        return self.wsgi_app(environ, start_response)
+
+
+class MessSessionInterface(SecureCookieSessionInterface):
+    """Signed cookie sessions with one cookie, and one signing salt, per mess."""
+
+    def get_cookie_name(self, app):
+        name = super().get_cookie_name(app)
+        slug = request.environ.get(MESS_SLUG_KEY)
+        return f'{name}-{slug}' if slug else name
+
+    def get_signing_serializer(self, app):
+        slug = request.environ.get(MESS_SLUG_KEY)
+        if not slug or not app.secret_key:
+            # The default mess keeps Flask's salt, so existing sessions stay valid
+            return super().get_signing_serializer(app)
+        return URLSafeTimedSerializer(
+            app.secret_key,
+            salt=f'{self.salt}-{slug}',
+            serializer=self.serializer,
+            signer_kwargs={'key_derivation': self.key_derivation, 'digest_method': self.digest_method},
+        )
+
+
+class MessDirectory:
+    """Per-process cache of the messes, keyed by slug."""
+
+    def __init__(self, app=None):
+        self.stamp = None
+        self._by_slug = None
+        self._stamp_read = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MESS_NAME', 'Banasree Boys')
+        app.config.setdefault('MESS_CACHE_STAMP', os.path.join(app.instance_path, 'mess_cache.stamp'))
+        app.config.setdefault('MESS_CACHE_TTL', 300)
+        self.stamp = FileStamp(app.config['MESS_CACHE_STAMP'])
+        if not event.contains(Session, 'after_flush', _note_mess_changes):
+            event.listen(Session, 'after_flush', _note_mess_changes)
+            event.listen(Session, 'after_commit', _invalidate_after_commit)
+            event.listen(Session, 'after_rollback', _forget_mess_changes)
+        app.wsgi_app = MessPrefixMiddleware(app.wsgi_app)
+        app.session_interface = MessSessionInterface()
+        app.before_request(_resolve_mess)
+        app.context_processor(lambda: {'current_mess': current_mess()})
+        app.extensions['mess_directory'] = self
+
+    def default(self):
+        """The mess served without a URL prefix."""
+        return MessEntry(DEFAULT_MESS_ID, None, current_app.config['MESS_NAME'], None)
+
+    def by_slug(self, slug):
+        """The ``MessEntry`` for ``slug``, or None."""
+        stamp = self.stamp.read()
+        ttl = current_app.config['MESS_CACHE_TTL']
+        with self._lock:
+            if (self._by_slug is not None and stamp == self._stamp_read
+                    and time.monotonic() - self._loaded_at < ttl):
+                return self._by_slug.get(slug)
+
+        rows = db.session.query(Mess.id, Mess.slug, Mess.name, Mess.admin_password_hash).all()
+        by_slug = {row.slug: MessEntry(*row) for row in rows}
+        with self._lock:
+            self._by_slug = by_slug
+            self._stamp_read = stamp
+            self._loaded_at = time.monotonic()
+        return by_slug.get(slug)
+
+    def invalidate(self):
+        """Make every worker (this one included) reload on its next lookup."""
+        self.stamp.bump()
+        with self._lock:
+            self._by_slug = None
+
+
+def _current_directory():
+    if has_app_context():
+        return current_app.extensions.get('mess_directory')
+    return None
+
+
+def _note_mess_changes(session, flush_context):
+    if any(isinstance(obj, Mess) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['messes_changed'] = True
+
+
+def _invalidate_after_commit(session):
+    if session.info.pop('messes_changed', False):
+        directory = _current_directory()
+        if directory is not None:
+            directory.invalidate()
+
+
+def _forget_mess_changes(session):
+    session.info.pop('messes_changed', None)
+
+
+def _resolve_mess():
+    directory = current_app.extensions['mess_directory']
+    slug = request.environ.get(MESS_SLUG_KEY)
+    if slug is None:
+        mess = directory.default()
+    else:
+        mess = directory.by_slug(slug)
+        if mess is None:
+            abort(404, 'No such mess.')
+    g.mess = mess
+    g.mess_id = mess.id
+
+
+def current_mess():
+    """``MessEntry`` of the mess being served."""
+    mess = g.get('mess') if has_app_context() else None
+    return mess if mess is not None else current_app.extensions['mess_directory'].default()
+
+
+@contextmanager
+def use_mess(mess_id):
+    """Scope reads and writes to ``mess_id`` outside a request (CLI, jobs, benchmarks)."""
+    saved = g.get('mess_id')
+    g.mess_id = mess_id
+    try:
+        yield
+    finally:
+        if saved is None:
+            g.pop('mess_id', None)
+        else:
+            g.mess_id = saved
+
+
+def admin_password_matches(password):
+    """Check an admin login against the mess's password, or ADMIN_PASSWORD."""
+    password_hash = current_mess().admin_password_hash
+    if password_hash:
+        return check_password_hash(password_hash, password)
+    return password == current_app.config['ADMIN_PASSWORD']
+
+
+def mess_ids():
+    """Every mess id, the default mess included even before it has a row."""
+    return sorted({DEFAULT_MESS_ID, *(mess_id for (mess_id,) in db.session.query(Mess.id))})
+
+
+def create_mess(slug, name, admin_password=None):
+    """Add a mess; the caller commits. Raises ValueError for a bad or taken slug."""
+    if not SLUG_PATTERN.match(slug):
+        raise ValueError('Use lowercase letters, digits and dashes for the slug.')
+    if db.session.query(Mess.id).filter(Mess.slug == slug).first() is not None:
+        raise ValueError(f'A mess with slug "{slug}" already exists.')
+    mess = Mess(slug=slug, name=name,
+                admin_password_hash=generate_password_hash(admin_password) if admin_password else None)
+    db.session.add(mess)
+    db.session.flush()
+    return mess
+
+
+def ensure_default_mess(name, slug='default'):
+    """Create the default mess row, or keep its name in step with MESS_NAME."""
+    mess = db.session.get(Mess, DEFAULT_MESS_ID)
+    if mess is None:
+        # Insert without an explicit id so PostgreSQL's sequence moves past it
+        if db.session.query(Mess.id).first() is not None:
+            raise RuntimeError(f'messes has rows but no mess {DEFAULT_MESS_ID}')
+        mess = create_mess(slug, name)
+        if mess.id != DEFAULT_MESS_ID:
+            raise RuntimeError(f'The default mess was created as {mess.id}, not {DEFAULT_MESS_ID}')
+    elif mess.name != name:
+        mess.name = name
+    return mess
@@ -0,0 +1,91 @@
+import unittest
+import os
+import sys
+import random
+from datetime import date, timedelta
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import db, Member, MealRecord
+from app_testing import AppTestCase
+from aggregates import month_bounds, member_totals, grand_total
+
+def legacy_totals(start_date, end_date):
+    """The original export_pdf loop, kept as the reference implementation"""
+    members = Member.query.order_by(Member.name).all()
+    meal_records = MealRecord.query.filter(
+        MealRecord.meal_date >= start_date,
+        MealRecord.meal_date <= end_date
+    ).all()
+    totals = {}
+    for record in meal_records:
+        if record.member_id not in totals:
+            totals[record.member_id] = 0
+        totals[record.member_id] += record.meal_count
+    return [(member.name, totals.get(member.id, 0)) for member in members]
+
+class TestAggregates(AppTestCase):
+    """Unit tests for database-side meal totals"""
+
+    def setUp(self):
+        """Set up test database"""
+        db.create_all()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def test_month_bounds(self):
+        """Test first and last day of regular, February and December months"""
+        self.assertEqual(month_bounds(2024, 2), (date(2024, 2, 1), date(2024, 2, 29)))
+        self.assertEqual(month_bounds(2023, 12), (date(2023, 12, 1), date(2023, 12, 31)))
+        self.assertEqual(month_bounds(2024, 4), (date(2024, 4, 1), date(2024, 4, 30)))
+
+    def test_matches_legacy_loop(self):
+        """Test GROUP BY totals equal the original Python loop"""
+        rng = random.Random(42)
+        members = [Member(name=f'Member {i:02d}') for i in range(12)]
+        db.session.add_all(members)
+        db.session.commit()
+
+        # Three months of sparse history around the month under test
+        start = date(2024, 1, 1)
+        for offset in range(91):
+            day = start + timedelta(days=offset)
+            for member in members:
+                if rng.random() < 0.7:
+                    db.session.add(MealRecord(
+                        member_id=member.id,
+                        meal_date=day,
+                        meal_count=rng.randint(0, 4)
+                    ))
+        db.session.commit()
+
+        for month in (1, 2, 3):
+            start_date, end_date = month_bounds(2024, month)
+            self.assertEqual(member_totals(start_date, end_date),
+                             legacy_totals(start_date, end_date))
+
+    def test_members_without_meals_are_listed(self):
+        """Test the outer join keeps members with no records in range"""
+        eater = Member(name='Eater')
+        idle = Member(name='Idle')
+        db.session.add_all([eater, idle])
+        db.session.commit()
+        db.session.add(MealRecord(member_id=eater.id, meal_date=date(2024, 5, 3), meal_count=3))
+        # Outside the range, must not count
+        db.session.add(MealRecord(member_id=idle.id, meal_date=date(2024, 6, 1), meal_count=4))
+        db.session.commit()
+
+        totals = member_totals(*month_bounds(2024, 5))
+        self.assertEqual(totals, [('Eater', 3), ('Idle', 0)])
+        self.assertEqual(grand_total(totals), 3)
+
+    def test_no_members(self):
+        """Test an empty roster gives an empty report"""
+        self.assertEqual(member_totals(*month_bounds(2024, 5)), [])
+
+if __name__ == '__main__':
+    unittest.main()
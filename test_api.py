@@ -0,0 +1,128 @@
+import unittest
+import os
+import sys
+from datetime import date, timedelta
+from unittest import mock
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import db, Member, MealRecord
+from app_testing import AppTestCase
+import api as api_module
+
+class TestApi(AppTestCase):
+    """Tests for the JSON API"""
+
+    def setUp(self):
+        """Set up two members"""
+        db.create_all()
+        self.alice = Member(name='Alice')
+        self.bob = Member(name='Bob')
+        db.session.add_all([self.alice, self.bob])
+        db.session.commit()
+        self.today = date.today()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def post_counts(self, counts):
+        return self.client.post('/api/meals/today', json={'counts': counts})
+
+    def test_members(self):
+        response = self.client.get('/api/members')
+        self.assertEqual(response.json['members'], [
+            {'id': self.alice.id, 'name': 'Alice'}, {'id': self.bob.id, 'name': 'Bob'}
+        ])
+
+    def test_batch_write_saves_today(self):
+        response = self.post_counts({str(self.alice.id): 2, str(self.bob.id): 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['written'], 2)
+        counts = self.client.get('/api/meals/today').json['counts']
+        self.assertEqual(counts, {str(self.alice.id): 2, str(self.bob.id): 1})
+
+        # Unchanged counts are not written again
+        response = self.post_counts({str(self.alice.id): 2, str(self.bob.id): 3})
+        self.assertEqual((response.json['received'], response.json['written']), (2, 1))
+
+    def test_invalid_batch_writes_nothing(self):
+        response = self.post_counts({str(self.alice.id): 2, str(self.bob.id): 9, '999': 1, 'x': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json['errors']), 3)
+        self.assertEqual(MealRecord.query.count(), 0)
+
+    def test_malformed_body(self):
+        response = self.client.post('/api/meals/today', data='nope', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json)
+
+    def test_conditional_get(self):
+        self.post_counts({str(self.alice.id): 1})
+        first = self.client.get('/api/meals/today')
+        etag = first.headers['ETag']
+        cached = self.client.get('/api/meals/today', headers={'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.data, b'')
+
+        self.post_counts({str(self.alice.id): 2})
+        changed = self.client.get('/api/meals/today', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+
+    def test_not_modified_skips_reads(self):
+        """Test a matching If-None-Match is answered before the payload is read"""
+        self.post_counts({str(self.alice.id): 1})
+        paths = {
+            '/api/meals/today': 'load_day_counts',
+            '/api/totals': 'monthly_totals',
+            '/api/matrix': 'month_matrix',
+            '/api/settlement': 'settlement_for',
+        }
+        etags = {path: self.client.get(path).headers['ETag'] for path in paths}
+        self.assertEqual(len(set(etags.values())), len(paths))
+        for path, reader in paths.items():
+            with mock.patch.object(api_module, reader) as read:
+                response = self.client.get(path, headers={'If-None-Match': etags[path]})
+            self.assertEqual(response.status_code, 304)
+            read.assert_not_called()
+        member_path = f'/api/members/{self.alice.id}/meals'
+        etag = self.client.get(member_path).headers['ETag']
+        self.assertNotEqual(etag, self.client.get(f'/api/members/{self.bob.id}/meals').headers['ETag'])
+        self.assertEqual(self.client.get(member_path, headers={'If-None-Match': etag}).status_code, 304)
+
+    def test_member_counts_for_range(self):
+        yesterday = self.today - timedelta(days=1)
+        db.session.add_all([
+            MealRecord(member_id=self.alice.id, meal_date=yesterday, meal_count=2),
+            MealRecord(member_id=self.alice.id, meal_date=self.today, meal_count=1),
+            MealRecord(member_id=self.bob.id, meal_date=self.today, meal_count=3),
+        ])
+        db.session.commit()
+        response = self.client.get(f'/api/members/{self.alice.id}/meals?start={yesterday}&end={self.today}')
+        self.assertEqual(response.json['counts'], [
+            {'date': yesterday.isoformat(), 'meal_count': 2},
+            {'date': self.today.isoformat(), 'meal_count': 1},
+        ])
+        self.assertEqual(response.json['total'], 3)
+
+    def test_member_counts_errors(self):
+        self.assertEqual(self.client.get('/api/members/999/meals').status_code, 404)
+        bad = self.client.get(f'/api/members/{self.alice.id}/meals?start=yesterday')
+        self.assertEqual(bad.status_code, 400)
+        too_long = self.client.get(f'/api/members/{self.alice.id}/meals?start=2020-01-01&end=2022-01-01')
+        self.assertEqual(too_long.status_code, 400)
+
+    def test_monthly_totals(self):
+        self.post_counts({str(self.alice.id): 2, str(self.bob.id): 1})
+        response = self.client.get(f"/api/totals?month={self.today.strftime('%Y-%m')}")
+        self.assertEqual(response.json['totals'], [
+            {'member': 'Alice', 'total': 2}, {'member': 'Bob', 'total': 1}
+        ])
+        self.assertEqual(response.json['grand_total'], 3)
+        self.assertEqual(self.client.get('/api/totals?month=June').status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
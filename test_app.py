@@ -1,27 +1,24 @@
 import unittest
 import os
+import shutil
 import sys
+import tempfile
 from datetime import date, datetime, timedelta
 from flask import Flask
-from flask_testing import TestCase
 
 # Add the project directory to the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import app, db, Member, MealRecord
+from app import create_app, db, Member, MealRecord
+from app_testing import AppTestCase, isolated_config
 
-class TestMealManagement(TestCase):
+class TestMealManagement(AppTestCase):
     """Unit tests for Meal Management System"""
     
-    def create_app(self):
-        """Create Flask app for testing"""
-        app.config['TESTING'] = True
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-        app.config['SECRET_KEY'] = 'test-secret-key'
-        app.config['ADMIN_PASSWORD'] = 'test-admin'
-        app.config['WTF_CSRF_ENABLED'] = False
-        return app
+    app_config = {
+        'ADMIN_PASSWORD': 'test-admin',
+        'WTF_CSRF_ENABLED': False,
+    }
     
     def setUp(self):
         """Set up test database"""
@@ -291,5 +288,108 @@ class TestMealManagement(TestCase):
         self.assertIn(b'<option value="0"', response.data)
         self.assertIn(b'<option value="4"', response.data)
 
+class TestQueryCounts(AppTestCase):
+    """Upper bounds on SQL statements issued per request"""
+    
+    app_config = {
+        'ADMIN_PASSWORD': 'test-admin',
+    }
+    
+    def setUp(self):
+        """Set up ten members with a month of meal records"""
+        db.create_all()
+        members = [Member(name=f'Member {i}') for i in range(10)]
+        db.session.add_all(members)
+        db.session.commit()
+        
+        today = date.today()
+        for days_ago in range(30):
+            for member in members:
+                db.session.add(MealRecord(
+                    member_id=member.id,
+                    meal_date=today - timedelta(days=days_ago),
+                    meal_count=2
+                ))
+        db.session.commit()
+        self.member_ids = [m.id for m in members]
+        # Start each request from an empty identity map
+        db.session.expunge_all()
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+    
+    def count_queries(self, method, url, **kwargs):
+        """Issue a request and return (response, SQL statement count)"""
+        with self.app.extensions['query_stats'].count() as counter:
+            response = getattr(self.client, method)(url, **kwargs)
+        return response, counter.count
+    
+    def test_admin_history_query_count(self):
+        """Test admin history loads members with the records, not per row"""
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        
+        response, queries = self.count_queries('get', '/admin?days=30')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Member 9', response.data)
+        self.assertLessEqual(queries, 2)
+    
+    def test_meals_page_query_count(self):
+        """Test meals page issues a fixed number of queries"""
+        response, queries = self.count_queries('get', '/meals')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(queries, 2)
+    
+    def test_meals_save_query_count(self):
+        """Test saving meals does not query once per member"""
+        today_str = date.today().strftime('%Y-%m-%d')
+        data = {f'meal_count_{today_str}_{member_id}': '3' for member_id in self.member_ids}
+        
+        response, queries = self.count_queries('post', '/meals', data=data)
+        self.assertEqual(response.status_code, 302)
+        # Members, today's records, rollup upsert, meal upsert
+        self.assertLessEqual(queries, 4)
+    
+    def test_export_pdf_query_count(self):
+        """Test PDF export issues a fixed number of queries"""
+        response, queries = self.count_queries('get', '/export-pdf')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(queries, 2)
+    
+    def test_query_count_header(self):
+        """Test per-request query count header when enabled"""
+        self.app.config['QUERY_COUNT_HEADER'] = True
+        try:
+            response = self.client.get('/meals')
+        finally:
+            self.app.config['QUERY_COUNT_HEADER'] = False
+        self.assertEqual(response.headers['X-Query-Count'], '2')
+
+class TestAppFactory(unittest.TestCase):
+    """Startup must not touch the database or load ReportLab"""
+    
+    def test_create_app_uses_test_config(self):
+        """Test a factory app gets its own in-memory database, with no tables"""
+        from sqlalchemy import inspect
+        instance_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, instance_dir, True)
+        factory_app = create_app(isolated_config(instance_dir))
+        with factory_app.app_context():
+            self.assertEqual(db.engine.url.database, ':memory:')
+            self.assertEqual(inspect(db.engine).get_table_names(), [])
+            db.create_all()
+            self.assertEqual(factory_app.test_client().get('/meals').status_code, 200)
+            db.drop_all()
+    
+    def test_import_does_not_load_reportlab(self):
+        """Test ReportLab is only imported by the first PDF export"""
+        import subprocess
+        probe = 'import sys, app; print("reportlab" in sys.modules)'
+        output = subprocess.run([sys.executable, '-c', probe], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip().splitlines()[-1], 'False')
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models import db
+import db_pool
+from db_pool import engine_options, InstrumentedQueuePool, PoolMonitor, CHECKOUT_WAIT
+
+class TestEngineOptions(unittest.TestCase):
+    """Tests for engine options read from the environment"""
+
+    def test_defaults(self):
+        options = engine_options('postgresql://user@localhost/meals', {})
+        self.assertIs(options['poolclass'], InstrumentedQueuePool)
+        self.assertTrue(options['pool_pre_ping'])
+        self.assertEqual(options['pool_recycle'], 1800)
+        self.assertNotIn('pool_size', options)
+        self.assertEqual(options['connect_args'], {'application_name': 'meal-management'})
+
+    def test_environment_overrides(self):
+        options = engine_options('postgresql://user@localhost/meals', {
+            'DB_POOL_SIZE': '3',
+            'DB_MAX_OVERFLOW': '0',
+            'DB_POOL_TIMEOUT': '2.5',
+            'DB_POOL_RECYCLE': '300',
+            'DB_POOL_PRE_PING': 'false',
+            'DB_STATEMENT_TIMEOUT_MS': '15000',
+            'DB_CONNECT_TIMEOUT': '5',
+        })
+        self.assertEqual((options['pool_size'], options['max_overflow']), (3, 0))
+        self.assertEqual(options['pool_timeout'], 2.5)
+        self.assertEqual(options['pool_recycle'], 300)
+        self.assertFalse(options['pool_pre_ping'])
+        self.assertEqual(options['connect_args']['options'], '-c statement_timeout=15000')
+        self.assertEqual(options['connect_args']['connect_timeout'], 5)
+
+    def test_sqlite(self):
+        """Test in-memory SQLite is left alone and files get no connect_args"""
+        self.assertEqual(engine_options('sqlite:///:memory:', {'DB_POOL_SIZE': '3'}), {})
+        options = engine_options('sqlite:////tmp/meals.db', {'DB_POOL_SIZE': '3'})
+        self.assertEqual(options['pool_size'], 3)
+        self.assertNotIn('connect_args', options)
+
+class TestPoolLimits(unittest.TestCase):
+    """Concurrent requests against a two-connection pool"""
+
+    POOL_SIZE = 2
+    HOLD_SECONDS = 0.05
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.path}'
+        self.app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+            self.app.config['SQLALCHEMY_DATABASE_URI'],
+            {'DB_POOL_SIZE': str(self.POOL_SIZE), 'DB_MAX_OVERFLOW': '0', 'DB_POOL_TIMEOUT': '10'}
+        )
+        db.init_app(self.app)
+        self.monitor = PoolMonitor(db, self.app)
+
+        @self.app.route('/hold')
+        def hold():
+            # Keep the session's connection checked out for a while
+            db.session.execute(text('SELECT 1'))
+            time.sleep(self.HOLD_SECONDS)
+            return 'ok'
+
+    def tearDown(self):
+        for engine in self.monitor.engines().values():
+            engine.dispose()
+        os.remove(self.path)
+
+    def test_pool_limits_are_honoured(self):
+        """Test eight concurrent requests never use more than two connections"""
+        pool = self.monitor.pools()['default']
+        self.assertIsInstance(pool, QueuePool)
+        waits_before = CHECKOUT_WAIT.count('default')
+        statuses = []
+
+        def request():
+            statuses.append(self.app.test_client().get('/hold').status_code)
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(statuses, [200] * 8)
+        stats = self.monitor.stats()['default']
+        self.assertEqual(stats['meal_db_pool_checked_out_peak'], self.POOL_SIZE)
+        self.assertEqual(stats['meal_db_pool_checked_out'], 0)
+        self.assertEqual(stats['meal_db_pool_overflow'], 0)
+        self.assertEqual(CHECKOUT_WAIT.count('default') - waits_before, 8)
+        # Eight holds through two connections take at least four rounds
+        self.assertGreaterEqual(elapsed, 4 * self.HOLD_SECONDS)
+
+    def test_fork_hook_is_shared(self):
+        """Test new monitors join the module's fork hook instead of adding one each"""
+        with mock.patch.object(os, 'register_at_fork') as register:
+            PoolMonitor(db, self.app)
+        register.assert_not_called()
+        self.assertIn(self.monitor, db_pool._MONITORS)
+
+        pool = self.monitor.pools()['default']
+        with self.app.app_context():
+            db.session.execute(text('SELECT 1'))
+            db.session.remove()
+        self.assertEqual(pool.checkedin(), 1)
+        db_pool._after_fork_in_child()
+        self.assertEqual(self.monitor.pools()['default'].checkedin(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
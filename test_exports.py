@@ -0,0 +1,84 @@
+import unittest
+import os
+import sys
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import db, Member, MealRecord
+from app_testing import AppTestCase
+from exports import EXPORT_FIELDS, export_rows, csv_chunks, jsonl_chunks
+
+class TestExports(AppTestCase):
+    """Tests for streaming CSV and JSON-lines exports"""
+
+    def setUp(self):
+        """Set up two members with ten days of records each"""
+        db.create_all()
+        self.alice = Member(name='Alice')
+        self.bob = Member(name='Bob, Jr.')
+        db.session.add_all([self.alice, self.bob])
+        db.session.commit()
+        self.start = date(2024, 1, 1)
+        for offset in range(10):
+            for member in (self.alice, self.bob):
+                db.session.add(MealRecord(member_id=member.id,
+                                          meal_date=self.start + timedelta(days=offset),
+                                          meal_count=offset % 4))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def test_export_rows_filters(self):
+        """Test date range and member filters"""
+        self.assertEqual(len(list(export_rows())), 20)
+        rows = list(export_rows(date(2024, 1, 3), date(2024, 1, 4)))
+        self.assertEqual(len(rows), 4)
+        rows = list(export_rows(member_id=self.bob.id))
+        self.assertEqual({row[2] for row in rows}, {'Bob, Jr.'})
+
+    def test_export_rows_ordered_by_date_then_member(self):
+        rows = list(export_rows(batch_size=3))
+        keys = [(row[3], row[1]) for row in rows]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_chunks_are_batched(self):
+        """Test serialisers emit one chunk per batch"""
+        rows = list(export_rows())
+        self.assertEqual(len(list(csv_chunks(iter(rows), batch_size=7))), 3)
+        self.assertEqual(len(list(jsonl_chunks(iter(rows), batch_size=7))), 3)
+
+    def test_csv_endpoint(self):
+        """Test /export.csv streams parseable CSV"""
+        response = self.client.get('/export.csv?start=2024-01-01&end=2024-01-05')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertIn('meal_records.csv', response.headers['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual(tuple(rows[0]), EXPORT_FIELDS)
+        self.assertEqual(len(rows), 11)
+        self.assertIn('Bob, Jr.', [row[2] for row in rows])
+
+    def test_jsonl_endpoint(self):
+        """Test /export.jsonl streams one JSON object per line"""
+        response = self.client.get(f'/export.jsonl?member_id={self.alice.id}')
+        self.assertEqual(response.status_code, 200)
+        records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(len(records), 10)
+        self.assertEqual(records[0]['member_name'], 'Alice')
+        self.assertEqual(records[0]['meal_date'], '2024-01-01')
+
+    def test_bad_filters(self):
+        """Test malformed filters return 400"""
+        self.assertEqual(self.client.get('/export.csv?start=yesterday').status_code, 400)
+        self.assertEqual(self.client.get('/export.jsonl?member_id=abc').status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
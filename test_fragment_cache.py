@@ -0,0 +1,114 @@
+import unittest
+import os
+import sys
+import re
+import time
+from datetime import date, timedelta
+from unittest import mock
+from jinja2 import Template
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import db, Member, MealRecord
+from app_testing import AppTestCase
+from fragment_cache import FragmentCache, record_block_key
+
+class TestFragmentCache(AppTestCase):
+    """Tests for the cached admin history blocks"""
+
+    def setUp(self):
+        """Set up two members with records for today and the two days before"""
+        db.create_all()
+        self.alice = Member(name='Alice')
+        self.bob = Member(name='Bob')
+        db.session.add_all([self.alice, self.bob])
+        db.session.flush()
+        self.today = date.today()
+        for days_ago in range(3):
+            meal_date = self.today - timedelta(days=days_ago)
+            db.session.add(MealRecord(member_id=self.alice.id, meal_date=meal_date, meal_count=1))
+            db.session.add(MealRecord(member_id=self.bob.id, meal_date=meal_date, meal_count=2))
+        db.session.commit()
+        self.cache = self.app.extensions['fragment_cache']
+        self.cache.clear()
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def test_warm_view_reuses_past_days(self):
+        cold = self.client.get('/admin').data
+        hits, misses = self.cache.hits, self.cache.misses
+        self.assertEqual(len(self.cache), 2)
+        warm = self.client.get('/admin').data
+        self.assertEqual(warm, cold)
+        self.assertEqual((self.cache.hits, self.cache.misses), (hits + 2, misses))
+
+    def test_today_is_always_rendered(self):
+        self.client.get('/admin')
+        record = MealRecord.query.filter_by(member_id=self.alice.id, meal_date=self.today).first()
+        record.meal_count = 3
+        db.session.commit()
+        self.assertIn(b'Meals: 3', self.client.get('/admin').data)
+        self.assertIsNone(record_block_key(self.today, [record]))
+
+    def test_edit_rerenders_that_day_only(self):
+        self.client.get('/admin')
+        yesterday = self.today - timedelta(days=1)
+        record = MealRecord.query.filter_by(member_id=self.bob.id, meal_date=yesterday).first()
+        hits, misses = self.cache.hits, self.cache.misses
+        self.client.post('/admin', data={
+            'update_meal': '1', 'record_id': str(record.id), 'member_id': str(self.bob.id),
+            'meal_date': yesterday.isoformat(), 'meal_count': '4'
+        })
+        response = self.client.get('/admin')
+        self.assertIn(b'Meals: 4', response.data)
+        self.assertEqual((self.cache.hits, self.cache.misses), (hits + 1, misses + 1))
+
+    def test_member_removal_changes_blocks(self):
+        self.client.get('/admin')
+        self.client.post('/admin', data={'remove_member': '1', 'member_id': str(self.bob.id)})
+        response = self.client.get('/admin')
+        self.assertNotIn(b'<span class="record-member">Bob</span>', response.data)
+
+    def test_block_renders_count_as_template_time(self):
+        """Test the blocks' render time reaches the template histogram"""
+        render = Template.render
+
+        def slow_blocks(template, *args, **kwargs):
+            if template.name == '_record_date_group.html':
+                time.sleep(0.05)
+            return render(template, *args, **kwargs)
+
+        with mock.patch.object(Template, 'render', autospec=True, side_effect=slow_blocks):
+            self.client.get('/admin')
+        text = self.client.get('/metrics').get_data(as_text=True)
+        total = float(re.search(r'meal_http_request_template_seconds_sum\{route="/admin"\} (\S+)', text).group(1))
+        self.assertGreaterEqual(total, 3 * 0.05)
+
+    def test_byte_limit_evicts_oldest(self):
+        cache = FragmentCache(max_bytes=10)
+        cache.render('a', lambda: '12345')
+        cache.render('b', lambda: '67890')
+        cache.render('c', lambda: 'abcde')
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.size, 10)
+        self.assertEqual(cache.render('a', lambda: 'fresh'), 'fresh')
+
+    def test_fragment_is_markup(self):
+        cache = FragmentCache(max_bytes=1024)
+        cache.render('k', lambda: '<b>ü</b>')
+        self.assertEqual(cache.render('k', lambda: 'unused').__html__(), '<b>ü</b>')
+
+    def test_gauges_exposed(self):
+        self.client.get('/admin')
+        text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('meal_fragment_cache_lookups{result="miss"}', text)
+        self.assertIn('meal_fragment_cache_bytes', text)
+
+if __name__ == '__main__':
+    unittest.main()
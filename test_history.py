@@ -0,0 +1,151 @@
+import unittest
+import io
+import os
+import sys
+from datetime import date, timedelta
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import db, Member, MealRecord
+from app_testing import AppTestCase
+from models import MealRecordArchive
+from aggregates import member_totals, daily_counts, rollup_totals
+from exports import export_rows
+from history import HistoryTiers, archive_closed_months, archive_cutoff, history_table
+from importer import PARSERS, import_records
+from meal_store import load_day_counts, save_meal_counts, fetch_history_rows
+from member_cache import FileStamp
+from member_removal import mark_removed, purge_member
+from report_cache import report_version
+from rollups import rebuild_rollups
+
+class TestHistoryTiers(AppTestCase):
+    """Tests for archiving closed months out of meal_records"""
+
+    def setUp(self):
+        """Set up two members with 150 days of records"""
+        db.create_all()
+        self.alice = Member(name='Alice')
+        self.bob = Member(name='Bob')
+        db.session.add_all([self.alice, self.bob])
+        db.session.flush()
+        self.today = date.today()
+        self.start = self.today - timedelta(days=149)
+        for days_ago in range(150):
+            meal_date = self.today - timedelta(days=days_ago)
+            db.session.add(MealRecord(member_id=self.alice.id, meal_date=meal_date, meal_count=days_ago % 3))
+            db.session.add(MealRecord(member_id=self.bob.id, meal_date=meal_date, meal_count=1))
+        rebuild_rollups()
+        db.session.commit()
+        # First day of the previous month: the hot window with two kept months
+        self.hot_from = (self.today.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def reads(self):
+        month_start = self.start.replace(day=1)
+        return (
+            member_totals(self.start, self.today),
+            list(daily_counts(self.start, self.today)),
+            rollup_totals(month_start, self.today.replace(day=1)),
+            [row[1:5] for row in export_rows()],
+            report_version(self.start, self.today).key,
+            load_day_counts(self.start),
+        )
+
+    def test_rollover_moves_closed_months(self):
+        moved = archive_closed_months(keep_months=2)
+        archived_rows = sum(rows for _, rows in moved)
+        self.assertEqual(archived_rows, MealRecordArchive.query.count())
+        self.assertEqual(MealRecord.query.count() + archived_rows, 300)
+        self.assertEqual(db.session.query(db.func.min(MealRecord.meal_date)).scalar(), self.hot_from)
+        self.assertEqual(archive_cutoff(), self.hot_from - timedelta(days=1))
+        # Nothing left to move
+        self.assertEqual(archive_closed_months(keep_months=2), [])
+
+    def test_reads_are_unchanged_by_rollover(self):
+        before = self.reads()
+        archive_closed_months(keep_months=2)
+        self.assertEqual(self.reads(), before)
+        self.assertEqual(rebuild_rollups(), [])
+
+    def test_hot_ranges_skip_the_archive(self):
+        archive_closed_months(keep_months=2)
+        self.assertIs(history_table(self.hot_from, self.today), MealRecord.__table__)
+        self.assertIsNot(history_table(self.start, self.today), MealRecord.__table__)
+
+    def test_writes_to_archived_days(self):
+        archive_closed_months(keep_months=2)
+        old_day = self.start + timedelta(days=1)
+        save_meal_counts({(self.bob.id, old_day): 4})
+        db.session.commit()
+        self.assertEqual(MealRecord.query.filter_by(meal_date=old_day).count(), 0)
+        self.assertEqual(db.session.get(MealRecordArchive, (self.bob.id, old_day)).meal_count, 4)
+        self.assertEqual(rebuild_rollups(), [])
+
+        summary = import_records(PARSERS['csv'](io.BytesIO(
+            f'member_name,meal_date,meal_count\nAlice,{old_day},4\n'.encode('utf-8'))))
+        self.assertEqual(summary.updated, 1)
+        self.assertEqual(load_day_counts(old_day), {self.alice.id: 4, self.bob.id: 4})
+
+    def test_admin_edits_archived_record(self):
+        old_day = self.start + timedelta(days=2)
+        record_id = MealRecord.query.filter_by(member_id=self.bob.id, meal_date=old_day).first().id
+        archive_closed_months(keep_months=2)
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        self.client.post('/admin', data={
+            'update_meal': '1', 'record_id': str(record_id), 'member_id': str(self.bob.id),
+            'meal_date': old_day.isoformat(), 'meal_count': '3'
+        })
+        self.assertEqual(db.session.get(MealRecordArchive, (self.bob.id, old_day)).meal_count, 3)
+
+    def test_admin_history_reads_archive(self):
+        archive_closed_months(keep_months=2)
+        rows, _ = fetch_history_rows(self.start, self.start, 10)
+        self.assertEqual([row.member_name for row in rows], ['Alice', 'Bob'])
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        response = self.client.get('/admin?days=149&cursor=')
+        self.assertEqual(response.status_code, 200)
+
+    def test_rerun_folds_late_writes(self):
+        archive_closed_months(keep_months=2)
+        old_day = self.start + timedelta(days=3)
+        # A write that raced the rollover and landed in the hot table
+        db.session.execute(MealRecord.__table__.insert(), [
+            {'member_id': self.alice.id, 'meal_date': old_day, 'meal_count': 4}
+        ])
+        db.session.commit()
+        self.assertEqual(archive_closed_months(keep_months=2), [(old_day.replace(day=1), 1)])
+        self.assertEqual(db.session.get(MealRecordArchive, (self.alice.id, old_day)).meal_count, 4)
+
+    def test_purge_removes_archived_records(self):
+        archive_closed_months(keep_months=2)
+        mark_removed(self.bob)
+        db.session.commit()
+        self.assertEqual(purge_member(self.bob.id, batch_size=40), 150)
+        self.assertEqual(MealRecordArchive.query.filter_by(member_id=self.bob.id).count(), 0)
+
+    def test_other_worker_sees_new_cutoff(self):
+        other = HistoryTiers()
+        other.stamp = FileStamp(self.app.config['HISTORY_STAMP'])
+        other.remember(None, other.stamp.read())
+        archive_closed_months(keep_months=2)
+        self.assertEqual(other.cutoff(), self.hot_from - timedelta(days=1))
+
+    def test_keep_months_must_include_current(self):
+        with self.assertRaises(ValueError):
+            archive_closed_months(keep_months=0)
+
+    def test_cli(self):
+        result = self.app.test_cli_runner().invoke(args=['archive-history', '--keep-months', '2'])
+        self.assertIn('Archived', result.output)
+        self.assertGreater(MealRecordArchive.query.count(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
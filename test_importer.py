@@ -0,0 +1,168 @@
+import unittest
+import os
+import sys
+import io
+import json
+from datetime import date
+from unittest import mock
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import db, Member, MealRecord
+from app_testing import AppTestCase
+from models import MemberMonthlyTotal
+import meal_store
+from meal_store import load_records, save_meal_counts
+from importer import parse_csv, parse_jsonl, import_records
+
+class TestImporter(AppTestCase):
+    """Tests for bulk CSV / JSON-lines imports"""
+
+    def setUp(self):
+        """Set up two members, one with an existing record"""
+        db.create_all()
+        self.alice = Member(name='Alice')
+        self.bob = Member(name='Bob, Jr.')
+        db.session.add_all([self.alice, self.bob])
+        db.session.commit()
+        db.session.add(MealRecord(member_id=self.alice.id, meal_date=date(2024, 1, 1), meal_count=1))
+        db.session.add(MemberMonthlyTotal(member_id=self.alice.id, month=date(2024, 1, 1), total=1))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def _csv(self, text):
+        return parse_csv(io.BytesIO(text.encode('utf-8')))
+
+    def _count(self, member, meal_date):
+        record = MealRecord.query.filter_by(member_id=member.id, meal_date=meal_date).first()
+        return record.meal_count if record else None
+
+    def _rollup(self, member):
+        row = MemberMonthlyTotal.query.filter_by(member_id=member.id, month=date(2024, 1, 1)).first()
+        return row.total if row else None
+
+    def test_csv_import_summary(self):
+        """Test inserts, updates, unchanged rows and rejections are counted"""
+        summary = import_records(self._csv(
+            'member_name,meal_date,meal_count\n'
+            'Alice,2024-01-01,3\n'
+            'Alice,2024-01-02,2\n'
+            '"Bob, Jr.",2024-01-01,4\n'
+            'Alice,2024-01-01,3\n'
+            'Carol,2024-01-01,1\n'
+            'Alice,01/03/2024,1\n'
+            'Alice,2024-01-03,9\n'
+        ))
+        self.assertEqual(summary.inserted, 2)
+        self.assertEqual(summary.updated, 1)
+        self.assertEqual(summary.unchanged, 0)
+        self.assertEqual(summary.rejected, 3)
+        self.assertEqual(summary.duplicates, 1)
+        self.assertEqual(summary.collisions, [{'line': 5, 'replaces_line': 2}])
+        self.assertEqual([error['line'] for error in summary.errors], [6, 7, 8])
+        self.assertIn('unknown member', summary.errors[0]['error'])
+
+        self.assertEqual(self._count(self.alice, date(2024, 1, 1)), 3)
+        self.assertEqual(self._count(self.bob, date(2024, 1, 1)), 4)
+        self.assertEqual(self._rollup(self.alice), 5)
+        self.assertEqual(self._rollup(self.bob), 4)
+
+    def test_reimport_is_unchanged(self):
+        """Test importing the same rows twice writes nothing the second time"""
+        text = 'member_name,meal_date,meal_count\nAlice,2024-01-05,2\nAlice,2024-01-06,2\n'
+        import_records(self._csv(text))
+        summary = import_records(self._csv(text))
+        self.assertEqual((summary.inserted, summary.updated, summary.unchanged), (0, 0, 2))
+        self.assertEqual(self._rollup(self.alice), 5)
+
+    def test_duplicate_replaces_earlier_row(self):
+        """Test the last row for a member and date wins and the rollup counts it once"""
+        summary = import_records(self._csv(
+            'member_name,meal_date,meal_count\n'
+            'Alice,2024-01-01,3\n'
+            'Alice,2024-01-01,1\n'
+            'Alice,2024-01-01,4\n'
+        ))
+        self.assertEqual((summary.updated, summary.unchanged, summary.duplicates), (1, 0, 2))
+        self.assertEqual(self._count(self.alice, date(2024, 1, 1)), 4)
+        self.assertEqual(self._rollup(self.alice), 4)
+
+    def test_rollup_follows_concurrent_write(self):
+        """Test deltas come from the record the upsert replaced, not an earlier read"""
+        stale = load_records([(self.alice.id, date(2024, 1, 1))])
+        save_meal_counts({(self.alice.id, date(2024, 1, 1)): 2})
+        db.session.commit()
+        reads = iter([stale])
+        with mock.patch.object(meal_store, 'load_records',
+                               side_effect=lambda keys: next(reads, None) or load_records(keys)):
+            summary = import_records(self._csv('member_name,meal_date,meal_count\nAlice,2024-01-01,4\n'))
+        self.assertEqual(summary.updated, 1)
+        self.assertEqual(self._rollup(self.alice), 4)
+
+    def test_chunks_commit_separately(self):
+        """Test small chunks give the same result as one"""
+        lines = ''.join(f'Bob, Jr.,2024-01-{day:02d},1\n'.replace('Bob, Jr.', '"Bob, Jr."')
+                        for day in range(1, 21))
+        summary = import_records(self._csv('member_name,meal_date,meal_count\n' + lines), chunk_size=6)
+        self.assertEqual(summary.inserted, 20)
+        self.assertEqual(self._rollup(self.bob), 20)
+
+    def test_jsonl_import(self):
+        """Test JSON lines, including malformed lines"""
+        text = '\n'.join([
+            json.dumps({'member_name': 'Bob, Jr.', 'meal_date': '2024-01-02', 'meal_count': 2}),
+            '{not json',
+            '',
+            json.dumps({'member_name': 'Alice', 'meal_date': '2024-01-02'}),
+        ])
+        summary = import_records(parse_jsonl(io.BytesIO(text.encode('utf-8'))))
+        self.assertEqual(summary.inserted, 1)
+        self.assertEqual(summary.rejected, 2)
+        self.assertEqual([error['line'] for error in summary.errors], [2, 4])
+
+    def test_export_round_trip(self):
+        """Test an /export.csv download can be imported back"""
+        exported = self.client.get('/export.csv').get_data()
+        summary = import_records(parse_csv(io.BytesIO(exported)))
+        self.assertEqual((summary.unchanged, summary.rejected), (1, 0))
+
+    def test_endpoint_requires_admin(self):
+        data = {'file': (io.BytesIO(b'member_name,meal_date,meal_count\n'), 'meals.csv')}
+        response = self.client.post('/admin/import', data=data, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 403)
+
+    def test_endpoint_json_summary(self):
+        """Test the upload endpoint returns a JSON summary to API clients"""
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        body = b'member_name,meal_date,meal_count\nAlice,2024-02-01,2\nNobody,2024-02-01,2\n'
+        response = self.client.post('/admin/import', content_type='multipart/form-data',
+                                    data={'file': (io.BytesIO(body), 'meals.csv')},
+                                    headers={'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['inserted'], 1)
+        self.assertEqual(response.json['rejected'], 1)
+
+        response = self.client.post('/admin/import', content_type='multipart/form-data',
+                                    data={'file': (io.BytesIO(body), 'meals.xlsx')},
+                                    headers={'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_endpoint_form_redirects(self):
+        """Test the admin form gets a flash message and a redirect"""
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        body = b'{"member_name": "Alice", "meal_date": "2024-02-01", "meal_count": 2}\n'
+        response = self.client.post('/admin/import', content_type='multipart/form-data',
+                                    data={'file': (io.BytesIO(body), 'meals.jsonl')},
+                                    follow_redirects=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Import finished: 1 inserted', response.data)
+
+if __name__ == '__main__':
+    unittest.main()
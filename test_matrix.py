@@ -0,0 +1,91 @@
+import unittest
+import os
+import sys
+from datetime import date
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import db, Member, MealRecord
+from app_testing import AppTestCase
+from history import archive_closed_months
+from member_cache import MemberEntry
+from member_removal import mark_removed
+from matrix import month_matrix
+
+class TestMonthMatrix(AppTestCase):
+    """Tests for the members x days monthly grid"""
+
+    def setUp(self):
+        """Set up two members with records in February 2024 and one day of March"""
+        db.create_all()
+        self.alice = Member(name='Alice')
+        self.bob = Member(name='Bob')
+        db.session.add_all([self.alice, self.bob])
+        db.session.flush()
+        self.month = date(2024, 2, 1)
+        db.session.add_all([
+            MealRecord(member_id=self.alice.id, meal_date=date(2024, 2, 1), meal_count=2),
+            MealRecord(member_id=self.alice.id, meal_date=date(2024, 2, 29), meal_count=3),
+            MealRecord(member_id=self.bob.id, meal_date=date(2024, 2, 1), meal_count=1),
+            MealRecord(member_id=self.bob.id, meal_date=date(2024, 3, 1), meal_count=4),
+        ])
+        db.session.commit()
+        self.members = [MemberEntry(self.alice.id, 'Alice', None), MemberEntry(self.bob.id, 'Bob', None)]
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def test_grid_and_totals(self):
+        matrix = month_matrix(self.month, self.members)
+        self.assertEqual(matrix.days, 29)
+        rows = list(matrix.rows())
+        self.assertEqual([member.name for member, _, _ in rows], ['Alice', 'Bob'])
+        self.assertEqual(rows[0][1], [2] + [0] * 27 + [3])
+        self.assertEqual(rows[1][1], [1] + [0] * 28)
+        self.assertEqual(matrix.row_totals, [5, 1])
+        self.assertEqual(matrix.column_totals, [3] + [0] * 27 + [3])
+        self.assertEqual(matrix.total, 6)
+
+    def test_members_without_records_and_unknown_members(self):
+        carol = Member(name='Carol')
+        db.session.add(carol)
+        db.session.commit()
+        # Bob's records are skipped when he is not in the list
+        matrix = month_matrix(self.month, [self.members[0], MemberEntry(carol.id, 'Carol', None)])
+        self.assertEqual(matrix.row_totals, [5, 0])
+        self.assertEqual(matrix.total, 5)
+
+    def test_archived_month(self):
+        before = list(month_matrix(self.month, self.members).rows())
+        archive_closed_months(keep_months=1)
+        self.assertEqual(MealRecord.query.count(), 0)
+        self.assertEqual(list(month_matrix(self.month, self.members).rows()), before)
+
+    def test_admin_view(self):
+        self.assertEqual(self.client.get('/admin/matrix').status_code, 302)
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        response = self.client.get('/admin/matrix?month=2024-02')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'February 2024', response.data)
+        self.assertIn(b'<td class="matrix-total">5</td>', response.data)
+        self.assertIn(b'month=2024-03', response.data)
+        self.assertEqual(self.client.get('/admin/matrix?month=Feb').status_code, 400)
+
+    def test_api(self):
+        mark_removed(self.bob)
+        db.session.commit()
+        response = self.client.get('/api/matrix?month=2024-02')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['days'], 29)
+        self.assertEqual([member['name'] for member in response.json['members']], ['Alice'])
+        self.assertEqual(response.json['members'][0]['total'], 5)
+        self.assertEqual(response.json['day_totals'][0], 2)
+        self.assertEqual(response.json['total'], 5)
+        self.assertEqual(self.client.get('/api/matrix?month=Feb').status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
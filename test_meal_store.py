@@ -0,0 +1,360 @@
+import unittest
+import os
+import re
+import sys
+import shutil
+import tempfile
+import threading
+from datetime import date, timedelta
+from unittest import mock
+from sqlalchemy import event, inspect, text
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import meal_store
+from app import create_app, db, Member, MealRecord
+from app_testing import AppTestCase, isolated_config
+from create_tables import add_missing_columns
+from meal_store import (load_day_counts, save_day_counts, save_day_edits, save_meal_counts,
+                        load_day_records, load_records, fetch_history_rows, decode_history_cursor, ROWS_WRITTEN)
+from models import MemberMonthlyTotal
+
+class TestMealStore(AppTestCase):
+    """Unit tests for batched meal record writes"""
+
+    def setUp(self):
+        """Set up test database with a few members"""
+        db.create_all()
+        self.members = [Member(name=f'Member {i}') for i in range(5)]
+        db.session.add_all(self.members)
+        db.session.commit()
+        self.today = date.today()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def count_statements(self, func, *args):
+        """Run func and return (result, number of SQL statements executed)"""
+        statements = []
+        engine = db.engine
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            result = func(*args)
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        return result, len(statements)
+
+    def test_save_meal_counts_inserts_new_rows(self):
+        """Test records that do not exist yet are created"""
+        written = save_meal_counts({(m.id, self.today): 2 for m in self.members})
+        db.session.commit()
+
+        self.assertEqual(written, 5)
+        self.assertEqual(MealRecord.query.count(), 5)
+        self.assertEqual(set(load_day_counts(self.today).values()), {2})
+
+    def test_save_meal_counts_updates_existing_rows(self):
+        """Test an existing record is updated in place on the unique_member_date constraint"""
+        member = self.members[0]
+        save_meal_counts({(member.id, self.today): 1})
+        db.session.commit()
+
+        save_meal_counts({(member.id, self.today): 4})
+        db.session.commit()
+
+        records = MealRecord.query.filter_by(member_id=member.id).all()
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].meal_count, 4)
+        self.assertEqual(MemberMonthlyTotal.query.filter_by(member_id=member.id).one().total, 4)
+
+    def test_save_day_counts_writes_only_changes(self):
+        """Test unchanged counts are not rewritten"""
+        counts = {m.id: 1 for m in self.members}
+        self.assertEqual(save_day_counts(self.today, counts), 5)
+        db.session.commit()
+
+        counts[self.members[2].id] = 3
+        self.assertEqual(save_day_counts(self.today, counts), 1)
+        db.session.commit()
+
+        self.assertEqual(save_day_counts(self.today, counts), 0)
+        self.assertEqual(load_day_counts(self.today)[self.members[2].id], 3)
+
+    def test_save_day_counts_leaves_other_days_alone(self):
+        """Test saving today does not touch yesterday's records"""
+        yesterday = self.today - timedelta(days=1)
+        member = self.members[0]
+        db.session.add(MealRecord(member_id=member.id, meal_date=yesterday, meal_count=2))
+        db.session.commit()
+
+        save_day_counts(self.today, {member.id: 4})
+        db.session.commit()
+
+        self.assertEqual(load_day_counts(yesterday), {member.id: 2})
+        self.assertEqual(load_day_counts(self.today), {member.id: 4})
+
+    def test_save_uses_constant_number_of_statements(self):
+        """Test one SELECT plus rollup and record upserts regardless of member count"""
+        counts = {m.id: 2 for m in self.members}
+        written, statements = self.count_statements(save_day_counts, self.today, counts)
+        db.session.commit()
+
+        self.assertEqual(written, 5)
+        self.assertEqual(statements, 3)
+
+    def test_meals_post_saves_all_members(self):
+        """Test the /meals form goes through the bulk path"""
+        today_str = self.today.strftime('%Y-%m-%d')
+        data = {f'meal_count_{today_str}_{m.id}': str(i % 5) for i, m in enumerate(self.members)}
+
+        response = self.client.post('/meals', data=data)
+        self.assertEqual(response.status_code, 302)
+
+        saved = load_day_counts(self.today)
+        self.assertEqual(saved, {m.id: i % 5 for i, m in enumerate(self.members)})
+
+    def add_history(self, days):
+        """Add one record per member per day for the last ``days`` days"""
+        for days_ago in range(days):
+            for member in self.members:
+                db.session.add(MealRecord(
+                    member_id=member.id,
+                    meal_date=self.today - timedelta(days=days_ago),
+                    meal_count=1
+                ))
+        db.session.commit()
+
+    def test_history_pages_cover_range_in_order(self):
+        """Test keyset pages are disjoint, ordered and cover every record"""
+        self.add_history(10)
+        start = self.today - timedelta(days=30)
+
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            records, cursor = fetch_history_rows(start, self.today, 7, cursor)
+            self.assertLessEqual(len(records), 7)
+            seen.extend((r.meal_date, r.member_name) for r in records)
+            pages += 1
+            if cursor is None:
+                break
+
+        self.assertEqual(pages, 8)
+        self.assertEqual(len(seen), 50)
+        self.assertEqual(len(set(seen)), 50)
+        expected = sorted(seen, key=lambda key: (-key[0].toordinal(), key[1]))
+        self.assertEqual(seen, expected)
+
+    def test_history_page_respects_date_range(self):
+        """Test records outside the window are not returned"""
+        self.add_history(10)
+        start = self.today - timedelta(days=2)
+        records, cursor = fetch_history_rows(start, self.today, 100)
+        self.assertIsNone(cursor)
+        self.assertEqual(len(records), 15)
+
+    def test_bad_history_cursor_starts_from_newest(self):
+        """Test a malformed cursor is ignored"""
+        self.assertIsNone(decode_history_cursor('not-a-cursor!'))
+        self.add_history(1)
+        records, _ = fetch_history_rows(self.today, self.today, 100, 'not-a-cursor!')
+        self.assertEqual(len(records), 5)
+
+    def test_history_index_exists(self):
+        """Test the composite index backing history pages is created"""
+        indexes = inspect(db.engine).get_indexes('meal_records')
+        columns = {index['name']: index['column_names'] for index in indexes}
+        self.assertEqual(columns.get('ix_meal_records_mess_date_member'), ['mess_id', 'meal_date', 'member_id'])
+
+    def test_admin_history_is_paginated(self):
+        """Test admin only renders one page and links to the next"""
+        self.add_history(10)
+        self.app.config['ADMIN_PAGE_SIZE'] = 5
+        try:
+            with self.client.session_transaction() as sess:
+                sess['admin_logged_in'] = True
+            response = self.client.get('/admin?days=100000')
+        finally:
+            self.app.config['ADMIN_PAGE_SIZE'] = 100
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data.count(b'class="record-item"'), 5)
+        self.assertIn(b'Older Records', response.data)
+
+class TestVersionedSaves(AppTestCase):
+    """Coalescing and optimistic concurrency for the /meals form"""
+
+    def setUp(self):
+        """Set up Alice and Bob with a record today, Carol without"""
+        db.create_all()
+        self.alice, self.bob, self.carol = [Member(name=name) for name in ('Alice', 'Bob', 'Carol')]
+        db.session.add_all([self.alice, self.bob, self.carol])
+        db.session.flush()
+        self.today = date.today()
+        self.today_str = self.today.strftime('%Y-%m-%d')
+        save_day_counts(self.today, {self.alice.id: 1, self.bob.id: 2})
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def loaded_form(self):
+        """The /meals form as a browser would post it untouched"""
+        html = self.client.get('/meals').get_data(as_text=True)
+        data = dict(re.findall(r'name="(meal_base_[^"]+)" value="([^"]*)"', html))
+        for member in (self.alice, self.bob, self.carol):
+            data[f'meal_count_{self.today_str}_{member.id}'] = str(load_day_counts(self.today).get(member.id, 0))
+        return data
+
+    def count(self, member):
+        return load_day_counts(self.today).get(member.id)
+
+    def test_versions_bump_on_every_write(self):
+        self.assertEqual(load_day_records(self.today)[self.alice.id], (1, 1))
+        save_day_counts(self.today, {self.alice.id: 3})
+        save_meal_counts({(self.alice.id, self.today): 4})
+        db.session.commit()
+        self.assertEqual(load_day_records(self.today)[self.alice.id], (4, 3))
+
+    def test_untouched_form_writes_nothing(self):
+        data = self.loaded_form()
+        before = load_day_records(self.today)
+        observed = ROWS_WRITTEN.count('form')
+        response = self.client.post('/meals', data=data, follow_redirects=True)
+        self.assertIn(b'successfully', response.data)
+        self.assertEqual(load_day_records(self.today), before)
+        # Carol's untouched zero does not get a record either
+        self.assertNotIn(self.carol.id, load_day_records(self.today))
+        self.assertEqual(ROWS_WRITTEN.count('form'), observed + 1)
+        self.assertIn(b'meal_save_rows_written_count{source="form"}', self.client.get('/metrics').data)
+
+    def test_concurrent_edit_is_reported_not_overwritten(self):
+        first = self.loaded_form()
+        second = self.loaded_form()
+        first[f'meal_count_{self.today_str}_{self.bob.id}'] = '3'
+        self.client.post('/meals', data=first)
+
+        second[f'meal_count_{self.today_str}_{self.bob.id}'] = '4'
+        second[f'meal_count_{self.today_str}_{self.alice.id}'] = '2'
+        second[f'meal_count_{self.today_str}_{self.carol.id}'] = '1'
+        response = self.client.post('/meals', data=second, follow_redirects=True)
+        self.assertIn(b'Not saved for Bob', response.data)
+        self.assertEqual(self.count(self.bob), 3)
+        # The rest of the second submit went through
+        self.assertEqual((self.count(self.alice), self.count(self.carol)), (2, 1))
+        self.assertEqual(MemberMonthlyTotal.query.filter_by(member_id=self.bob.id).one().total, 3)
+
+    def test_same_change_twice_is_not_a_conflict(self):
+        first = self.loaded_form()
+        second = self.loaded_form()
+        for data in (first, second):
+            data[f'meal_count_{self.today_str}_{self.carol.id}'] = '2'
+            response = self.client.post('/meals', data=data, follow_redirects=True)
+            self.assertIn(b'successfully', response.data)
+        self.assertEqual(load_day_records(self.today)[self.carol.id], (2, 1))
+
+    def test_conflict_between_read_and_write(self):
+        """Test the upsert itself rejects a record that moved after it was read"""
+        bases = {self.alice.id: (1, 1), self.carol.id: None}
+        stale = load_day_records(self.today)
+        save_day_counts(self.today, {self.alice.id: 3, self.carol.id: 3})
+        db.session.commit()
+        with mock.patch.object(meal_store, 'load_day_records', return_value=stale):
+            result = save_day_edits(self.today, {self.alice.id: 4, self.carol.id: 4}, bases)
+        db.session.commit()
+        self.assertEqual(result, (0, [self.alice.id, self.carol.id]))
+        self.assertEqual((self.count(self.alice), self.count(self.carol)), (3, 3))
+
+    def test_unversioned_save_retries_lost_race(self):
+        stale = load_day_records(self.today)
+        save_day_counts(self.today, {self.bob.id: 4})
+        db.session.commit()
+        reads = iter([stale])
+        with mock.patch.object(meal_store, 'load_day_records',
+                               side_effect=lambda day: next(reads, None) or load_day_records(day)):
+            result = save_day_edits(self.today, {self.bob.id: 0})
+        db.session.commit()
+        self.assertEqual(result, (1, []))
+        self.assertEqual(self.count(self.bob), 0)
+        self.assertEqual(MemberMonthlyTotal.query.filter_by(member_id=self.bob.id).one().total, 0)
+
+    def test_meal_counts_retry_lost_race(self):
+        """Test the rollup gets the delta from the count actually overwritten"""
+        key = (self.bob.id, self.today)
+        stale = load_records([key])
+        save_day_counts(self.today, {self.bob.id: 4})
+        db.session.commit()
+        reads = iter([stale])
+        with mock.patch.object(meal_store, 'load_records',
+                               side_effect=lambda keys: next(reads, None) or load_records(keys)):
+            self.assertEqual(save_meal_counts({key: 1}), 1)
+        db.session.commit()
+        self.assertEqual(load_day_records(self.today)[self.bob.id], (1, 3))
+        self.assertEqual(MemberMonthlyTotal.query.filter_by(member_id=self.bob.id).one().total, 1)
+
+    def test_add_missing_version_column(self):
+        db.session.execute(text('ALTER TABLE meal_records DROP COLUMN version'))
+        db.session.commit()
+        self.assertEqual(add_missing_columns(), [('meal_records', 'version')])
+        self.assertEqual(db.session.execute(text('SELECT DISTINCT version FROM meal_records')).scalars().all(), [1])
+
+
+class TestConcurrentSaves(unittest.TestCase):
+    """Two people saving the same form at once against a file database"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.app = create_app(isolated_config(
+            self.tmpdir,
+            SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(self.tmpdir, 'meals.db')}",
+            METRICS_ENABLED=False,
+        ))
+        with self.app.app_context():
+            db.create_all()
+            member = Member(name='Alice')
+            db.session.add(member)
+            db.session.flush()
+            save_day_counts(date.today(), {member.id: 1})
+            db.session.commit()
+            self.member_id = member.id
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(self.tmpdir)
+
+    def test_exactly_one_concurrent_save_wins(self):
+        start = threading.Barrier(2)
+        results = {}
+
+        def save(meal_count):
+            with self.app.app_context():
+                start.wait()
+                results[meal_count] = save_day_edits(date.today(), {self.member_id: meal_count},
+                                                     {self.member_id: (1, 1)})
+                db.session.commit()
+
+        threads = [threading.Thread(target=save, args=(meal_count,)) for meal_count in (2, 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(result.written for result in results.values()), [0, 1])
+        winner = next(meal_count for meal_count, result in results.items() if result.written)
+        with self.app.app_context():
+            self.assertEqual(load_day_records(date.today())[self.member_id], (winner, 2))
+            self.assertEqual(MemberMonthlyTotal.query.one().total, winner)
+
+if __name__ == '__main__':
+    unittest.main()
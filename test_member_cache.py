@@ -0,0 +1,88 @@
+import unittest
+import os
+import sys
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import db, Member
+from app_testing import AppTestCase
+from member_cache import MemberDirectory, FileStamp
+
+class TestMemberCache(AppTestCase):
+    """Tests for the cached member list and its invalidation"""
+
+    def setUp(self):
+        """Set up two members"""
+        db.create_all()
+        db.session.add_all([Member(name='Alice'), Member(name='Bob')])
+        db.session.commit()
+        self.directory = self.app.extensions['member_directory']
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def count_queries(self, url):
+        with self.app.extensions['query_stats'].count() as counter:
+            response = self.client.get(url)
+        return response, counter.count
+
+    def test_second_lookup_is_a_hit(self):
+        """Test a warm cache saves the member query"""
+        _, cold = self.count_queries('/meals')
+        hits, misses = self.directory.hits, self.directory.misses
+        response, warm = self.count_queries('/meals')
+        self.assertIn(b'Bob', response.data)
+        self.assertEqual(warm, cold - 1)
+        self.assertEqual((self.directory.hits, self.directory.misses), (hits + 1, misses))
+
+    def test_add_member_invalidates(self):
+        self.client.get('/add-member')
+        self.client.post('/add-member', data={'name': 'Carol'})
+        self.assertIn(b'<span class="member-name">Carol</span>', self.client.get('/add-member').data)
+
+    def test_admin_remove_member_invalidates(self):
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        bob = Member.query.filter_by(name='Bob').first()
+        self.assertIn(b'>Bob</td>', self.client.get('/meals').data)
+        self.client.post('/admin', data={'remove_member': '1', 'member_id': str(bob.id)})
+        self.assertNotIn(b'>Bob</td>', self.client.get('/meals').data)
+
+    def test_rollback_does_not_invalidate(self):
+        self.directory.members()
+        stamp = self.directory.stamp.read()
+        db.session.add(Member(name='Dave'))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(self.directory.stamp.read(), stamp)
+
+    def test_other_worker_sees_invalidation(self):
+        """Test a write in one worker makes another worker's cache miss"""
+        other = MemberDirectory()
+        other.stamp = FileStamp(self.app.config['MEMBER_CACHE_STAMP'])
+        self.assertEqual([m.name for m in other.members()], ['Alice', 'Bob'])
+        self.assertEqual(len(other.members()), 2)
+        self.assertEqual(other.hits, 1)
+
+        db.session.add(Member(name='Aaron'))
+        db.session.commit()
+        self.assertEqual([m.name for m in other.members()], ['Aaron', 'Alice', 'Bob'])
+        self.assertEqual(other.misses, 2)
+
+    def test_ttl_bounds_staleness(self):
+        self.app.config['MEMBER_CACHE_TTL'] = 0
+        self.directory.members()
+        misses = self.directory.misses
+        self.directory.members()
+        self.assertEqual(self.directory.misses, misses + 1)
+
+    def test_counters_exposed(self):
+        self.client.get('/meals')
+        text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('meal_member_cache_lookups_total{result="miss"}', text)
+
+if __name__ == '__main__':
+    unittest.main()
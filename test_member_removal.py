@@ -0,0 +1,172 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from sqlalchemy import inspect, text
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db, Member, MealRecord
+from app_testing import AppTestCase, isolated_config
+from models import MemberMonthlyTotal
+from aggregates import member_totals
+from create_tables import add_missing_columns
+from exports import export_rows
+from member_removal import mark_removed, purge_member, purge_removed_members
+from rollups import rebuild_rollups
+
+class TestMemberRemoval(AppTestCase):
+    """Tests for soft removal and batched purging of members"""
+
+    def setUp(self):
+        """Set up Alice with a week of records and Bob with 25 days"""
+        db.create_all()
+        self.alice = Member(name='Alice')
+        self.bob = Member(name='Bob')
+        db.session.add_all([self.alice, self.bob])
+        db.session.flush()
+        self.today = date.today()
+        for days_ago in range(25):
+            meal_date = self.today - timedelta(days=days_ago)
+            if days_ago < 7:
+                db.session.add(MealRecord(member_id=self.alice.id, meal_date=meal_date, meal_count=1))
+            db.session.add(MealRecord(member_id=self.bob.id, meal_date=meal_date, meal_count=2))
+        rebuild_rollups()
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def test_marked_member_is_hidden_everywhere(self):
+        """Test reads skip a member as soon as the removal is committed"""
+        mark_removed(self.bob)
+        db.session.commit()
+        start = self.today - timedelta(days=30)
+
+        self.assertNotIn(b'Bob', self.client.get('/meals').data)
+        self.assertEqual([name for name, _ in member_totals(start, self.today)], ['Alice'])
+        self.assertEqual({row[2] for row in export_rows()}, {'Alice'})
+        self.assertEqual(self.client.get(f'/api/members/{self.bob.id}/meals').status_code, 404)
+        self.assertNotIn(str(self.bob.id), self.client.get('/api/meals/today').json['counts'])
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        self.assertNotIn(b'<span class="record-member">Bob</span>', self.client.get('/admin').data)
+
+    def test_purge_deletes_in_batches(self):
+        mark_removed(self.bob)
+        db.session.commit()
+        progress = []
+        deleted = purge_member(self.bob.id, batch_size=10, on_batch=progress.append)
+        self.assertEqual(deleted, 25)
+        self.assertEqual(progress, [10, 20, 25])
+        self.assertIsNone(db.session.get(Member, self.bob.id))
+        self.assertEqual(MemberMonthlyTotal.query.filter_by(member_id=self.bob.id).count(), 0)
+        self.assertEqual(MealRecord.query.filter_by(member_id=self.alice.id).count(), 7)
+
+    def test_interrupted_removal_is_finished(self):
+        mark_removed(self.bob)
+        db.session.commit()
+        self.assertEqual(purge_removed_members(batch_size=100), [(self.bob.id, 25)])
+        self.assertEqual([m.name for m in Member.query.all()], ['Alice'])
+        self.assertEqual(purge_removed_members(batch_size=100), [])
+
+    def test_admin_removal(self):
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        self.app.config['MEMBER_PURGE_BATCH_SIZE'] = 4
+        try:
+            self.client.post('/admin', data={'remove_member': '1', 'member_id': str(self.bob.id)})
+        finally:
+            self.app.config['MEMBER_PURGE_BATCH_SIZE'] = 1000
+        self.assertIsNone(db.session.get(Member, self.bob.id))
+        self.assertEqual(MealRecord.query.count(), 7)
+
+    def test_add_missing_columns(self):
+        """Test init_db adds removed_at to a members table created before it"""
+        db.session.execute(text('ALTER TABLE members DROP COLUMN removed_at'))
+        db.session.commit()
+        self.assertEqual(add_missing_columns(), [('members', 'removed_at')])
+        columns = {column['name'] for column in inspect(db.engine).get_columns('members')}
+        self.assertIn('removed_at', columns)
+        self.assertEqual(add_missing_columns(), [])
+
+
+class TestRemovalConcurrency(unittest.TestCase):
+    """Saves to /meals go through while a large removal is purging"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.app = create_app(isolated_config(
+            self.tmpdir,
+            SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(self.tmpdir, 'meals.db')}",
+            METRICS_ENABLED=False,
+        ))
+        with self.app.app_context():
+            db.create_all()
+            self.alice = Member(name='Alice')
+            self.bob = Member(name='Bob')
+            db.session.add_all([self.alice, self.bob])
+            db.session.flush()
+            start = date.today() - timedelta(days=3000)
+            db.session.execute(MealRecord.__table__.insert(), [
+                {'member_id': self.bob.id, 'meal_date': start + timedelta(days=i), 'meal_count': 1}
+                for i in range(3000)
+            ])
+            db.session.commit()
+            self.alice_id, self.bob_id = self.alice.id, self.bob.id
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(self.tmpdir)
+
+    def test_save_between_batches(self):
+        first_batch = threading.Event()
+        saved = threading.Event()
+        batches = []
+
+        def on_batch(deleted):
+            batches.append(deleted)
+            if len(batches) == 1:
+                first_batch.set()
+                # A removal holding its locks across batches would keep the
+                # save below waiting until this timed out
+                saved.wait(10)
+
+        def remove():
+            with self.app.app_context():
+                mark_removed(db.session.get(Member, self.bob_id))
+                db.session.commit()
+                purge_member(self.bob_id, batch_size=500, on_batch=on_batch)
+
+        remover = threading.Thread(target=remove)
+        remover.start()
+        try:
+            self.assertTrue(first_batch.wait(10))
+            client = self.app.test_client()
+            meals_page = client.get('/meals').data
+            started = time.perf_counter()
+            response = client.post('/meals', data={f"meal_count_{date.today():%Y-%m-%d}_{self.alice_id}": '2'})
+            elapsed = time.perf_counter() - started
+        finally:
+            saved.set()
+            remover.join()
+
+        self.assertEqual(response.status_code, 302)
+        self.assertLess(elapsed, 2)
+        self.assertNotIn(b'Bob', meals_page)
+        self.assertEqual(batches, [500, 1000, 1500, 2000, 2500, 3000])
+        with self.app.app_context():
+            self.assertEqual(MealRecord.query.count(), 1)
+            self.assertEqual(db.session.get(Member, self.bob_id), None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import os
+import sys
+from datetime import date
+from unittest import mock
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import db, Member, MealRecord
+from app_testing import AppTestCase
+from metrics import Counter, Histogram
+
+class TestRequestMetrics(AppTestCase):
+    """Tests for per-request instrumentation and /metrics"""
+
+    app_config = {
+        'METRICS_ENABLED': True,
+        'SLOW_REQUEST_MS': 1000,
+    }
+
+    def setUp(self):
+        """Set up a member with a record for today"""
+        db.create_all()
+        member = Member(name='Alice')
+        db.session.add(member)
+        db.session.commit()
+        db.session.add(MealRecord(member_id=member.id, meal_date=date.today(), meal_count=2))
+        db.session.commit()
+        self.metrics = self.app.extensions['request_metrics']
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def test_request_is_measured(self):
+        """Test latency, SQL, DB time and template time are recorded per route"""
+        before = self.metrics.request_seconds.count('/meals', 'GET', '200')
+        self.client.get('/meals')
+        self.assertEqual(self.metrics.request_seconds.count('/meals', 'GET', '200'), before + 1)
+
+        series = self.metrics.sql_statements._series[('/meals',)]
+        self.assertGreaterEqual(series[1], 1)
+        self.assertGreater(self.metrics.db_seconds._series[('/meals',)][1], 0)
+        self.assertGreater(self.metrics.template_seconds._series[('/meals',)][1], 0)
+
+    def test_metrics_endpoint(self):
+        """Test /metrics serves Prometheus text format"""
+        self.client.get('/meals')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        self.assertIn('# TYPE meal_http_request_duration_seconds histogram', text)
+        self.assertIn('meal_http_request_duration_seconds_bucket{route="/meals",method="GET",status="200",le="+Inf"}', text)
+        self.assertIn('meal_http_request_sql_statements_count{route="/meals"}', text)
+
+    def test_slow_request_log(self):
+        """Test requests over the threshold are logged and counted"""
+        self.app.config['SLOW_REQUEST_MS'] = 0
+        before = self.metrics.slow_requests.value('/meals')
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            self.client.get('/meals')
+        self.assertIn('Slow request: GET /meals', logs.output[0])
+        self.assertIn('SQL statements', logs.output[0])
+        self.assertEqual(self.metrics.slow_requests.value('/meals'), before + 1)
+
+    def test_disabled(self):
+        """Test nothing is recorded when metrics are off"""
+        self.app.config['METRICS_ENABLED'] = False
+        before = self.metrics.request_seconds.count('/meals', 'GET', '200')
+        self.client.get('/meals')
+        self.assertEqual(self.metrics.request_seconds.count('/meals', 'GET', '200'), before)
+
+    def test_instrument_calls_per_request(self):
+        """Test a request costs a fixed handful of observations, and none when disabled"""
+        def calls(enabled):
+            self.app.config['METRICS_ENABLED'] = enabled
+            with mock.patch.object(Histogram, 'observe', autospec=True) as observe, \
+                    mock.patch.object(Counter, 'inc', autospec=True) as inc:
+                self.client.get('/')
+            return [call.args[0] for call in observe.call_args_list], inc.call_count
+
+        observed, incremented = calls(True)
+        self.assertEqual(observed, [self.metrics.request_seconds, self.metrics.sql_statements,
+                                    self.metrics.db_seconds, self.metrics.template_seconds])
+        self.assertEqual(incremented, 0)
+        self.assertEqual(calls(False), ([], 0))
+
+class TestMetricTypes(unittest.TestCase):
+    """Tests for the text exposition of counters and histograms"""
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('h', 'Help.', ('route',), buckets=(1, 5))
+        for value in (0.5, 3, 3, 9):
+            histogram.observe(value, '/a')
+        lines = histogram.expose()
+        self.assertIn('h_bucket{route="/a",le="1"} 1', lines)
+        self.assertIn('h_bucket{route="/a",le="5"} 3', lines)
+        self.assertIn('h_bucket{route="/a",le="+Inf"} 4', lines)
+        self.assertIn('h_sum{route="/a"} 15.5', lines)
+        self.assertIn('h_count{route="/a"} 4', lines)
+
+    def test_label_values_are_escaped(self):
+        counter = Counter('c', 'Help.', ('route',))
+        counter.inc('say "hi"\\')
+        self.assertIn('c{route="say \\"hi\\"\\\\"} 1', counter.expose())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date
+from flask_testing import TestCase
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, create_app, db, Member, MealRecord
+from query_stats import STATEMENTS_BY_BIND
+from replica import READ_ROUTES, REPLICA_BIND, STICKY_KEY
+from rollups import rebuild_rollups
+from app_testing import isolated_config
+
+class ReplicaTestCase(TestCase):
+    """A primary and a replica as two SQLite files; the replica misses the latest writes"""
+
+    def replica_uri(self, directory):
+        return f"sqlite:///{os.path.join(directory, 'replica.db')}"
+
+    def create_app(self):
+        """Create an app with a replica bind"""
+        self.directory = tempfile.mkdtemp()
+        return create_app(isolated_config(
+            self.directory,
+            SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(self.directory, 'primary.db')}",
+            SQLALCHEMY_REPLICA_URI=self.replica_uri(self.directory),
+        ))
+
+    def setUp(self):
+        """Alice ate 2 meals on 1 March; the replica has not seen her 3 on 2 March"""
+        db.create_all(bind_key=None)
+        self.alice = Member(name='Alice')
+        db.session.add(self.alice)
+        db.session.flush()
+        db.session.add(MealRecord(member_id=self.alice.id, meal_date=date(2024, 3, 1), meal_count=2))
+        rebuild_rollups()
+        db.session.commit()
+        self.copy_to_replica()
+        db.session.add(MealRecord(member_id=self.alice.id, meal_date=date(2024, 3, 2), meal_count=3))
+        rebuild_rollups()
+        db.session.commit()
+
+    def copy_to_replica(self):
+        shutil.copy(os.path.join(self.directory, 'primary.db'), os.path.join(self.directory, 'replica.db'))
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+        # Declaring the bind added an (empty) replica metadata that other apps' create_all() would look up
+        db.metadatas.pop(REPLICA_BIND, None)
+        shutil.rmtree(self.directory)
+
+    def march_total(self, client=None):
+        return (client or self.client).get('/api/totals?month=2024-03').json['grand_total']
+
+class TestReplicaRouting(ReplicaTestCase):
+    """Tests for reads routed to the replica"""
+
+    def test_reports_read_replica(self):
+        routed = READ_ROUTES.value('replica', 'replica')
+        self.assertEqual(self.march_total(), 2)
+        response = self.client.get('/export.csv?start=2024-03-01&end=2024-03-31')
+        self.assertEqual(len(response.get_data(as_text=True).strip().splitlines()), 2)
+        self.assertEqual(READ_ROUTES.value('replica', 'replica'), routed + 2)
+
+    def test_roster_from_primary(self):
+        db.session.add(Member(name='Bob'))
+        db.session.commit()
+        members = self.client.get('/api/matrix?month=2024-03').json['members']
+        self.assertEqual([member['name'] for member in members], ['Alice', 'Bob'])
+        self.assertEqual(members[0]['total'], 2)
+
+    def test_reads_follow_own_writes(self):
+        today = date.today().strftime('%Y-%m')
+        self.client.post('/api/meals/today', json={'counts': {str(self.alice.id): 4}})
+        self.assertEqual(self.client.get(f'/api/totals?month={today}').json['grand_total'], 4)
+        self.assertEqual(self.march_total(), 5)
+        # Other users still read the replica
+        self.assertEqual(self.march_total(self.app.test_client()), 2)
+        # And so does the writer once the window has passed
+        with self.client.session_transaction() as sess:
+            sess[STICKY_KEY] = 0
+        self.assertEqual(self.march_total(), 2)
+
+    def test_reads_without_writes_are_not_sticky(self):
+        self.client.get('/meals')
+        self.client.get('/api/meals/today')
+        self.assertEqual(self.march_total(), 2)
+
+    def test_per_bind_statements(self):
+        replica = STATEMENTS_BY_BIND.value('replica')
+        self.march_total()
+        self.assertGreater(STATEMENTS_BY_BIND.value('replica'), replica)
+        metrics = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('meal_db_statements_total{bind="replica"}', metrics)
+        self.assertIn('meal_db_statements_total{bind="default"}', metrics)
+        self.assertIn('meal_db_replica_available 1', metrics)
+
+class TestReplicaFallback(ReplicaTestCase):
+    """Tests for a replica that is missing its tables"""
+
+    def copy_to_replica(self):
+        open(os.path.join(self.directory, 'replica.db'), 'w').close()
+
+    def test_falls_back_to_primary(self):
+        errors = READ_ROUTES.value('default', 'replica_error')
+        skipped = READ_ROUTES.value('default', 'replica_down')
+        self.assertEqual(self.march_total(), 5)
+        self.assertEqual(READ_ROUTES.value('default', 'replica_error'), errors + 1)
+        self.assertTrue(self.app.extensions['replica_router'].is_down())
+        # The replica is not tried again until REPLICA_RETRY_SECONDS have passed
+        response = self.client.get('/export.csv?start=2024-03-01&end=2024-03-31')
+        self.assertEqual(len(response.get_data(as_text=True).strip().splitlines()), 3)
+        self.assertEqual(READ_ROUTES.value('default', 'replica_down'), skipped + 1)
+        self.assertIn('meal_db_replica_available 0', self.client.get('/metrics').get_data(as_text=True))
+
+class TestReplicaUnreachable(ReplicaTestCase):
+    """Tests for a replica that cannot be opened"""
+
+    def replica_uri(self, directory):
+        return f"sqlite:///file:{os.path.join(directory, 'missing', 'replica.db')}?mode=ro&uri=true"
+
+    def copy_to_replica(self):
+        pass
+
+    def test_streamed_export_falls_back(self):
+        response = self.client.get('/export.csv?start=2024-03-01&end=2024-03-31')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_data(as_text=True).strip().splitlines()), 3)
+        self.assertTrue(self.app.extensions['replica_router'].is_down())
+
+class TestWithoutReplica(unittest.TestCase):
+    """Tests for the default single-database setup"""
+
+    def test_disabled(self):
+        router = app.extensions['replica_router']
+        self.assertFalse(router.enabled)
+        self.assertNotIn('replica', app.config.get('SQLALCHEMY_BINDS') or {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import os
+import sys
+from datetime import date
+from io import BytesIO
+from unittest import mock
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as app_module
+from app import db, Member, MealRecord
+from app_testing import AppTestCase
+from report_cache import ReportCache, report_version
+from reports import write_report
+
+class TestReportCacheLRU(unittest.TestCase):
+    """Unit tests for the byte-bounded LRU"""
+
+    def test_get_and_put(self):
+        cache = ReportCache(100)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', b'x' * 10)
+        self.assertEqual(cache.get('a'), b'x' * 10)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used_by_size(self):
+        cache = ReportCache(100)
+        cache.put('a', b'a' * 40)
+        cache.put('b', b'b' * 40)
+        cache.get('a')
+        cache.put('c', b'c' * 40)
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(cache.size, 80)
+
+    def test_oversized_entries_are_not_kept(self):
+        cache = ReportCache(10)
+        cache.put('a', b'a' * 11)
+        self.assertEqual(len(cache), 0)
+
+    def test_replacing_a_key_updates_size(self):
+        cache = ReportCache(100)
+        cache.put('a', b'a' * 40)
+        cache.put('a', b'a' * 10)
+        self.assertEqual(cache.size, 10)
+
+class TestReportCaching(AppTestCase):
+    """Route tests for cached, ETag-validated PDF export"""
+
+    def setUp(self):
+        """Set up test database with one member and a record"""
+        db.create_all()
+        self.app.extensions['report_cache'].clear()
+        self.member = Member(name='John Doe')
+        db.session.add(self.member)
+        db.session.commit()
+        self.today = date.today()
+        self.today_str = self.today.strftime('%Y-%m-%d')
+        self.client.post('/meals', data={f'meal_count_{self.today_str}_{self.member.id}': '3'})
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app.extensions['report_cache'].clear()
+
+    def test_response_has_validators(self):
+        """Test the PDF carries ETag and Last-Modified"""
+        response = self.client.get('/export-pdf')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.headers.get('ETag'))
+        self.assertIsNotNone(response.headers.get('Last-Modified'))
+
+    def test_if_none_match_returns_304_without_rendering(self):
+        """Test a matching ETag short-circuits before ReportLab"""
+        etag = self.client.get('/export-pdf').headers['ETag']
+        with mock.patch.object(app_module, 'write_report') as build:
+            response = self.client.get('/export-pdf', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        build.assert_not_called()
+
+    def test_if_modified_since_returns_304(self):
+        """Test Last-Modified revalidation"""
+        last_modified = self.client.get('/export-pdf').headers['Last-Modified']
+        response = self.client.get('/export-pdf', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+
+    def test_repeat_download_served_from_cache(self):
+        """Test the second full download does not rebuild the PDF"""
+        first = self.client.get('/export-pdf').data
+        with mock.patch.object(app_module, 'write_report') as build:
+            second = self.client.get('/export-pdf').data
+        build.assert_not_called()
+        self.assertEqual(first, second)
+
+    def test_data_change_invalidates(self):
+        """Test saving meals changes the ETag and rebuilds"""
+        etag = self.client.get('/export-pdf').headers['ETag']
+        self.client.post('/meals', data={f'meal_count_{self.today_str}_{self.member.id}': '1'})
+        response = self.client.get('/export-pdf', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_member_removal_changes_version(self):
+        """Test deletes change the version even though timestamps do not move"""
+        other = Member(name='Aaron')
+        db.session.add(other)
+        db.session.commit()
+        start, end = self.today.replace(day=1), self.today
+        before = report_version(start, end)
+        MealRecord.query.filter_by(member_id=self.member.id).delete()
+        db.session.commit()
+        self.assertNotEqual(report_version(start, end).etag, before.etag)
+
+    def test_build_is_deterministic(self):
+        """Test identical data renders identical bytes"""
+        month = self.today.replace(day=1)
+        totals = [('John Doe', 3)]
+        as_of = report_version(month, self.today).last_modified
+        first, second = BytesIO(), BytesIO()
+        write_report(first, month, self.today, totals, data_as_of=as_of)
+        write_report(second, month, self.today, totals, data_as_of=as_of)
+        self.assertEqual(first.getvalue(), second.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import db, Member
+from app_testing import AppTestCase
+from report_jobs import ReportJobs, PENDING, DONE, FAILED
+
+JOB_ID = 'a' * 40
+
+def wait_for(jobs, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        state = jobs.status(job_id)
+        if state != PENDING:
+            return state
+        time.sleep(0.01)
+    return jobs.status(job_id)
+
+def render_bytes(data):
+    return data
+
+def render_failure():
+    raise ValueError('boom')
+
+class TestReportJobQueue(unittest.TestCase):
+    """Unit tests for the file-backed job queue"""
+
+    def setUp(self):
+        self.job_dir = tempfile.mkdtemp()
+        self.jobs = ReportJobs(self.job_dir, max_workers=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.job_dir, ignore_errors=True)
+
+    def test_unknown_and_invalid_ids(self):
+        self.assertIsNone(self.jobs.status(JOB_ID))
+        self.assertIsNone(self.jobs.status('../../etc/passwd'))
+
+    def test_job_runs_to_completion(self):
+        self.assertEqual(self.jobs.submit(JOB_ID, {'filename': 'x.pdf'}, render_bytes, b'%PDF-1'), PENDING)
+        self.assertEqual(wait_for(self.jobs, JOB_ID), DONE)
+        with open(self.jobs.result_path(JOB_ID), 'rb') as handle:
+            self.assertEqual(handle.read(), b'%PDF-1')
+        self.assertEqual(self.jobs.metadata(JOB_ID), {'filename': 'x.pdf'})
+
+    def test_failed_job_reports_error_and_can_retry(self):
+        self.jobs.submit(JOB_ID, {}, render_failure)
+        self.assertEqual(wait_for(self.jobs, JOB_ID), FAILED)
+        self.assertEqual(self.jobs.error(JOB_ID), 'boom')
+
+        self.jobs.submit(JOB_ID, {}, render_bytes, b'ok')
+        self.assertEqual(wait_for(self.jobs, JOB_ID), DONE)
+
+    def test_identical_submissions_are_merged(self):
+        """Test an in-flight job is not started twice"""
+        release = threading.Event()
+        calls = []
+
+        def slow_render():
+            calls.append(1)
+            release.wait(5)
+            return b'done'
+
+        for _ in range(5):
+            self.assertEqual(self.jobs.submit(JOB_ID, {}, slow_render), PENDING)
+        release.set()
+        self.assertEqual(wait_for(self.jobs, JOB_ID), DONE)
+        self.assertEqual(len(calls), 1)
+
+    def test_concurrency_is_limited(self):
+        """Test no more than max_workers jobs render at once"""
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def render():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+            return b'done'
+
+        job_ids = [f'{i:040x}' for i in range(6)]
+        for job_id in job_ids:
+            self.jobs.submit(job_id, {}, render)
+        for job_id in job_ids:
+            self.assertEqual(wait_for(self.jobs, job_id), DONE)
+        self.assertLessEqual(max(peak), 2)
+
+    def test_stale_lock_is_failed(self):
+        """Test a lock left by a dead worker does not block forever"""
+        os.makedirs(self.job_dir, exist_ok=True)
+        lock = os.path.join(self.job_dir, f'{JOB_ID}.lock')
+        open(lock, 'w').close()
+        old = time.time() - 3600
+        os.utime(lock, (old, old))
+        self.assertEqual(self.jobs.status(JOB_ID), FAILED)
+
+class TestReportJobRoutes(AppTestCase):
+    """Route tests for asynchronous PDF export"""
+
+    def setUp(self):
+        """Set up test database"""
+        db.create_all()
+        member = Member(name='John Doe')
+        db.session.add(member)
+        db.session.commit()
+        today_str = date.today().strftime('%Y-%m-%d')
+        self.client.post('/meals', data={f'meal_count_{today_str}_{member.id}': '2'})
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def test_submit_poll_download(self):
+        """Test the full asynchronous export flow"""
+        response = self.client.post('/export-pdf/jobs')
+        self.assertEqual(response.status_code, 202)
+        job = response.get_json()
+        self.assertIn(job['status'], (PENDING, DONE))
+
+        self.assertEqual(wait_for(self.app.extensions['report_jobs'], job['job_id']), DONE)
+        status = self.client.get(job['status_url']).get_json()
+        self.assertEqual(status['status'], DONE)
+
+        download = self.client.get(status['download_url'])
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(download.content_type, 'application/pdf')
+        self.assertIn(b'%PDF', download.data[:4])
+        download.close()
+
+    def test_same_data_same_job(self):
+        """Test repeat submissions for unchanged data share a job id"""
+        first = self.client.post('/export-pdf/jobs').get_json()
+        second = self.client.post('/export-pdf/jobs').get_json()
+        self.assertEqual(first['job_id'], second['job_id'])
+        wait_for(self.app.extensions['report_jobs'], first['job_id'])
+
+    def test_unknown_job(self):
+        """Test polling a job that does not exist"""
+        self.assertEqual(self.client.get(f'/export-pdf/jobs/{JOB_ID}').status_code, 404)
+        self.assertEqual(self.client.get(f'/export-pdf/jobs/{JOB_ID}/download').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
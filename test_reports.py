@@ -0,0 +1,133 @@
+import unittest
+import os
+import sys
+import re
+from datetime import date, timedelta
+from io import BytesIO
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import db, Member, MealRecord
+from app_testing import AppTestCase
+from aggregates import member_totals, range_totals, daily_counts
+from rollups import rebuild_rollups
+from reports import write_report, report_heading, _FlowableStream
+
+def page_count(pdf):
+    return len(re.findall(rb'/Type /Page\b', pdf))
+
+class TestReportRendering(unittest.TestCase):
+    """Unit tests for batch-by-batch PDF layout"""
+
+    def test_flowable_stream_refills_from_batches(self):
+        stream = _FlowableStream(iter([[1, 2], [3], [4, 5]]))
+        seen = []
+        while len(stream):
+            seen.append(stream[0])
+            del stream[0]
+        self.assertEqual(seen, [1, 2, 3, 4, 5])
+
+    def test_flowable_stream_pulls_lazily(self):
+        pulled = []
+
+        def batches():
+            for i in range(100):
+                pulled.append(i)
+                yield [i]
+
+        stream = _FlowableStream(batches())
+        self.assertTrue(len(stream))
+        self.assertLessEqual(len(pulled), 3)
+
+    def test_headings(self):
+        self.assertEqual(report_heading(date(2024, 3, 1), date(2024, 3, 31)),
+                         'Monthly Meal Report - March 2024')
+        self.assertEqual(report_heading(date(2024, 1, 1), date(2024, 12, 31)),
+                         'Meal Report - 2024-01-01 to 2024-12-31')
+
+    def test_detail_pages_follow_summary(self):
+        """Test each member's breakdown starts on a new page"""
+        rows = [(name, date(2024, 1, 1) + timedelta(days=d), 2)
+                for name in ('A', 'B', 'C') for d in range(60)]
+        summary = BytesIO()
+        write_report(summary, date(2024, 1, 1), date(2024, 2, 29), [('A', 120), ('B', 120), ('C', 120)])
+        detail = BytesIO()
+        write_report(detail, date(2024, 1, 1), date(2024, 2, 29),
+                     [('A', 120), ('B', 120), ('C', 120)], iter(rows))
+        self.assertEqual(page_count(summary.getvalue()), 1)
+        self.assertGreaterEqual(page_count(detail.getvalue()), 4)
+
+class TestRangeExports(AppTestCase):
+    """Route and aggregate tests for arbitrary report ranges"""
+
+    def setUp(self):
+        """Set up two members with a year and a half of history"""
+        db.create_all()
+        members = [Member(name='Alice'), Member(name='Bob')]
+        db.session.add_all(members)
+        db.session.commit()
+        start = date(2023, 1, 1)
+        for offset in range(540):
+            for i, member in enumerate(members):
+                db.session.add(MealRecord(member_id=member.id,
+                                          meal_date=start + timedelta(days=offset),
+                                          meal_count=(offset + i) % 4))
+        db.session.commit()
+        rebuild_rollups()
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def test_range_totals_match_raw_totals(self):
+        """Test whole-month ranges from the rollup equal the raw sums"""
+        for start, end in ((date(2023, 1, 1), date(2023, 12, 31)),
+                           (date(2023, 2, 1), date(2023, 2, 28)),
+                           (date(2023, 1, 15), date(2023, 3, 10))):
+            self.assertEqual(range_totals(start, end), member_totals(start, end))
+
+    def test_daily_counts_are_ordered(self):
+        """Test the breakdown stream is ordered by name, then date"""
+        rows = list(daily_counts(date(2023, 1, 1), date(2023, 1, 31), batch_size=7))
+        self.assertEqual(len(rows), 62)
+        self.assertEqual(rows, sorted(rows, key=lambda row: (row[0], row[1])))
+
+    def test_export_past_month(self):
+        """Test month=YYYY-MM exports a past month"""
+        response = self.client.get('/export-pdf?month=2023-02')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('meal_report_2023_02.pdf', response.headers['Content-Disposition'])
+        self.assertIn(b'%PDF', response.data[:4])
+
+    def test_export_range_with_detail(self):
+        """Test start/end with per-day breakdown pages"""
+        summary = self.client.get('/export-pdf?start=2023-01-01&end=2023-06-30')
+        detail = self.client.get('/export-pdf?start=2023-01-01&end=2023-06-30&detail=1')
+        self.assertEqual(detail.status_code, 200)
+        self.assertIn('meal_report_2023_01_01_to_2023_06_30.pdf', detail.headers['Content-Disposition'])
+        self.assertNotEqual(summary.headers['ETag'], detail.headers['ETag'])
+        self.assertGreater(page_count(detail.data), page_count(summary.data))
+
+    def test_export_escapes_member_names(self):
+        """Test names that look like ReportLab markup are printed, not parsed"""
+        for name in ('x</para>', 'a <font color=red>', 'Tom & Jerry'):
+            member = Member(name=name)
+            db.session.add(member)
+            db.session.flush()
+            db.session.add(MealRecord(member_id=member.id, meal_date=date(2023, 1, 2), meal_count=1))
+        db.session.commit()
+        response = self.client.get('/export-pdf?month=2023-01&detail=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'%PDF', response.data[:4])
+
+    def test_bad_ranges_are_rejected(self):
+        """Test malformed and inverted ranges return 400"""
+        self.assertEqual(self.client.get('/export-pdf?month=2023-13').status_code, 400)
+        self.assertEqual(self.client.get('/export-pdf?start=2023-01-01').status_code, 400)
+        self.assertEqual(self.client.get('/export-pdf?start=2023-02-01&end=2023-01-01').status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
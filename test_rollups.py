@@ -0,0 +1,154 @@
+import unittest
+import os
+import sys
+from datetime import date, timedelta
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import db, Member, MealRecord
+from app_testing import AppTestCase
+from models import MemberMonthlyTotal
+from aggregates import month_bounds, member_totals, monthly_totals
+from rollups import apply_meal_deltas, rebuild_rollups, compute_rollups
+
+class TestRollups(AppTestCase):
+    """Unit tests for the member_monthly_totals rollup"""
+
+    def setUp(self):
+        """Set up test database with two members"""
+        db.create_all()
+        self.alice = Member(name='Alice')
+        self.bob = Member(name='Bob')
+        db.session.add_all([self.alice, self.bob])
+        db.session.commit()
+        self.today = date.today()
+        self.month = self.today.replace(day=1)
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def login(self):
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+
+    def rollup(self, member, month=None):
+        row = MemberMonthlyTotal.query.filter_by(member_id=member.id, month=month or self.month).first()
+        return row.total if row else None
+
+    def assert_matches_raw(self, month_start):
+        """Rollup totals must equal the raw GROUP BY totals"""
+        start_date, end_date = month_bounds(month_start.year, month_start.month)
+        self.assertEqual(monthly_totals(month_start), member_totals(start_date, end_date))
+
+    def test_meals_post_updates_rollup(self):
+        """Test /meals saves adjust the rollup by the change in count"""
+        today_str = self.today.strftime('%Y-%m-%d')
+        self.client.post('/meals', data={
+            f'meal_count_{today_str}_{self.alice.id}': '3',
+            f'meal_count_{today_str}_{self.bob.id}': '1',
+        })
+        self.assertEqual(self.rollup(self.alice), 3)
+        self.assertEqual(self.rollup(self.bob), 1)
+
+        self.client.post('/meals', data={
+            f'meal_count_{today_str}_{self.alice.id}': '1',
+            f'meal_count_{today_str}_{self.bob.id}': '1',
+        })
+        self.assertEqual(self.rollup(self.alice), 1)
+        self.assert_matches_raw(self.month)
+
+    def test_admin_update_updates_rollup(self):
+        """Test both admin edit branches keep the rollup in step"""
+        self.login()
+        past = date(2024, 3, 15)
+        self.client.post('/admin', data={
+            'update_meal': '1', 'record_id': '', 'member_id': str(self.alice.id),
+            'meal_date': past.strftime('%Y-%m-%d'), 'meal_count': '4'
+        })
+        self.assertEqual(self.rollup(self.alice, date(2024, 3, 1)), 4)
+
+        record = MealRecord.query.filter_by(member_id=self.alice.id, meal_date=past).first()
+        self.client.post('/admin', data={
+            'update_meal': '1', 'record_id': str(record.id), 'member_id': str(self.alice.id),
+            'meal_date': past.strftime('%Y-%m-%d'), 'meal_count': '2'
+        })
+        self.assertEqual(self.rollup(self.alice, date(2024, 3, 1)), 2)
+        self.assert_matches_raw(date(2024, 3, 1))
+
+    def test_member_removal_drops_rollup(self):
+        """Test removing a member removes their rollup rows"""
+        apply_meal_deltas([(self.bob.id, self.today, 3)])
+        db.session.commit()
+        self.login()
+        self.client.post('/admin', data={'remove_member': '1', 'member_id': str(self.bob.id)})
+        self.assertEqual(MemberMonthlyTotal.query.filter_by(member_id=self.bob.id).count(), 0)
+
+    def test_deltas_accumulate_across_days(self):
+        """Test deltas for different days of a month land in one row"""
+        apply_meal_deltas([
+            (self.alice.id, date(2024, 5, 1), 2),
+            (self.alice.id, date(2024, 5, 31), 3),
+            (self.alice.id, date(2024, 6, 1), 1),
+        ])
+        apply_meal_deltas([(self.alice.id, date(2024, 5, 2), -1)])
+        db.session.commit()
+        self.assertEqual(self.rollup(self.alice, date(2024, 5, 1)), 4)
+        self.assertEqual(self.rollup(self.alice, date(2024, 6, 1)), 1)
+
+    def test_rebuild_detects_and_fixes_drift(self):
+        """Test rebuild recomputes from raw records and reports drift"""
+        # Raw records written behind the rollup's back
+        for offset in range(3):
+            db.session.add(MealRecord(member_id=self.alice.id,
+                                      meal_date=date(2024, 1, 10) + timedelta(days=offset),
+                                      meal_count=2))
+        db.session.add(MemberMonthlyTotal(member_id=self.bob.id, month=date(2024, 1, 1), total=9))
+        db.session.commit()
+
+        drift = rebuild_rollups()
+        db.session.commit()
+        self.assertEqual(drift, [
+            (self.alice.id, date(2024, 1, 1), None, 6),
+            (self.bob.id, date(2024, 1, 1), 9, 0),
+        ])
+        self.assert_matches_raw(date(2024, 1, 1))
+        self.assertEqual(rebuild_rollups(), [])
+
+    def test_compute_rollups_groups_by_month(self):
+        """Test the raw recomputation buckets dates by calendar month"""
+        db.session.add_all([
+            MealRecord(member_id=self.alice.id, meal_date=date(2023, 12, 31), meal_count=1),
+            MealRecord(member_id=self.alice.id, meal_date=date(2024, 1, 1), meal_count=2),
+            MealRecord(member_id=self.alice.id, meal_date=date(2024, 1, 31), meal_count=3),
+        ])
+        db.session.commit()
+        self.assertEqual(compute_rollups(), {
+            (self.alice.id, date(2023, 12, 1)): 1,
+            (self.alice.id, date(2024, 1, 1)): 5,
+        })
+
+    def test_rebuild_invalidates_cached_reports(self):
+        """Test a repair from the CLI reaches reports and settlements cached before it"""
+        db.session.add(MemberMonthlyTotal(member_id=self.bob.id, month=date(2024, 1, 1), total=9))
+        db.session.commit()
+        etag = self.client.get('/export-pdf?month=2024-01').headers['ETag']
+        self.assertEqual(self.client.get('/api/settlement?month=2024-01').json['total_meals'], 9)
+
+        result = self.app.test_cli_runner().invoke(args=['rebuild-rollups'])
+        self.assertIn('1 drifted rows corrected', result.output)
+        response = self.client.get('/export-pdf?month=2024-01', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/settlement?month=2024-01').json['total_meals'], 0)
+
+    def test_admin_rebuild_button(self):
+        """Test the admin rebuild command reports its result"""
+        self.login()
+        response = self.client.post('/admin', data={'rebuild_rollups': '1'}, follow_redirects=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'no drift found', response.data)
+
+if __name__ == '__main__':
+    unittest.main()
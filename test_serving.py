@@ -0,0 +1,113 @@
+import unittest
+import os
+import json
+import subprocess
+import sys
+import threading
+from unittest import mock
+from flask import current_app
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import db, Member
+from app_testing import AppTestCase
+import serving
+from serving import run_blocking, thread_pool_executor
+
+# Exports a detail PDF in a monkey-patched interpreter and reports which
+# OS threads ran the SQL and the layout
+GEVENT_EXPORT = """
+from gevent import monkey
+monkey.patch_all()
+import json, os, sys, tempfile
+from datetime import date
+from sqlalchemy import event
+sys.path.insert(0, sys.argv[1])
+import app as app_module
+from app import create_app, db, Member, MealRecord
+from app_testing import isolated_config
+
+os_thread = monkey.get_original('threading', 'get_ident')
+directory = tempfile.mkdtemp()
+test_app = create_app(isolated_config(directory))
+sql_threads, layout = set(), {}
+with test_app.app_context():
+    db.create_all()
+    member = Member(name='Alice')
+    db.session.add(member)
+    db.session.flush()
+    db.session.add(MealRecord(member_id=member.id, meal_date=date(2024, 3, 1), meal_count=2))
+    db.session.commit()
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: sql_threads.add(os_thread()))
+
+write_report = app_module.write_report
+def traced_write_report(output, start_date, end_date, totals, daily_rows, *args, **kwargs):
+    layout.update(thread=os_thread(), rows=type(daily_rows).__name__)
+    return write_report(output, start_date, end_date, totals, daily_rows, *args, **kwargs)
+app_module.write_report = traced_write_report
+
+response = test_app.test_client().get('/export-pdf?month=2024-03&detail=1')
+print(json.dumps({'status': response.status_code, 'pdf': response.data[:4] == b'%PDF',
+                  'main': os_thread(), 'sql': sorted(sql_threads), **layout}))
+"""
+
+class TestServing(AppTestCase):
+    """Tests for keeping blocking work off the gevent hub"""
+
+    def setUp(self):
+        db.create_all()
+        db.session.add(Member(name='Alice'))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def _probe(self, suffix):
+        # Needs the caller's app context and database session
+        names = [member.name for member in Member.query.all()]
+        return current_app.name, names, threading.get_ident(), suffix
+
+    def test_inline_without_gevent(self):
+        self.assertFalse(serving.gevent_active())
+        name, names, thread_id, suffix = run_blocking(self._probe, suffix='x')
+        self.assertEqual((name, names, suffix), (self.app.name, ['Alice'], 'x'))
+        self.assertEqual(thread_id, threading.get_ident())
+
+    def test_native_thread_under_gevent(self):
+        """Test the call runs on another OS thread with the caller's context"""
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            self.skipTest('gevent is not installed')
+        with mock.patch.object(serving, 'gevent_active', return_value=True):
+            name, names, thread_id, suffix = run_blocking(self._probe, 'y')
+            executor = thread_pool_executor(1)
+            try:
+                self.assertEqual(executor.submit(lambda: 2 + 2).result(), 4)
+            finally:
+                executor.shutdown()
+        self.assertEqual((name, names, suffix), (self.app.name, ['Alice'], 'y'))
+        self.assertNotEqual(thread_id, threading.get_ident())
+
+    def test_detail_export_under_gevent(self):
+        """Test the report's rows are fetched on the event loop and only layout leaves it"""
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            self.skipTest('gevent is not installed')
+        # Monkey-patching is process-wide, so it runs in its own interpreter
+        completed = subprocess.run(
+            [sys.executable, '-c', GEVENT_EXPORT, os.path.dirname(os.path.abspath(__file__))],
+            capture_output=True, text=True, timeout=120)
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        self.assertEqual(result['status'], 200)
+        self.assertTrue(result['pdf'])
+        self.assertEqual(result['rows'], 'list')
+        self.assertEqual(result['sql'], [result['main']])
+        self.assertNotEqual(result['thread'], result['main'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as app_module
+import settlement as settlement_module
+from app import db, Member, MealRecord
+from app_testing import AppTestCase
+from models import Expense, Deposit
+from member_removal import mark_removed, purge_member
+from rollups import rebuild_rollups
+from settlement import Settlement, settle, settlement_for
+
+class TestSettlement(AppTestCase):
+    """Tests for the meal rate and member balances"""
+
+    def setUp(self):
+        """Set up three members, March 2024 meals, expenses and deposits"""
+        db.create_all()
+        self.app.extensions['settlement_cache'].clear()
+        self.app.extensions['report_cache'].clear()
+        self.alice = Member(name='Alice')
+        self.bob = Member(name='Bob')
+        self.carol = Member(name='Carol')
+        db.session.add_all([self.alice, self.bob, self.carol])
+        db.session.flush()
+        # Alice 20 meals, Bob 10, Carol none; one record of Bob's in April
+        for day in range(1, 11):
+            db.session.add(MealRecord(member_id=self.alice.id, meal_date=date(2024, 3, day), meal_count=2))
+            db.session.add(MealRecord(member_id=self.bob.id, meal_date=date(2024, 3, day), meal_count=1))
+        db.session.add(MealRecord(member_id=self.bob.id, meal_date=date(2024, 4, 1), meal_count=3))
+        db.session.add_all([
+            Expense(expense_date=date(2024, 3, 2), amount=Decimal('1000.00'), description='Bazaar'),
+            Expense(expense_date=date(2024, 3, 20), amount=Decimal('500.50'), description='Gas'),
+            Expense(expense_date=date(2024, 4, 1), amount=Decimal('999.00'), description='April'),
+            Deposit(member_id=self.alice.id, deposit_date=date(2024, 3, 1), amount=Decimal('800.00')),
+            Deposit(member_id=self.alice.id, deposit_date=date(2024, 3, 15), amount=Decimal('200.00')),
+            Deposit(member_id=self.bob.id, deposit_date=date(2024, 3, 5), amount=Decimal('600.00')),
+            Deposit(member_id=self.bob.id, deposit_date=date(2024, 4, 5), amount=Decimal('50.00')),
+        ])
+        rebuild_rollups()
+        db.session.commit()
+        self.start, self.end = date(2024, 3, 1), date(2024, 3, 31)
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def test_balances(self):
+        result = settle(self.start, self.end)
+        self.assertEqual(result.total_expense, Decimal('1500.50'))
+        self.assertEqual(result.total_meals, 30)
+        self.assertEqual(result.meal_rate, Decimal('50.02'))
+        self.assertEqual(result.total_deposited, Decimal('1600.00'))
+        self.assertEqual([tuple(balance)[1:] for balance in result.balances], [
+            ('Alice', 20, Decimal('1000.33'), Decimal('1000.00'), Decimal('-0.33')),
+            ('Bob', 10, Decimal('500.17'), Decimal('600.00'), Decimal('99.83')),
+            ('Carol', 0, Decimal('0.00'), Decimal('0.00'), Decimal('0.00')),
+        ])
+
+    def test_partial_range_matches_rollup(self):
+        """Test a non-month range sums the records like the rollup does for months"""
+        self.assertEqual(settle(date(2024, 3, 1), date(2024, 3, 30)).to_dict()['balances'],
+                         settle(self.start, self.end).to_dict()['balances'])
+
+    def test_without_meals_or_members(self):
+        result = settle(date(2024, 4, 6), date(2024, 4, 30))
+        self.assertIsNone(result.meal_rate)
+        self.assertFalse(result.has_ledger)
+        mark_removed(self.alice)
+        mark_removed(self.bob)
+        mark_removed(self.carol)
+        db.session.commit()
+        result = settle(self.start, self.end)
+        self.assertEqual(result.balances, [])
+        self.assertEqual(result.total_expense, Decimal('1500.50'))
+
+    def test_round_trip(self):
+        result = settle(self.start, self.end)
+        self.assertEqual(Settlement.from_dict(result.to_dict()).to_dict(), result.to_dict())
+
+    def test_cached_per_data_version(self):
+        first = settlement_for(self.start, self.end)
+        with mock.patch.object(settlement_module, 'settle') as compute:
+            self.assertEqual(settlement_for(self.start, self.end).to_dict(), first.to_dict())
+        compute.assert_not_called()
+        db.session.add(Expense(expense_date=date(2024, 3, 31), amount=Decimal('99.50')))
+        db.session.commit()
+        self.assertEqual(settlement_for(self.start, self.end).total_expense, Decimal('1600.00'))
+
+    def test_pdf_includes_settlement(self):
+        etag = self.client.get('/export-pdf?month=2024-03').headers['ETag']
+        db.session.add(Deposit(member_id=self.carol.id, deposit_date=date(2024, 3, 9), amount=Decimal('10.00')))
+        db.session.commit()
+        with mock.patch.object(app_module, 'write_report') as build:
+            response = self.client.get('/export-pdf?month=2024-03', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        args = build.call_args[0]
+        self.assertEqual(args[3], [('Alice', 20), ('Bob', 10), ('Carol', 0)])
+        self.assertEqual(args[-1].total_deposited, Decimal('1610.00'))
+
+    def test_pdf_renders(self):
+        response = self.client.get('/export-pdf?month=2024-03&detail=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data.startswith(b'%PDF'))
+
+    def test_api(self):
+        response = self.client.get('/api/settlement?month=2024-03')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['meal_rate'], '50.02')
+        self.assertEqual(response.json['balances'][1], {
+            'member_id': self.bob.id, 'name': 'Bob', 'meals': 10,
+            'cost': '500.17', 'deposited': '600.00', 'balance': '99.83'
+        })
+        self.assertEqual(self.client.get('/api/settlement?month=March').status_code, 400)
+
+    def test_admin_entries(self):
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        self.client.post('/admin', data={'add_expense': '1', 'entry_date': '2024-03-31',
+                                         'amount': '12.25', 'note': 'Salt'})
+        self.client.post('/admin', data={'add_deposit': '1', 'entry_date': '2024-03-31',
+                                         'amount': '40', 'member_id': str(self.carol.id)})
+        for amount in ('-5', '0', '1.005', 'abc', 'NaN'):
+            self.client.post('/admin', data={'add_expense': '1', 'entry_date': '2024-03-31', 'amount': amount})
+        self.assertEqual(Expense.query.filter_by(expense_date=date(2024, 3, 31)).one().description, 'Salt')
+        result = settle(self.start, self.end)
+        self.assertEqual(result.total_expense, Decimal('1512.75'))
+        self.assertEqual(result.balances[2].deposited, Decimal('40.00'))
+
+    def test_purge_removes_deposits(self):
+        mark_removed(self.bob)
+        db.session.commit()
+        purge_member(self.bob.id, batch_size=100)
+        self.assertEqual(Deposit.query.filter_by(member_id=self.bob.id).count(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import unittest
+import os
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+from sqlalchemy import inspect, text
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as app_module
+from app import db, Member, MealRecord
+from app_testing import AppTestCase
+from models import Mess, MemberMonthlyTotal, Expense, DEFAULT_MESS_ID
+from create_tables import init_db
+from history import archive_closed_months
+from report_jobs import PENDING
+from rollups import rebuild_rollups
+from settlement import settle
+from tenancy import create_mess, ensure_default_mess, use_mess
+
+class TestTenancy(AppTestCase):
+    """Tests for several messes served by one app"""
+
+    app_config = {
+        'ADMIN_PASSWORD': 'test-admin',
+    }
+
+    def setUp(self):
+        """Set up the default mess and a second one, each with an Alice"""
+        db.create_all()
+        ensure_default_mess('Banasree Boys')
+        north = create_mess('north', 'North House', admin_password='north-secret')
+        self.north_id = north.id
+        self.alice = Member(name='Alice')
+        self.bob = Member(name='Bob')
+        self.north_alice = Member(mess_id=self.north_id, name='Alice')
+        db.session.add_all([self.alice, self.bob, self.north_alice])
+        db.session.flush()
+        db.session.add_all([
+            MealRecord(member_id=self.alice.id, meal_date=date(2024, 3, 1), meal_count=2),
+            MealRecord(mess_id=self.north_id, member_id=self.north_alice.id, meal_date=date(2024, 3, 1), meal_count=4),
+            Expense(expense_date=date(2024, 3, 1), amount=Decimal('100.00')),
+            Expense(mess_id=self.north_id, expense_date=date(2024, 3, 1), amount=Decimal('30.00')),
+        ])
+        rebuild_rollups()
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+
+    def test_pages_show_one_mess(self):
+        response = self.client.get('/m/north/meals')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'North House', response.data)
+        self.assertNotIn(b'Banasree Boys', response.data)
+        self.assertNotIn(b'>Bob</td>', response.data)
+        # Links stay inside the mess
+        self.assertIn(b'href="/m/north/admin"', response.data)
+        response = self.client.get('/meals')
+        self.assertIn(b'Banasree Boys', response.data)
+        self.assertIn(b'>Bob</td>', response.data)
+
+    def test_unknown_mess(self):
+        self.assertEqual(self.client.get('/m/nowhere/meals').status_code, 404)
+
+    def test_member_names_unique_per_mess(self):
+        self.client.post('/m/north/add-member', data={'name': 'Bob'})
+        self.client.post('/m/north/add-member', data={'name': 'Bob'})
+        self.assertEqual(Member.query.filter_by(mess_id=self.north_id, name='Bob').count(), 1)
+        self.assertEqual(Member.query.filter_by(name='Bob').count(), 2)
+
+    def test_save_writes_to_the_mess(self):
+        today_str = date.today().strftime('%Y-%m-%d')
+        self.client.post('/m/north/meals', data={f'meal_count_{today_str}_{self.north_alice.id}': '3',
+                                                 f'meal_count_{today_str}_{self.bob.id}': '3'})
+        record = MealRecord.query.filter_by(meal_date=date.today()).one()
+        self.assertEqual((record.member_id, record.mess_id), (self.north_alice.id, self.north_id))
+        rollup = MemberMonthlyTotal.query.filter_by(month=date.today().replace(day=1)).one()
+        self.assertEqual(rollup.mess_id, self.north_id)
+
+    def test_api_and_settlement_are_scoped(self):
+        response = self.client.get('/m/north/api/members')
+        self.assertEqual([member['name'] for member in response.json['members']], ['Alice'])
+        self.assertEqual(self.client.get(f'/m/north/api/members/{self.bob.id}/meals').status_code, 404)
+        settlement = self.client.get('/m/north/api/settlement?month=2024-03').json
+        self.assertEqual((settlement['total_expense'], settlement['total_meals']), ('30.00', 4))
+        with use_mess(DEFAULT_MESS_ID):
+            self.assertEqual(settle(date(2024, 3, 1), date(2024, 3, 31)).total_expense, Decimal('100.00'))
+
+    def test_report_per_mess(self):
+        with mock.patch.object(app_module, 'write_report') as build:
+            self.client.get('/m/north/export-pdf?month=2024-03')
+        self.assertEqual(build.call_args[0][3], [('Alice', 4)])
+        self.assertEqual(build.call_args[1]['mess_name'], 'North House')
+        north_etag = self.client.get('/m/north/export-pdf?month=2024-03').headers['ETag']
+        self.assertNotEqual(self.client.get('/export-pdf?month=2024-03').headers['ETag'], north_etag)
+
+    def test_report_jobs_per_mess(self):
+        job = self.client.post('/m/north/export-pdf/jobs?month=2024-03').json
+        self.assertTrue(job['status_url'].startswith('/m/north/'))
+        self.assertEqual(self.client.get(job['status_url']).status_code, 200)
+        self.assertEqual(self.client.get(f"/export-pdf/jobs/{job['job_id']}").status_code, 404)
+        # Let the render finish before its directory is removed
+        jobs = self.app.extensions['report_jobs']
+        deadline = time.time() + 10
+        while jobs.status(job['job_id']) == PENDING and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_admin_login_per_mess(self):
+        self.client.post('/admin', data={'password': 'test-admin'})
+        self.assertEqual(self.client.get('/admin/matrix').status_code, 200)
+        self.assertEqual(self.client.get('/m/north/admin/matrix').status_code, 302)
+        self.client.post('/m/north/admin', data={'password': 'test-admin'})
+        self.assertEqual(self.client.get('/m/north/admin/matrix').status_code, 302)
+        self.client.post('/m/north/admin', data={'password': 'north-secret'})
+        self.assertEqual(self.client.get('/m/north/admin/matrix').status_code, 200)
+
+    def test_session_cookie_does_not_carry_to_other_mess(self):
+        """Test one mess's admin cookie, replayed under another mess's name, is refused"""
+        create_mess('south', 'South House', admin_password='south-secret')
+        self.client.post('/m/north/admin', data={'password': 'north-secret'})
+        self.assertEqual(self.client.get('/m/north/admin/matrix').status_code, 200)
+        cookie = self.client.get_cookie('session-north')
+        self.client.set_cookie('session-south', cookie.value, path=cookie.path)
+        self.client.set_cookie('session', cookie.value, path=cookie.path)
+        self.assertEqual(self.client.get('/m/south/admin/matrix').status_code, 302)
+        self.assertEqual(self.client.get('/admin/matrix').status_code, 302)
+        self.assertEqual(self.client.post('/m/south/admin/import').status_code, 403)
+
+    def test_admin_cannot_touch_other_mess(self):
+        with self.client.session_transaction() as sess:
+            sess['admin_logged_in'] = True
+        self.client.post('/admin', data={'remove_member': '1', 'member_id': str(self.north_alice.id)})
+        self.client.post('/admin', data={'update_meal': '1', 'member_id': str(self.north_alice.id),
+                                         'meal_date': '2024-03-02', 'meal_count': '1'})
+        self.assertIsNone(db.session.get(Member, self.north_alice.id).removed_at)
+        self.assertEqual(MealRecord.query.filter_by(member_id=self.north_alice.id).count(), 1)
+
+    def test_archive_and_rebuild_every_mess(self):
+        archive_closed_months(keep_months=1)
+        self.assertEqual(MealRecord.query.count(), 0)
+        db.session.query(MemberMonthlyTotal).delete()
+        db.session.commit()
+        self.assertEqual(len(rebuild_rollups(self.north_id)), 1)
+        self.assertEqual(db.session.query(MemberMonthlyTotal.mess_id).all(), [(self.north_id,)])
+        with use_mess(self.north_id):
+            self.assertEqual(settle(date(2024, 3, 1), date(2024, 3, 31)).total_meals, 4)
+
+    def test_init_db_upgrades_single_mess_schema(self):
+        db.drop_all()
+        with db.engine.begin() as connection:
+            connection.execute(text('CREATE TABLE members (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, '
+                                    'created_at DATETIME, removed_at DATETIME)'))
+            connection.execute(text('CREATE TABLE meal_records (id INTEGER PRIMARY KEY, member_id INTEGER NOT NULL, '
+                                    'meal_date DATE NOT NULL, meal_count INTEGER NOT NULL, created_at DATETIME, '
+                                    'updated_at DATETIME, CONSTRAINT unique_member_date UNIQUE (member_id, meal_date))'))
+            connection.execute(text('CREATE INDEX ix_meal_records_date_member ON meal_records (meal_date, member_id)'))
+            connection.execute(text("INSERT INTO members (id, name) VALUES (1, 'Old')"))
+            connection.execute(text("INSERT INTO meal_records VALUES (1, 1, '2024-03-01', 2, NULL, NULL)"))
+        init_db()
+        self.assertEqual(db.session.get(Mess, DEFAULT_MESS_ID).name, 'Banasree Boys')
+        self.assertEqual(db.session.query(MealRecord.mess_id).scalar(), DEFAULT_MESS_ID)
+        indexes = {index['name'] for index in inspect(db.engine).get_indexes('meal_records')}
+        self.assertIn('ix_meal_records_mess_date_member', indexes)
+        self.assertNotIn('ix_meal_records_date_member', indexes)
+        self.assertIn('Old', self.client.get('/meals').get_data(as_text=True))
+
+if __name__ == '__main__':
+    unittest.main()